@@ -0,0 +1,165 @@
+"""
+Seller dashboard rollups.
+
+SellerDailySales keeps one row per (seller, book, day, status). Orders update
+their row incrementally when placed or when their status changes, so the
+dashboard reads O(days x books) rollup rows instead of the order history.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from api import partitions
+from api.models import Book, Order, SellerDailySales
+
+REVENUE_EXCLUDED_STATUSES = ('cancelled',)
+
+
+def _bump(seller_id, book_id, day, status, orders, units, revenue):
+    key = {'seller_id': seller_id, 'book_id': book_id, 'day': day, 'status': status}
+    changes = {
+        'order_count': F('order_count') + orders,
+        'units': F('units') + units,
+        'revenue': F('revenue') + revenue,
+    }
+    if SellerDailySales.objects.filter(**key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            SellerDailySales.objects.create(order_count=orders, units=units, revenue=revenue, **key)
+    except IntegrityError:
+        # Created concurrently by another order for the same bucket
+        SellerDailySales.objects.filter(**key).update(**changes)
+
+
+def _bucket(order):
+    seller_id = Book.objects.filter(pk=order.book_id).values_list('seller_id', flat=True).get()
+    return seller_id, order.book_id, timezone.localdate(order.order_date)
+
+
+def order_placed(order):
+    seller_id, book_id, day = _bucket(order)
+    _bump(seller_id, book_id, day, order.status, 1, order.quantity, order.total_amount)
+
+
+def order_removed(order):
+    seller_id, book_id, day = _bucket(order)
+    _bump(seller_id, book_id, day, order.status, -1, -order.quantity, -order.total_amount)
+
+
+def order_status_changed(order, old_status):
+    if old_status == order.status:
+        return
+    seller_id, book_id, day = _bucket(order)
+    _bump(seller_id, book_id, day, old_status, -1, -order.quantity, -order.total_amount)
+    _bump(seller_id, book_id, day, order.status, 1, order.quantity, order.total_amount)
+
+
+def orders_status_changed(changes, new_status):
+    """
+    Batched order_status_changed for orders moved to `new_status`. `changes` are
+    (seller_id, book_id, order_date, old_status, quantity, total_amount) tuples;
+    each (seller, book, day, old status) bucket is bumped once.
+    """
+    buckets = defaultdict(lambda: [0, 0, Decimal('0')])
+    for seller_id, book_id, order_date, old_status, quantity, total_amount in changes:
+        if old_status == new_status:
+            continue
+        bucket = buckets[(seller_id, book_id, timezone.localdate(order_date), old_status)]
+        bucket[0] += 1
+        bucket[1] += quantity
+        bucket[2] += total_amount
+    for (seller_id, book_id, day, old_status), (orders, units, revenue) in buckets.items():
+        _bump(seller_id, book_id, day, old_status, -orders, -units, -revenue)
+        _bump(seller_id, book_id, day, new_status, orders, units, revenue)
+
+
+def _rollups_with_archive(since):
+    """(seller, book, day, status, orders, units, revenue) over the hot and archived orders together."""
+    q = connection.ops.quote_name
+    day = "(o.order_date AT TIME ZONE %s)::date"
+    orders = " UNION ALL ".join(
+        f"SELECT book_id, order_date, status, quantity, total_amount FROM {q(table)}"
+        for table in (Order._meta.db_table, partitions.ARCHIVE_TABLE)
+    )
+    params = [timezone.get_current_timezone_name()]
+    where = ''
+    if since is not None:
+        where = f"WHERE {day} >= %s"
+        params += [params[0], since]
+    book = Book._meta
+    # An archived month can share a local day with the hot table at its boundary: group the union, not each side
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(
+            f"SELECT b.seller_id, o.book_id, {day}, o.status, count(*), sum(o.quantity), sum(o.total_amount) "
+            f"FROM ({orders}) o JOIN {q(book.db_table)} b ON b.{q(book.pk.column)} = o.book_id {where} "
+            f"GROUP BY 1, 2, 3, 4",
+            params,
+        )
+        while rows := cursor.fetchmany(5000):
+            yield from rows
+
+
+def rollup_rows(since=None):
+    """
+    Yield unsaved SellerDailySales rows aggregated from the Order table, and
+    from the order archive once api.partitions has moved months into it.
+    """
+    if partitions.has_archive():
+        rows = _rollups_with_archive(since)
+    else:
+        orders = Order.objects.all()
+        if since is not None:
+            orders = orders.filter(order_date__date__gte=since)
+        rows = (
+            orders.annotate(day=TruncDate('order_date'))
+            .values_list('book__seller_id', 'book_id', 'day', 'status')
+            .annotate(order_count=Count('pk'), units=Sum('quantity'), revenue=Sum('total_amount'))
+            .order_by()
+            .iterator(chunk_size=5000)
+        )
+    for seller_id, book_id, day, status, order_count, units, revenue in rows:
+        yield SellerDailySales(
+            seller_id=seller_id, book_id=book_id, day=day, status=status,
+            order_count=order_count, units=units, revenue=revenue,
+        )
+
+
+def dashboard(seller_id, start=None, end=None, top=10):
+    """Revenue, orders per status, daily series and top books for a seller."""
+    end = end or timezone.localdate()
+    start = start or end - timedelta(days=29)
+    rows = SellerDailySales.objects.filter(seller_id=seller_id, day__range=(start, end))
+    sold = rows.exclude(status__in=REVENUE_EXCLUDED_STATUSES)
+
+    orders_by_status = {status: 0 for status, _ in Order.STATUS_CHOICES}
+    for row in rows.values('status').annotate(count=Sum('order_count')).order_by():
+        orders_by_status[row['status']] = row['count']
+
+    totals = sold.aggregate(revenue=Sum('revenue'), units=Sum('units'))
+    daily = [
+        {'day': row['day'], 'orders': row['orders'], 'units': row['units'], 'revenue': row['revenue']}
+        for row in sold.values('day').annotate(
+            orders=Sum('order_count'), units=Sum('units'), revenue=Sum('revenue'),
+        ).order_by('day')
+    ]
+    top_books = list(
+        sold.values('book_id', title=F('book__title'))
+        .annotate(units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-units', '-revenue')[:top]
+    )
+    return {
+        'seller_id': seller_id,
+        'start': start,
+        'end': end,
+        'revenue': totals['revenue'] or Decimal('0'),
+        'units_sold': totals['units'] or 0,
+        'orders_by_status': orders_by_status,
+        'daily': daily,
+        'top_books': top_books,
+    }
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def create_search_indexes(sender, using='default', **kwargs):
+    from api.search import create_postgres_search_indexes
+    create_postgres_search_indexes(using)
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from api import cache, facets, images, live, matching, metrics, routers, search, throttling  # noqa: F401  (connects the model signal receivers and checks)
+        post_migrate.connect(create_search_indexes, sender=self)
@@ -0,0 +1,177 @@
+"""
+ASGI-native versions of the hot read endpoints.
+
+These are plain async Django views using the async ORM (aget/aiterator), so
+under uvicorn they run on the event loop instead of borrowing a thread from
+the sync-to-async pool per request. Responses mirror the DRF endpoints.
+Pagination is keyset based: pass the last seen id as `?after=`.
+
+order_events and book_events are Server-Sent Event streams fed by api.live.
+EventSource cannot set headers, so they also accept the access token as
+`?token=`.
+"""
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import live
+from api.authentication import blacklist_filter, user_cache, user_from_cache_or_claims
+from api.models import Book, Review, Seller, User
+from api.search import search_books
+from api.serializers import BookSerializer, ReviewSerializer, SellerSerializer
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def _raw_token(request, allow_query_token):
+    parts = request.headers.get('Authorization', '').split()
+    if len(parts) == 2 and parts[0] in jwt_settings.AUTH_HEADER_TYPES:
+        return parts[1]
+    if allow_query_token:
+        return request.GET.get('token') or None
+    return None
+
+
+async def authenticate(request, allow_query_token=False):
+    """Async counterpart of CachedJWTAuthentication: returns the user or None."""
+    raw_token = _raw_token(request, allow_query_token)
+    if raw_token is None:
+        return None
+    try:
+        token = AccessToken(raw_token)  # Signature and expiry checks, no I/O
+        jti = token.get(jwt_settings.JTI_CLAIM)
+        if jti and blacklist_filter.enabled and await sync_to_async(blacklist_filter.is_blacklisted)(jti):
+            return None
+        user = user_from_cache_or_claims(token)
+    except (TokenError, InvalidToken):
+        return None
+
+    if user is None:
+        lookup = {jwt_settings.USER_ID_FIELD: token[jwt_settings.USER_ID_CLAIM]}
+        try:
+            user = await User.objects.aget(**lookup)
+        except User.DoesNotExist:
+            return None
+        user_cache.set(user)
+    return user if user.is_active else None
+
+
+def _error(message, status):
+    return JsonResponse({"error": message}, status=status)
+
+
+def _unauthorized():
+    return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+
+def _page_params(request):
+    after = int(request.GET.get('after', 0))
+    page_size = min(max(int(request.GET.get('page_size', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    return after, page_size
+
+
+async def _keyset_page(request, queryset, serializer_class):
+    try:
+        after, page_size = _page_params(request)
+    except ValueError:
+        return _error("after and page_size must be integers.", 400)
+
+    pk_name = queryset.model._meta.pk.name
+    queryset = queryset.filter(**{f'{pk_name}__gt': after}).order_by(pk_name)[:page_size + 1]
+    rows = [row async for row in queryset.aiterator(chunk_size=page_size + 1)]
+
+    next_link = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        query = request.GET.copy()
+        query['after'] = getattr(rows[-1], pk_name)
+        next_link = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+    return JsonResponse({"next": next_link, "results": serializer_class(rows, many=True).data})
+
+
+async def book_list(request):
+    if await authenticate(request) is None:
+        return _unauthorized()
+    return await _keyset_page(request, Book.objects.all(), BookSerializer)
+
+
+async def book_detail(request, book_id):
+    if await authenticate(request) is None:
+        return _unauthorized()
+    try:
+        book = await Book.objects.aget(pk=book_id)
+    except Book.DoesNotExist:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    return JsonResponse(BookSerializer(book).data)
+
+
+async def book_search(request):
+    if await authenticate(request) is None:
+        return _unauthorized()
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return _error("Query parameter 'q' is required.", 400)
+    try:
+        limit = min(max(int(request.GET.get("limit", 20)), 1), 100)
+        # The ranking query and the fallback index are synchronous
+        books = await sync_to_async(search_books)(query, request.GET, limit=limit)
+    except ValueError as exc:
+        return _error(str(exc), 400)
+    data = BookSerializer(books, many=True).data
+    return JsonResponse({"query": query, "count": len(books), "results": data})
+
+
+async def book_reviews(request, book_id):
+    return await _keyset_page(request, Review.objects.filter(book_id=book_id), ReviewSerializer)
+
+
+async def sellers_by_user(request, user_id):
+    sellers = [seller async for seller in Seller.objects.filter(user__id=user_id).aiterator()]
+    if not sellers:
+        return JsonResponse({"message": "No sellers found for this user."}, status=404)
+    return JsonResponse(SellerSerializer(sellers, many=True).data, safe=False)
+
+
+def _event_stream(request, channels):
+    config = live._config()
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+
+    async def events():
+        # Subscribed here, not in the view, so it happens on the loop serving the response
+        subscription = live.hub.subscribe(channels, last_event_id)
+        try:
+            yield f"retry: {config['RETRY_MS']}\n\n"
+            async for chunk in subscription.messages(config['HEARTBEAT_SECONDS']):
+                yield chunk
+        finally:
+            live.hub.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx buffering the stream
+    return response
+
+
+async def order_events(request):
+    """Status changes of the requesting user's orders."""
+    user = await authenticate(request, allow_query_token=True)
+    if user is None:
+        return _unauthorized()
+    return _event_stream(request, [live.user_channel(user.pk)])
+
+
+async def book_events(request):
+    """Stock and availability changes of the books in `?ids=1,2,3`."""
+    if await authenticate(request, allow_query_token=True) is None:
+        return _unauthorized()
+    try:
+        book_ids = {int(value) for value in request.GET.get('ids', '').split(',') if value.strip()}
+    except ValueError:
+        return _error("ids must be comma-separated integers.", 400)
+    max_books = live._config()['MAX_BOOKS']
+    if not book_ids or len(book_ids) > max_books:
+        return _error(f"Pass between 1 and {max_books} book ids in ?ids=.", 400)
+    return _event_stream(request, [live.book_channel(book_id) for book_id in sorted(book_ids)])
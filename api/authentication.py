@@ -0,0 +1,211 @@
+"""
+JWT authentication without a per-request user query.
+
+Tokens issued by tokens_for_user() carry the user's username, is_seller,
+is_staff and is_active as signed claims. CachedJWTAuthentication builds
+request.user from, in order:
+
+1. a short-TTL, bounded LRU cache of user rows (refreshed when a User is saved),
+2. the signed claims, as a User with every other field deferred (loaded on
+   first access, and left untouched by save()),
+3. the database, for tokens issued before the claims existed.
+
+Claims are as fresh as the token: other workers see a changed is_staff or
+is_active when their cache entry expires or the user logs in again.
+
+When simplejwt's token_blacklist app is installed, revoked token ids are
+tracked in an in-memory bloom filter, so only tokens that may be blacklisted
+cost a database lookup.
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.models import User
+
+CLAIM_FIELDS = ('username', 'is_seller', 'is_staff', 'is_active')
+
+
+def _config():
+    config = {'USER_CACHE_SIZE': 10000, 'USER_CACHE_TTL': 60,
+              'BLOOM_CAPACITY': 100000, 'BLOOM_ERROR_RATE': 0.001, 'BLOOM_REFRESH_SECONDS': 30}
+    config.update(getattr(settings, 'JWT_AUTH_CACHE', {}))
+    return config
+
+
+def tokens_for_user(user):
+    """RefreshToken.for_user() plus the user claims; access tokens inherit them."""
+    refresh = RefreshToken.for_user(user)
+    for field in CLAIM_FIELDS:
+        refresh[field] = getattr(user, field)
+    return refresh
+
+
+class UserCache:
+    """Bounded LRU of user rows with a time-to-live per entry."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires, row = entry
+            if expires < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return row
+
+    def set(self, user):
+        field_names = [field.attname for field in User._meta.concrete_fields]
+        row = (field_names, [getattr(user, name) for name in field_names])
+        with self._lock:
+            self._entries[user.pk] = (time.monotonic() + self.ttl, row)
+            self._entries.move_to_end(user.pk)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings (no false negatives)."""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class BlacklistFilter:
+    """Bloom filter of blacklisted token ids, rebuilt periodically."""
+
+    def __init__(self):
+        self._bloom = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return apps.is_installed('rest_framework_simplejwt.token_blacklist')
+
+    def _blacklisted_model(self):
+        return apps.get_model('token_blacklist', 'BlacklistedToken')
+
+    def _current(self):
+        config = _config()
+        with self._lock:
+            if self._bloom is None or time.monotonic() - self._built_at > config['BLOOM_REFRESH_SECONDS']:
+                bloom = BloomFilter(config['BLOOM_CAPACITY'], config['BLOOM_ERROR_RATE'])
+                jtis = self._blacklisted_model().objects.values_list('token__jti', flat=True)
+                for jti in jtis.iterator(chunk_size=5000):
+                    bloom.add(jti)
+                self._bloom, self._built_at = bloom, time.monotonic()
+            return self._bloom
+
+    def add(self, jti):
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+
+    def might_contain(self, jti):
+        """No I/O once the filter is built; False means definitely not blacklisted."""
+        return self.enabled and jti in self._current()
+
+    def is_blacklisted(self, jti):
+        if not self.might_contain(jti):
+            return False
+        return self._blacklisted_model().objects.filter(token__jti=jti).exists()
+
+
+user_cache = UserCache(_config()['USER_CACHE_SIZE'], _config()['USER_CACHE_TTL'])
+blacklist_filter = BlacklistFilter()
+
+
+def user_from_cache_or_claims(validated_token):
+    """Build the token's user without database access, or return None."""
+    try:
+        user_id = User._meta.pk.to_python(validated_token[jwt_settings.USER_ID_CLAIM])  # simplejwt sends a string
+    except (KeyError, ValidationError):
+        raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    row = user_cache.get(user_id)
+    if row is not None:
+        return User.from_db(DEFAULT_DB_ALIAS, *row)
+    if all(claim in validated_token for claim in CLAIM_FIELDS):
+        claims = {User._meta.pk.attname: user_id, **{claim: validated_token[claim] for claim in CLAIM_FIELDS}}
+        # from_db() matches a partial row to the fields in model order, not in field_names order
+        field_names = [field.attname for field in User._meta.concrete_fields if field.attname in claims]
+        return User.from_db(DEFAULT_DB_ALIAS, field_names, [claims[name] for name in field_names])
+    return None
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        jti = validated_token.get(jwt_settings.JTI_CLAIM)
+        if jti and blacklist_filter.is_blacklisted(jti):
+            raise InvalidToken(_("Token is blacklisted"))
+        return validated_token
+
+    def get_user(self, validated_token):
+        user = user_from_cache_or_claims(validated_token)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user)
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def _forget_user(sender, instance, **kwargs):
+    user_cache.discard(instance.pk)
+
+
+def _blacklisted(sender, instance, created, **kwargs):
+    if created:
+        blacklist_filter.add(instance.token.jti)
+
+
+if apps.is_installed('rest_framework_simplejwt.token_blacklist'):
+    post_save.connect(_blacklisted, sender='token_blacklist.BlacklistedToken')
@@ -0,0 +1,257 @@
+"""
+Response cache for read-heavy endpoints.
+
+List-style entries (lists, search, facets) are keyed by the request path, the
+normalized query string, the caller's auth scope and the current *generation*
+of every data namespace the response depends on ("books", "reviews",
+"sellers").  Detail entries are keyed by the object's own version instead,
+plus an epoch of its namespace.  A save bumps the object's version and the
+namespace generation, which makes every dependent entry unreachable at once;
+the detail entries of other objects stay.  Book saves that only change
+columns no response shows bump nothing.
+
+A miss read from a lagging replica (api.routers) can still hold the state
+from before a write, under the new generation.  Such entries are kept for
+REPLICA_TIMEOUT seconds only, so they are no staler than the replica itself
+within the replication lag the routing already tolerates.
+
+The on/off switch, cache alias and timeouts come from
+settings.API_RESPONSE_CACHE.  LocMemCache is per-process; deployments running
+several workers should point the alias at Redis so invalidations reach every
+worker.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.db.models import DEFERRED
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.models import Book, Review, Seller
+
+# Book columns no cached response shows (see BookSerializer)
+HIDDEN_BOOK_COLUMNS = {
+    'image_hash', 'cover_phash', 'cover_dhash', 'rating_sum',
+    'phash_chunk_0', 'phash_chunk_1', 'phash_chunk_2', 'phash_chunk_3',
+}
+
+NAMESPACE_MODELS = {'books': Book, 'reviews': Review, 'sellers': Seller}
+
+# Backends whose entries only the current process sees
+LOCAL_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _config():
+    config = {'ENABLED': True, 'ALIAS': 'default', 'TIMEOUT': 300, 'REPLICA_TIMEOUT': 5}
+    config.update(getattr(settings, 'API_RESPONSE_CACHE', {}))
+    return config
+
+
+def _cache():
+    return caches[_config()['ALIAS']]
+
+
+def is_shared(alias):
+    """Whether every worker sees the entries of cache `alias`."""
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    return backend is not None and backend not in LOCAL_BACKENDS
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_stats():
+    """Hit/miss/invalidation counters for this process."""
+    with _stats_lock:
+        return {name: _stats[name] for name in ('hits', 'misses', 'not_modified', 'invalidations')}
+
+
+def _generation_key(namespace):
+    return f'api:gen:{namespace}'
+
+
+def _epoch_key(namespace):
+    return f'api:gen:{namespace}:objects'
+
+
+def _object_key(namespace, pk):
+    return f'api:ver:{namespace}:{pk}'
+
+
+def _current(keys):
+    cache = _cache()
+    current = cache.get_many(keys)
+    for key in keys:
+        if key not in current:
+            # Never restart an evicted counter at a value entries may still be keyed with
+            cache.add(key, time.time_ns(), timeout=None)
+            current[key] = cache.get(key, 0)
+    return [str(current[key]) for key in keys]
+
+
+def _bump(keys):
+    cache = _cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+    _count('invalidations')
+
+
+def _invalidate(keys):
+    """
+    Bump `keys` now and again once the surrounding transaction commits, so a
+    reader that cached the pre-commit state in between is discarded too.
+    """
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def invalidate(*namespaces):
+    """Invalidate every cached response depending on `namespaces`, lists and single objects."""
+    _invalidate([key for namespace in namespaces for key in (_generation_key(namespace), _epoch_key(namespace))])
+
+
+def invalidate_lists(*namespaces):
+    """Invalidate the list, search and facet responses of `namespaces`, not the single objects."""
+    _invalidate([_generation_key(namespace) for namespace in namespaces])
+
+
+def invalidate_objects(namespace, pks):
+    """Invalidate the detail responses of these objects and the lists of their namespace."""
+    _invalidate([_generation_key(namespace), *(_object_key(namespace, pk) for pk in pks)])
+
+
+def response_cache_key(request, namespaces, pk=None):
+    """Key of a list response, or with `pk` of the detail response of that object of namespaces[0]."""
+    user = getattr(request, 'user', None)
+    scope = f'user:{user.pk}' if user is not None and user.is_authenticated else 'anon'
+    params = sorted((key, request.query_params.getlist(key)) for key in request.query_params)
+    if pk is None:
+        versions = _current([_generation_key(namespace) for namespace in namespaces])
+    else:
+        versions = _current([_epoch_key(namespaces[0]), _object_key(namespaces[0], pk)])
+    raw = json.dumps([request.path, params, scope, versions])
+    return 'api:resp:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def compute_etag(data):
+    payload = json.dumps(data, sort_keys=True, default=str, separators=(',', ':'))
+    return '"%s"' % hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return '*' in candidates or etag in candidates
+
+
+def _entry_timeout(namespace):
+    config = _config()
+    if router.db_for_read(NAMESPACE_MODELS[namespace]) != DEFAULT_DB_ALIAS:
+        return min(config['TIMEOUT'], config['REPLICA_TIMEOUT'])
+    return config['TIMEOUT']
+
+
+def cache_response(*namespaces, detail=False):
+    """
+    Cache the 200 responses of a GET view method, e.g.
+
+        @cache_response('books')
+        def list(self, request, *args, **kwargs): ...
+
+        @cache_response('books', detail=True)
+        def retrieve(self, request, *args, **kwargs): ...
+
+    Detail entries are keyed by the version of the object the URL names.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not _config()['ENABLED']:
+                return method(view, request, *args, **kwargs)
+
+            cache = _cache()
+            pk = kwargs[view.lookup_url_kwarg or view.lookup_field] if detail else None
+            key = response_cache_key(request, namespaces, pk)
+            entry = cache.get(key)
+            if entry is None:
+                _count('misses')
+                response = method(view, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                etag = compute_etag(response.data)
+                cache.set(key, (response.data, etag), timeout=_entry_timeout(namespaces[0]))
+                cache_state = 'MISS'
+            else:
+                _count('hits')
+                data, etag = entry
+                response = Response(data)
+                cache_state = 'HIT'
+
+            if _etag_matches(request, etag):
+                _count('not_modified')
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            response['X-Cache'] = cache_state
+            return response
+        return wrapper
+    return decorator
+
+
+def _shown(book):
+    values = book.__dict__
+    return tuple(values.get(field.attname, DEFERRED) for field in Book._meta.concrete_fields
+                 if field.attname not in HIDDEN_BOOK_COLUMNS)  # Deferred columns compare as unknown
+
+
+@receiver(post_init, sender=Book)
+def _snapshot(sender, instance, **kwargs):
+    instance._cache_shown = _shown(instance) if instance.pk is not None else None
+
+
+@receiver(post_save, sender=Book)
+def _book_saved(sender, instance, created, **kwargs):
+    shown = _shown(instance)
+    if created or shown != instance._cache_shown or DEFERRED in shown:
+        invalidate_objects('books', [instance.pk])
+    instance._cache_shown = shown
+
+
+@receiver(post_delete, sender=Book)
+def _book_deleted(sender, instance, **kwargs):
+    invalidate_objects('books', [instance.pk])
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def _review_changed(sender, instance, **kwargs):
+    # Book responses embed the rating aggregates
+    _invalidate([_generation_key('reviews'), _object_key('reviews', instance.pk),
+                 _generation_key('books'), _object_key('books', instance.book_id)])
+
+
+@receiver(post_save, sender=Seller)
+@receiver(post_delete, sender=Seller)
+def _seller_changed(sender, instance, **kwargs):
+    invalidate_lists('sellers')
@@ -0,0 +1,86 @@
+"""
+Near-duplicate cover lookup by perceptual hash.
+
+A cover's 64-bit pHash is also stored as four 16-bit chunks, each in its own
+indexed column (multi-index hashing). If two hashes are within hamming
+distance d, then by pigeonhole one of their four chunks differs in at most
+d // 4 bits. A lookup therefore probes each chunk index with the values
+within that radius, which is four indexed IN lists, and verifies only the
+candidates found. It never scans the whole catalogue.
+"""
+from itertools import combinations
+
+from django.db.models import Q
+
+from api.models import Book
+
+CHUNKS = 4
+CHUNK_BITS = 16
+MAX_DISTANCE = 11  # Radius 2 per chunk: 137 probe values per chunk index
+HASH_MASK = (1 << 64) - 1
+
+
+def to_signed(value):
+    """Unsigned 64-bit hash -> BigIntegerField value."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value):
+    return value & HASH_MASK
+
+
+def chunks(value):
+    value = to_unsigned(value)
+    return [(value >> (CHUNK_BITS * (CHUNKS - 1 - i))) & 0xFFFF for i in range(CHUNKS)]
+
+
+def hash_fields(phash_hex, dhash_hex):
+    """Book field values for hex hashes as found in an image manifest."""
+    phash, dhash = int(phash_hex, 16), int(dhash_hex, 16)
+    fields = {'cover_phash': to_signed(phash), 'cover_dhash': to_signed(dhash)}
+    fields.update({f'phash_chunk_{i}': chunk for i, chunk in enumerate(chunks(phash))})
+    return fields
+
+
+def hamming(a, b):
+    return (to_unsigned(a) ^ to_unsigned(b)).bit_count()
+
+
+def _within_radius(chunk, radius):
+    values = [chunk]
+    for flips in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), flips):
+            mask = 0
+            for bit in bits:
+                mask |= 1 << bit
+            values.append(chunk ^ mask)
+    return values
+
+
+def near_duplicates(phash, dhash=None, max_distance=8, exclude_book_id=None, limit=50):
+    """
+    Books whose cover pHash is within `max_distance` bits of `phash`, closest
+    first, as dicts with both hamming distances.
+    """
+    if not 0 <= max_distance <= MAX_DISTANCE:
+        raise ValueError(f"max_distance must be between 0 and {MAX_DISTANCE}.")
+    radius = max_distance // CHUNKS
+    probe = Q()
+    for i, chunk in enumerate(chunks(phash)):
+        probe |= Q(**{f'phash_chunk_{i}__in': _within_radius(chunk, radius)})
+
+    candidates = Book.objects.filter(probe)
+    if exclude_book_id is not None:
+        candidates = candidates.exclude(pk=exclude_book_id)
+    matches = []
+    rows = candidates.values_list('book_id', 'seller_id', 'title', 'author', 'cover_phash', 'cover_dhash')
+    for book_id, seller_id, title, author, cover_phash, cover_dhash in rows.iterator():
+        distance = hamming(phash, cover_phash)
+        if distance <= max_distance:
+            matches.append({
+                'book_id': book_id, 'seller': seller_id, 'title': title, 'author': author,
+                'phash_distance': distance,
+                'dhash_distance': hamming(dhash, cover_dhash) if dhash is not None and cover_dhash is not None else None,
+            })
+    matches.sort(key=lambda match: (match['phash_distance'], match['dhash_distance'] or 0, match['book_id']))
+    return matches[:limit]
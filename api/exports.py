@@ -0,0 +1,147 @@
+"""
+Streaming CSV/NDJSON exports of orders and books.
+
+Rows come straight from `values_list(...).iterator()` (a server-side cursor
+on postgres) and are written out in ~64 KB chunks through a
+StreamingHttpResponse, bypassing the DRF serializers. Memory use stays flat
+whatever the number of rows exported.
+
+Under ASGI, Django buffers a sync iterator whole before sending it, so
+exports served there get an async iterator that fetches each chunk on the
+request's sync thread, where its database cursor lives.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from api.models import Book, Order
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+ORDER_COLUMNS = [
+    ('order_id', 'order_id'),
+    ('order_date', 'order_date'),
+    ('status', 'status'),
+    ('user_id', 'user_id'),
+    ('book_id', 'book_id'),
+    ('book_title', 'book__title'),
+    ('seller_id', 'book__seller_id'),
+    ('quantity', 'quantity'),
+    ('total_amount', 'total_amount'),
+]
+
+BOOK_COLUMNS = [
+    ('book_id', 'book_id'),
+    ('seller_id', 'seller_id'),
+    ('title', 'title'),
+    ('author', 'author'),
+    ('category', 'category'),
+    ('price', 'price'),
+    ('availability_status', 'availability_status'),
+    ('rental_option', 'rental_option'),
+    ('condition', 'condition'),
+    ('quantity', 'quantity'),
+]
+
+CHUNK_ROWS = 2000
+FLUSH_BYTES = 64 * 1024
+
+
+class _Echo:
+    """File-like object handing csv.writer output straight back."""
+
+    def write(self, value):
+        return value
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _lines(queryset, columns, fmt):
+    header = [name for name, _ in columns]
+    rows = queryset.values_list(*(lookup for _, lookup in columns)).iterator(chunk_size=CHUNK_ROWS)
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow([_encode_value(value) for value in row])
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(header, row)), default=str) + '\n'
+
+
+def _buffered(lines):
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+async def _aiterate(chunks):
+    next_chunk = sync_to_async(next)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()  # Releases the cursor when the client goes away early
+
+
+def served_by_asgi(request):
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+def day_bounds(start=None, end=None):
+    """Aware datetimes covering whole days, so filters stay index (and partition) friendly."""
+    lower = timezone.make_aware(datetime.combine(start, time.min)) if start else None
+    upper = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)) if end else None
+    return lower, upper
+
+
+def filter_orders(queryset, seller_ids=None, start=None, end=None, status=None):
+    if seller_ids is not None:
+        queryset = queryset.filter(book__seller_id__in=seller_ids)
+    lower, upper = day_bounds(start, end)
+    if lower:
+        queryset = queryset.filter(order_date__gte=lower)
+    if upper:
+        queryset = queryset.filter(order_date__lt=upper)
+    if status:
+        queryset = queryset.filter(status=status)
+    return queryset
+
+
+def stream_export(queryset, columns, fmt, filename, is_async=False):
+    chunks = _buffered(_lines(queryset, columns, fmt))
+    response = StreamingHttpResponse(_aiterate(chunks) if is_async else chunks, content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+def export_orders(fmt, is_async=False, **filters):
+    queryset = filter_orders(Order.objects.order_by('order_id'), **filters)
+    return stream_export(queryset, ORDER_COLUMNS, fmt, 'orders', is_async)
+
+
+def export_books(fmt, seller_ids=None, availability_status=None, is_async=False):
+    queryset = Book.objects.order_by('book_id')
+    if seller_ids is not None:
+        queryset = queryset.filter(seller_id__in=seller_ids)
+    if availability_status is not None:
+        queryset = queryset.filter(availability_status=availability_status)
+    return stream_export(queryset, BOOK_COLUMNS, fmt, 'books', is_async)
@@ -0,0 +1,214 @@
+"""
+Precomputed facet counts for catalogue browsing.
+
+BookFacetCell holds the number of books for every combination of category,
+condition, rental option, availability and price bucket. That is a few
+thousand rows at most, whatever the size of the catalogue. Book signals keep
+it current: post_init snapshots a loaded book's cell and post_save/post_delete
+move it. Stock changes made with queryset updates report availability flips
+through availability_changed(), bulk upserts report their cell moves
+through moved(). Other bulk writes that bypass these paths call rebuild().
+
+facet_counts() reads all cells once and computes every facet in one pass.
+The counts are disjunctive: each facet is counted with every filter applied
+except its own, so selecting "fiction" still shows the other categories.
+"""
+from bisect import bisect_right
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from api.models import Book, BookFacetCell
+
+KEY_FIELDS = ('category', 'condition', 'rental_option', 'availability_status', 'price_bucket')
+SOURCE_FIELDS = ('category', 'condition', 'rental_option', 'availability_status', 'price')
+FACETS = ('category', 'condition', 'rental_option', 'availability_status', 'price')
+
+
+def price_edges():
+    return tuple(getattr(settings, 'FACET_PRICE_BUCKETS', (0, 100, 250, 500, 1000, 2500)))
+
+
+def price_bucket(price, edges=None):
+    edges = edges or price_edges()
+    return max(bisect_right(edges, price) - 1, 0)
+
+
+def bucket_labels(edges=None):
+    edges = edges or price_edges()
+    return [f"{low}-{high}" for low, high in zip(edges, edges[1:])] + [f"{edges[-1]}+"]
+
+
+def cell_key(category, condition, rental_option, availability_status, price):
+    return (category, condition, bool(rental_option), bool(availability_status), price_bucket(price))
+
+
+def book_key(book):
+    return cell_key(*(getattr(book, name) for name in SOURCE_FIELDS))
+
+
+def _bump(key, delta):
+    lookup = dict(zip(KEY_FIELDS, key))
+    if BookFacetCell.objects.filter(**lookup).update(count=F('count') + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            BookFacetCell.objects.create(count=delta, **lookup)
+    except IntegrityError:
+        # Created concurrently by another book landing in the same cell
+        BookFacetCell.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def move(old_key, new_key):
+    if old_key == new_key:
+        return
+    if old_key is not None:
+        _bump(old_key, -1)
+    if new_key is not None:
+        _bump(new_key, 1)
+
+
+def moved(moves):
+    """Apply many (old_key, new_key) moves, one UPDATE per cell touched. None is 'no cell'."""
+    deltas = Counter()
+    for old_key, new_key in moves:
+        if old_key == new_key:
+            continue
+        if old_key is not None:
+            deltas[old_key] -= 1
+        if new_key is not None:
+            deltas[new_key] += 1
+    for key, delta in deltas.items():
+        if delta:
+            _bump(key, delta)
+
+
+def availability_changed(rows, available):
+    """
+    Books updated in bulk flipped to `available`. `rows` are
+    (category, condition, rental_option, price) tuples taken under the row lock.
+    """
+    moves = Counter()
+    for category, condition, rental_option, price in rows:
+        moves[cell_key(category, condition, rental_option, available, price)] += 1
+    for new_key, count in moves.items():
+        old_key = new_key[:3] + (not available,) + new_key[4:]
+        _bump(old_key, -count)
+        _bump(new_key, count)
+
+
+def rebuild():
+    """Recompute every cell from the Book table (after raw SQL or bulk writes)."""
+    counts = Counter()
+    rows = (Book.objects.values('category', 'condition', 'rental_option', 'availability_status', 'price')
+            .annotate(books=Count('pk')).order_by())
+    for row in rows.iterator(chunk_size=5000):
+        counts[cell_key(row['category'], row['condition'], row['rental_option'], row['availability_status'],
+                        row['price'])] += row['books']
+    with transaction.atomic():
+        BookFacetCell.objects.all().delete()
+        BookFacetCell.objects.bulk_create(
+            [BookFacetCell(count=count, **dict(zip(KEY_FIELDS, key))) for key, count in counts.items() if count],
+            batch_size=2000,
+        )
+    return len(counts)
+
+
+def _selected(params, name, parse=str):
+    raw = params.get(name)
+    if not raw:
+        return None
+    return {parse(value.strip()) for value in raw.split(',') if value.strip()}
+
+
+def _parse_bool(value):
+    lowered = value.lower()
+    if lowered in ('true', '1', 'yes'):
+        return True
+    if lowered in ('false', '0', 'no'):
+        return False
+    raise ValueError(f"Invalid boolean value: {value!r}")
+
+
+def facet_counts(params):
+    """
+    {'total': n, 'facets': {facet: {value: count}}} for the filters in
+    `params`: comma-separated category, condition, rental_option,
+    availability_status and price (bucket labels, e.g. "100-250").
+    Raises ValueError for invalid filter values.
+    """
+    labels = bucket_labels()
+    price_filter = _selected(params, 'price')
+    if price_filter and not price_filter <= set(labels):
+        raise ValueError(f"Invalid price bucket. Choose from: {', '.join(labels)}.")
+    filters = {
+        'category': _selected(params, 'category'),
+        'condition': _selected(params, 'condition'),
+        'rental_option': _selected(params, 'rental_option', _parse_bool),
+        'availability_status': _selected(params, 'availability_status', _parse_bool),
+        'price': {labels.index(label) for label in price_filter} if price_filter else None,
+    }
+    active = [(index, values) for index, values in enumerate(filters.values()) if values is not None]
+
+    total = 0
+    facets = {name: defaultdict(int) for name in FACETS}
+    for cell in BookFacetCell.objects.filter(count__gt=0).values_list(*KEY_FIELDS, 'count'):
+        key, count = cell[:5], cell[5]
+        failed = [index for index, values in active if key[index] not in values]
+        if not failed:
+            total += count
+        if len(failed) > 1:
+            continue
+        # Matches every filter, or every filter but one: count it for that one facet only
+        for index, name in enumerate(FACETS):
+            if not failed or failed[0] == index:
+                facets[name][key[index]] += count
+
+    def label(name, value):
+        if name == 'price':
+            return labels[value]
+        return str(value).lower() if isinstance(value, bool) else value
+
+    return {
+        'total': total,
+        'facets': {
+            name: {label(name, value): count for value, count in sorted(counts.items())}
+            for name, counts in facets.items()
+        },
+    }
+
+
+@receiver(post_init, sender=Book)
+def _snapshot(sender, instance, **kwargs):
+    # Skip books loaded with .only()/.defer(): reading a deferred field would query
+    values = instance.__dict__
+    if instance.pk is not None and all(name in values for name in SOURCE_FIELDS):
+        instance._facet_key = book_key(instance)
+    else:
+        instance._facet_key = None
+
+
+@receiver(post_save, sender=Book)
+def _book_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    new_key = book_key(instance)
+    if created:
+        old_key = None
+    elif instance._facet_key is not None:
+        old_key = instance._facet_key
+    else:
+        # No snapshot (deferred fields or unsaved copy): the cell the row was in is unknown
+        transaction.on_commit(rebuild)
+        return
+    move(old_key, new_key)
+    instance._facet_key = new_key
+
+
+@receiver(post_delete, sender=Book)
+def _book_deleted(sender, instance, **kwargs):
+    move(getattr(instance, '_facet_key', None) or book_key(instance), None)
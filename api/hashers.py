@@ -0,0 +1,14 @@
+from django.contrib.auth.hashers import Argon2PasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2id at the OWASP baseline (19 MiB, 2 passes, 1 lane).
+
+    Much cheaper per login than Django's default PBKDF2 iteration count while
+    staying memory-hard. Hashes made with other parameters still verify and
+    are upgraded on the next successful login (must_update).
+    """
+    time_cost = 2
+    memory_cost = 19456  # KiB
+    parallelism = 1
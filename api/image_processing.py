@@ -0,0 +1,134 @@
+"""
+Cover image processing, run in worker processes.
+
+Only Pillow, NumPy and OpenCV are imported here so the module can be loaded
+by freshly spawned workers without setting up Django.  Output is content
+addressed: variants of an upload live under covers/<sha256 of the upload>/,
+so identical covers uploaded for several books are encoded and stored once.
+
+The manifest also carries 64-bit perceptual hashes of the cover (pHash and
+dHash, as 16 hex digits), which survive resizing and re-encoding, unlike
+the sha256.
+"""
+import base64
+import hashlib
+import io
+import json
+import os
+import uuid
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+COVER_DIR = 'covers'
+PLACEHOLDER_SIZE = 16
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+
+def cover_dir(digest):
+    return f"{COVER_DIR}/{digest[:2]}/{digest}"
+
+
+def _placeholder(image):
+    """Tiny blurred JPEG as a data URI, shown while the real thumbnail loads."""
+    tiny = image.copy()
+    tiny.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    buffer = io.BytesIO()
+    tiny.save(buffer, 'JPEG', quality=40)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+def _pack(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def dhash(gray):
+    """Gradient hash: is each pixel of a 9x8 thumbnail brighter than its left neighbour."""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    return _pack(small[:, 1:] > small[:, :-1])
+
+
+def phash(gray):
+    """DCT hash: the 8x8 lowest frequencies of a 32x32 thumbnail against their median."""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8]
+    return _pack(low > np.median(low.ravel()[1:]))  # The DC term would skew the median
+
+
+def perceptual_hashes(image):
+    """{'phash': hex, 'dhash': hex} of a PIL image."""
+    gray = np.asarray(image.convert('L'))
+    return {'phash': f"{phash(gray):016x}", 'dhash': f"{dhash(gray):016x}"}
+
+
+def hash_cover(path):
+    """Perceptual hashes of the image file at `path` (the batch command's worker function)."""
+    with Image.open(path) as image:
+        return perceptual_hashes(ImageOps.exif_transpose(image))
+
+
+def _tmp_path(path):
+    # Workers processing the same upload write the same files: each needs its own temp file
+    return f"{path}.{uuid.uuid4().hex}.tmp"
+
+
+def _write_manifest(manifest_path, manifest):
+    tmp_manifest = _tmp_path(manifest_path)
+    with open(tmp_manifest, 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(tmp_manifest, manifest_path)
+
+
+def _save(image, path, fmt, **options):
+    tmp_path = _tmp_path(path)
+    image.save(tmp_path, fmt, **options)
+    os.replace(tmp_path, path)
+
+
+def process_cover(source_path, media_root, widths):
+    """
+    Strip metadata from the cover at `source_path` and write resized WebP/JPEG
+    variants plus a placeholder. Returns (digest, manifest); the manifest maps
+    variant names to paths relative to `media_root`.
+    """
+    with open(source_path, 'rb') as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()
+    relative_dir = cover_dir(digest)
+    target_dir = os.path.join(media_root, relative_dir)
+    manifest_path = os.path.join(target_dir, 'manifest.json')
+
+    if os.path.exists(manifest_path):  # Same cover already processed
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+        if 'phash' not in manifest:  # Processed before covers were hashed
+            manifest.update(hash_cover(os.path.join(media_root, manifest['original'])))
+            _write_manifest(manifest_path, manifest)
+        return digest, manifest
+
+    os.makedirs(target_dir, exist_ok=True)
+    image = Image.open(io.BytesIO(data))
+    image = ImageOps.exif_transpose(image)  # Apply the EXIF rotation before dropping EXIF
+    image = image.convert('RGB')
+
+    # Re-encoding without exif=/icc_profile= drops all metadata (GPS, camera, ...)
+    _save(image, os.path.join(target_dir, 'original.jpg'), 'JPEG', quality=90, optimize=True)
+    manifest = {'original': f"{relative_dir}/original.jpg", 'placeholder': _placeholder(image), 'sizes': {}}
+    manifest.update(perceptual_hashes(image))
+
+    for width in sorted(widths):
+        variant = image.copy()
+        if variant.width > width:
+            variant.thumbnail((width, width * 4), Image.LANCZOS)
+        _save(variant, os.path.join(target_dir, f"w{width}.webp"), 'WEBP', quality=WEBP_QUALITY, method=4)
+        _save(variant, os.path.join(target_dir, f"w{width}.jpg"), 'JPEG',
+              quality=JPEG_QUALITY, optimize=True, progressive=True)
+        manifest['sizes'][str(width)] = {
+            'webp': f"{relative_dir}/w{width}.webp",
+            'jpeg': f"{relative_dir}/w{width}.jpg",
+        }
+
+    _write_manifest(manifest_path, manifest)
+    return digest, manifest
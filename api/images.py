@@ -0,0 +1,100 @@
+"""
+Background processing of Book.image uploads.
+
+After a book with a fresh upload is committed, the cover is handed to a
+process pool (api.image_processing.process_cover). When the variants are
+written, the book is pointed at the metadata-free, content-addressed copy,
+gets the cover's perceptual hashes (see api.duplicates), and the raw upload
+is removed. Variants are written below MEDIA_ROOT, so this expects the
+default filesystem storage.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from api.cache import invalidate_objects
+from api.duplicates import hash_fields
+from api.image_processing import COVER_DIR, process_cover
+from api.models import Book
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: forking a threaded web worker is unsafe
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def needs_processing(book):
+    return bool(book.image) and not book.image.name.startswith(f"{COVER_DIR}/")
+
+
+def _store_result(book_id, upload_name, future):
+    try:
+        digest, manifest = future.result()
+    except Exception:
+        logger.exception("Processing cover %s of book %s failed", upload_name, book_id)
+        return
+    try:
+        # Only if the book still points at the upload we processed
+        updated = Book.objects.filter(pk=book_id, image=upload_name).update(
+            image=manifest['original'], image_hash=digest, image_variants=manifest,
+            **hash_fields(manifest['phash'], manifest['dhash']),
+        )
+        if updated:
+            default_storage.delete(upload_name)
+            invalidate_objects('books', [book_id])
+    finally:
+        connection.close()  # Runs on the executor's callback thread
+
+
+def submit(book):
+    """Queue the book's current upload for processing."""
+    upload_name = book.image.name
+    future = _get_executor().submit(
+        process_cover, book.image.path, str(settings.MEDIA_ROOT), tuple(settings.IMAGE_VARIANT_WIDTHS),
+    )
+    future.add_done_callback(lambda f: _store_result(book.pk, upload_name, f))
+
+
+@receiver(post_save, sender=Book)
+def _process_new_cover(sender, instance, **kwargs):
+    if needs_processing(instance):
+        transaction.on_commit(lambda: submit(instance))
+
+
+def variant_urls(book, request=None):
+    """Public URLs of the processed variants, or None until they exist."""
+    manifest = book.image_variants
+    if not manifest:
+        return None
+
+    def url(name):
+        location = default_storage.url(name)
+        return request.build_absolute_uri(location) if request is not None else location
+
+    return {
+        'placeholder': manifest['placeholder'],
+        'original': url(manifest['original']),
+        'sizes': {
+            width: {fmt: url(name) for fmt, name in formats.items()}
+            for width, formats in manifest['sizes'].items()
+        },
+    }
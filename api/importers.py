@@ -0,0 +1,267 @@
+"""
+Streaming bulk import of seller inventory.
+
+Rows are read lazily from CSV or JSONL, validated in chunks and upserted with
+`INSERT ... ON CONFLICT (seller_id, title, author) DO UPDATE`, which adds the
+incoming quantity to the stored one inside the database.  Memory use is
+bounded by the chunk size, whatever the size of the input: each chunk moves
+its own facet cells, publishes its stock to live streams (api.live), updates
+its books in the search index and response cache, and is handed to
+`on_written` (e.g. request matching) once committed.
+
+Rows are validated by the fields of BookImportSerializer, built once per
+import: instantiating a ModelSerializer per row rebuilds every field from the
+model and cost more than the upsert itself (benchmarks/import_bench.py).
+"""
+import csv
+import json
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.db import connections, transaction
+from rest_framework import serializers
+from rest_framework.fields import SkipField, empty
+
+from api import facets, live
+from api.cache import invalidate, invalidate_objects
+from api.models import Book, Seller
+from api.search import book_index
+
+IMPORT_FIELDS = ['seller', 'title', 'author', 'category', 'price', 'availability_status',
+                 'rental_option', 'condition', 'quantity']
+
+# Columns overwritten from the incoming row when the book already exists;
+# `quantity` is incremented instead.
+UPSERT_UPDATE_FIELDS = ['category', 'price', 'availability_status', 'rental_option', 'condition']
+CONFLICT_FIELDS = ['seller', 'title', 'author']
+
+FORMATS = ('csv', 'jsonl')
+
+
+class BookImportSerializer(serializers.ModelSerializer):
+    seller = serializers.IntegerField(min_value=1)  # Checked per chunk, not per row
+
+    class Meta:
+        model = Book
+        fields = IMPORT_FIELDS
+        validators = []  # Duplicates are merged by the upsert
+
+
+def row_fields():
+    """The validating fields of BookImportSerializer, to reuse for every row."""
+    return BookImportSerializer().fields
+
+
+def validate_row(fields, data):
+    """Return (validated_data, errors) for one row, as BookImportSerializer(data=data) would."""
+    validated, errors = {}, {}
+    for name, field in fields.items():
+        try:
+            validated[name] = field.run_validation(data.get(name, empty))
+        except SkipField:  # Optional and missing: the model default applies
+            pass
+        except serializers.ValidationError as exc:
+            errors[name] = exc.detail
+    return validated, errors
+
+
+@dataclass
+class ImportResult:
+    upserted: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+
+
+def detect_format(filename, default='csv'):
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(stream, fmt):
+    """Yield (row_number, data, error) from a text stream, one row at a time."""
+    if fmt == 'csv':
+        for row_number, row in enumerate(csv.DictReader(stream), start=1):
+            yield row_number, {key: value for key, value in row.items() if key and value != ''}, None
+    elif fmt == 'jsonl':
+        for row_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as exc:
+                yield row_number, None, {'non_field_errors': [f"Invalid JSON: {exc}"]}
+                continue
+            if not isinstance(data, dict):
+                yield row_number, None, {'non_field_errors': ["Each line must be a JSON object."]}
+                continue
+            yield row_number, data, None
+    else:
+        raise ValueError(f"Unsupported format {fmt!r}. Choose from: {', '.join(FORMATS)}.")
+
+
+def rows_from_list(items):
+    """Adapt an already parsed JSON list to the read_rows() shape."""
+    for row_number, data in enumerate(items, start=1):
+        if isinstance(data, dict):
+            yield row_number, data, None
+        else:
+            yield row_number, None, {'non_field_errors': ["Each item must be a JSON object."]}
+
+
+def _insert_fields():
+    return [f for f in Book._meta.concrete_fields if not f.primary_key]
+
+
+def _upsert_sql(connection, fields, row_count):
+    qn = connection.ops.quote_name
+    table = qn(Book._meta.db_table)
+    columns = ', '.join(qn(f.column) for f in fields)
+    row_placeholder = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    conflict = ', '.join(qn(Book._meta.get_field(name).column) for name in CONFLICT_FIELDS)
+    updates = [f"{qn(name)} = EXCLUDED.{qn(name)}" for name in UPSERT_UPDATE_FIELDS]
+    updates.append(f"{qn('quantity')} = {table}.{qn('quantity')} + EXCLUDED.{qn('quantity')}")
+    sql = (
+        f"INSERT INTO {table} ({columns}) VALUES {', '.join([row_placeholder] * row_count)} "
+        f"ON CONFLICT ({conflict}) DO UPDATE SET {', '.join(updates)}"
+    )
+    if connection.features.can_return_rows_from_bulk_insert:
+        returning = [Book._meta.get_field(name).column for name in ['book_id', *CONFLICT_FIELDS, 'quantity']]
+        sql += f" RETURNING {', '.join(qn(column) for column in returning)}"
+    return sql
+
+
+def _write(books, using):
+    """
+    Upsert unsaved Book instances. When the backend can return them, their pk
+    and stored quantity (incoming plus existing copies) are set.
+    """
+    connection = connections[using]
+    fields = _insert_fields()
+    batch_size = max(connection.ops.bulk_batch_size(fields, books), 1)
+    by_key = {(book.seller_id, book.title, book.author): book for book in books}
+    with connection.cursor() as cursor:
+        for start in range(0, len(books), batch_size):
+            batch = books[start:start + batch_size]
+            sql = _upsert_sql(connection, fields, len(batch))
+            params = [
+                f.get_db_prep_save(f.pre_save(book, True), connection)
+                for book in batch for f in fields
+            ]
+            cursor.execute(sql, params)
+            if connection.features.can_return_rows_from_bulk_insert:
+                for book_id, *key, quantity in cursor.fetchall():
+                    book = by_key[tuple(key)]
+                    book.pk, book.quantity = book_id, quantity
+
+
+def _stored_cells(keys, using):
+    """Facet cells of the books among `keys` that exist, locked until the chunk commits."""
+    rows = (Book.objects.using(using).select_for_update()
+            .filter(seller_id__in={seller_id for seller_id, _, _ in keys}, title__in={title for _, title, _ in keys})
+            .values_list('seller_id', 'title', 'author', *facets.SOURCE_FIELDS))
+    return {(seller_id, title, author): facets.cell_key(*values)
+            for seller_id, title, author, *values in rows if (seller_id, title, author) in keys}
+
+
+def _upsert_chunk(chunk, fields, result, allowed_sellers, on_error, using):
+    """Upsert one chunk; returns the written books (with their pk when the backend returns it)."""
+    valid = []
+    for row_number, data, error in chunk:
+        if error is None:
+            validated, error = validate_row(fields, data)
+            if not error:
+                valid.append((row_number, validated))
+                continue
+        result.failed += 1
+        on_error({'row': row_number, 'errors': error})
+
+    seller_ids = {data['seller'] for _, data in valid}
+    existing = set(Seller.objects.using(using).filter(pk__in=seller_ids).values_list('pk', flat=True))
+
+    # Merge rows for the same (seller, title, author): ON CONFLICT cannot touch
+    # one row twice in a single statement.
+    merged = {}
+    for row_number, data in valid:
+        seller_id = data.pop('seller')
+        if seller_id not in existing:
+            error = "Seller does not exist."
+        elif allowed_sellers is not None and seller_id not in allowed_sellers:
+            error = "You can only import books for your own seller accounts."
+        else:
+            error = None
+        if error:
+            result.failed += 1
+            on_error({'row': row_number, 'errors': {'seller': [error]}})
+            continue
+
+        key = (seller_id, data['title'], data['author'])
+        book = Book(seller_id=seller_id, **data)
+        if key in merged:
+            book.quantity += merged[key].quantity
+        merged[key] = book
+        result.upserted += 1
+
+    if not merged:
+        return []
+    with transaction.atomic(using=using):
+        # Upserted rows take the incoming category/price/...: move each from the cell it was in
+        stored = _stored_cells(merged.keys(), using)
+        facets.moved((stored.get(key), facets.book_key(book)) for key, book in merged.items())
+        _write(list(merged.values()), using)
+        # Delivered once the chunk commits
+        live.stock_changed([(book.pk, book.quantity, book.availability_status)
+                            for book in merged.values() if book.pk is not None])
+    return list(merged.values())
+
+
+def upsert_books(rows, chunk_size=1000, allowed_sellers=None, defaults=None, on_error=None, on_written=None,
+                 using='default'):
+    """
+    Validate and upsert `rows` ((row_number, data, error) tuples, see read_rows)
+    chunk by chunk.
+
+    `allowed_sellers` restricts the seller ids rows may target, `defaults` fills
+    missing fields (e.g. the seller), and `on_error` receives a
+    {'row': n, 'errors': {...}} dict per rejected row.  Without `on_error`
+    errors are collected on the returned ImportResult.  `on_written` receives
+    the book ids of each chunk once it is written; when the backend cannot
+    return ids it is called once at the end with None ("all books").
+    """
+    result = ImportResult()
+    if on_error is None:
+        on_error = result.errors.append
+    if defaults:
+        rows = ((n, {**defaults, **data} if data is not None else None, e) for n, data, e in rows)
+
+    rows, fields = iter(rows), row_fields()
+    unknown_ids = False
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        books = _upsert_chunk(chunk, fields, result, allowed_sellers, on_error, using)
+        if not books:
+            continue
+        # Raw SQL bypasses the Book signals
+        if books[0].pk is None:
+            unknown_ids = True
+            continue
+        for book in books:
+            book_index.update(book)
+        book_ids = [book.pk for book in books]
+        invalidate_objects('books', book_ids)
+        if on_written is not None:
+            on_written(book_ids)
+
+    if unknown_ids:  # Nothing to update precisely: recount and reset everything once
+        facets.rebuild()
+        book_index.reset()
+        invalidate('books')
+        if on_written is not None:
+            on_written(None)
+    return result
@@ -0,0 +1,105 @@
+"""
+Race-free stock changes on Book.
+
+Every change is one conditional UPDATE using F() expressions, so the database
+row lock serializes concurrent buyers and restocks without any read-modify-write
+in Python.  availability_status flips to False when the last copy is taken
+and back to True when a sold-out book gets copies back (restock or a
+cancelled order); a listing the seller took down stays down.  Flips move the
+book between facet cells, so they are reported to api.facets, and every
+change is published to live stock streams (api.live).
+"""
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+
+from api import facets, live
+from api.cache import invalidate_objects
+from api.models import Book
+
+FACET_COLUMNS = ('category', 'condition', 'rental_option', 'price')
+
+
+class OutOfStock(Exception):
+    pass
+
+
+def reserve_stock(book_id, quantity):
+    """
+    Take `quantity` copies of an available book and return its unit price.
+    Raises OutOfStock if fewer copies are left.
+    """
+    updated = Book.objects.filter(pk=book_id, availability_status=True, quantity__gte=quantity).update(
+        quantity=F('quantity') - quantity,
+        # Evaluated against the pre-update row: the last copies flip availability
+        availability_status=Case(When(quantity=quantity, then=Value(False)), default=Value(True)),
+    )
+    if not updated:
+        raise OutOfStock(f"Not enough copies of book {book_id} in stock.")
+    invalidate_objects('books', [book_id])
+    # The row is locked by our UPDATE until commit, so the price cannot move under us
+    category, condition, rental_option, price, remaining, available = (
+        Book.objects.values_list('category', 'condition', 'rental_option', 'price', 'quantity', 'availability_status')
+        .get(pk=book_id)
+    )
+    if not available:
+        facets.availability_changed([(category, condition, rental_option, price)], False)
+    live.stock_changed([(book_id, remaining, available)])
+    return price
+
+
+def _sold_out(queryset):
+    """Lock the sold-out rows of `queryset` ahead of an UPDATE that makes them available again."""
+    return list(queryset.filter(quantity=0, availability_status=False).select_for_update()
+                .values_list(*FACET_COLUMNS))
+
+
+def _available_if_sold_out():
+    # Evaluated against the pre-update row; a listing the seller took down stays down
+    return Case(When(quantity=0, then=Value(True)), default=F('availability_status'))
+
+
+def _publish(queryset):
+    live.stock_changed(queryset.values_list('book_id', 'quantity', 'availability_status'))
+
+
+def release_stock(book_id, quantity):
+    """Put `quantity` copies back, e.g. when an order is cancelled."""
+    books = Book.objects.filter(pk=book_id)
+    with transaction.atomic():
+        flipped = _sold_out(books)
+        books.update(quantity=F('quantity') + quantity, availability_status=_available_if_sold_out())
+        facets.availability_changed(flipped, True)
+        _publish(books)
+    invalidate_objects('books', [book_id])
+
+
+def release_stock_many(quantities):
+    """Put copies back on several books ({book_id: quantity}) in one UPDATE."""
+    if not quantities:
+        return
+    books = Book.objects.filter(pk__in=quantities)
+    with transaction.atomic():
+        flipped = _sold_out(books)
+        books.update(
+            quantity=F('quantity') + Case(
+                *(When(pk=book_id, then=Value(quantity)) for book_id, quantity in quantities.items()),
+                default=Value(0),
+            ),
+            availability_status=_available_if_sold_out(),
+        )
+        facets.availability_changed(flipped, True)
+        _publish(books)
+    invalidate_objects('books', quantities)
+
+
+def restock(book, quantity):
+    """Add copies to an existing listing and refresh `book` with the stored values."""
+    books = Book.objects.filter(pk=book.pk)
+    with transaction.atomic():
+        flipped = _sold_out(books)
+        books.update(quantity=F('quantity') + quantity, availability_status=_available_if_sold_out())
+        facets.availability_changed(flipped, True)
+        book.refresh_from_db(fields=['quantity', 'availability_status'])
+        live.stock_changed([(book.pk, book.quantity, book.availability_status)])
+    invalidate_objects('books', [book.pk])
+    return book
@@ -0,0 +1,336 @@
+"""
+Live order-status and stock updates, streamed as Server-Sent Events.
+
+Publishers (api.orders, api.inventory and the Book post_save receiver) hand
+events to the configured backend. The backend delivers them to the Hub of
+every web worker:
+
+- LocalBackend delivers in-process when the transaction commits. It is for
+  tests and single-worker deployments.
+- PostgresBackend sends them with pg_notify(), which postgres only delivers
+  on commit. Each worker LISTENs on one async connection.
+
+The Hub lives on the worker's event loop. It fans events out to per-stream
+bounded queues, so an idle stream costs a queue and a suspended generator,
+not a thread. A stream whose queue fills up is dropped rather than
+buffering without limit. The client reconnects with Last-Event-ID and is
+replayed the missed events from a per-channel ring buffer, or sent a
+"reset" event if they have already been evicted.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, defaultdict, deque
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections, transaction
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from api.models import Book
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'bookhub_live'
+NOTIFY_MAX_BYTES = 7900  # postgres rejects NOTIFY payloads of 8000 bytes or more
+RESET = 'reset'
+
+_ids = itertools.count(1)
+
+
+def _config():
+    config = {
+        'BACKEND': 'api.live.PostgresBackend',
+        'QUEUE_SIZE': 100,  # Undelivered events per stream before it is dropped
+        'REPLAY_SIZE': 200,  # Recent events kept per channel for Last-Event-ID resume
+        'MAX_CHANNELS': 20000,  # Channels with a replay buffer, least recently used evicted
+        'HEARTBEAT_SECONDS': 15,  # Comment line sent on idle streams so proxies keep them open
+        'RETRY_MS': 3000,  # Client reconnect delay
+        'MAX_BOOKS': 100,  # Books one stream may follow
+    }
+    config.update(getattr(settings, 'LIVE_EVENTS', {}))
+    return config
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def book_channel(book_id):
+    return f'book:{book_id}'
+
+
+def make_event(channel, event_type, data):
+    # Unique across workers without coordination: ms timestamp, pid, counter
+    return {'id': f'{time.time_ns() // 1_000_000:x}-{os.getpid():x}-{next(_ids):x}',
+            'channel': channel, 'type': event_type, 'data': data}
+
+
+def format_event(event):
+    lines = [f"event: {event['type']}", f"data: {json.dumps(event['data'], separators=(',', ':'))}"]
+    if event.get('id'):
+        lines.insert(0, f"id: {event['id']}")
+    return '\n'.join(lines) + '\n\n'
+
+
+# Fan-out
+
+class Subscription:
+    def __init__(self, channels, size):
+        self.channels = channels
+        self.queue = asyncio.Queue(maxsize=size)
+
+    def overflow(self):
+        # Make room for the end-of-stream marker; the client resumes from its last event id
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def messages(self, heartbeat):
+        """SSE chunks until the hub drops the subscription."""
+        while True:
+            try:
+                event = await asyncio.wait_for(self.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if event is None:
+                return
+            yield format_event(event)
+
+
+class Hub:
+    """Per-process fan-out from channels to subscriptions. Only touched on the event loop."""
+
+    def __init__(self):
+        self._loop = None
+        self._subscribers = defaultdict(set)
+        self._replay = OrderedDict()  # channel -> deque of (sequence, event)
+        self._sequence = itertools.count(1)
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # A new loop (first stream, or a fresh loop in tests): earlier state belongs to the old one
+            self._loop = loop
+            self._subscribers.clear()
+            self._replay.clear()
+            get_backend().start(self)
+
+    def deliver(self, events):
+        """Thread-safe entry point for backends."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return  # No stream was ever opened in this process
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.dispatch(events)
+        else:
+            loop.call_soon_threadsafe(self.dispatch, events)
+
+    def dispatch(self, events):
+        config = _config()
+        for event in events:
+            channel = event['channel']
+            buffer = self._replay.get(channel)
+            if buffer is None:
+                buffer = self._replay[channel] = deque(maxlen=config['REPLAY_SIZE'])
+                while len(self._replay) > config['MAX_CHANNELS']:
+                    self._replay.popitem(last=False)
+            else:
+                self._replay.move_to_end(channel)
+            buffer.append((next(self._sequence), event))
+
+            for subscription in list(self._subscribers.get(channel, ())):
+                try:
+                    subscription.queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    self.unsubscribe(subscription)
+                    subscription.overflow()
+
+    def reset_all(self):
+        """Events may have been lost (backend reconnect): tell every stream to refetch."""
+        self._replay.clear()
+        event = {'type': RESET, 'data': {}}
+        for subscription in {s for subscribers in self._subscribers.values() for s in subscribers}:
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.unsubscribe(subscription)
+                subscription.overflow()
+
+    def _missed(self, channels, last_event_id):
+        """Buffered events after `last_event_id`, or None if it is no longer buffered."""
+        buffered = [entry for channel in channels for entry in self._replay.get(channel, ())]
+        last = next((sequence for sequence, event in buffered if event['id'] == last_event_id), None)
+        if last is None:
+            return None
+        return [event for sequence, event in sorted(buffered, key=lambda entry: entry[0]) if sequence > last]
+
+    def subscribe(self, channels, last_event_id=None):
+        self._bind()
+        subscription = Subscription(channels, _config()['QUEUE_SIZE'])
+        if last_event_id:
+            missed = self._missed(channels, last_event_id)
+            if missed is None or len(missed) >= subscription.queue.maxsize:
+                missed = [{'type': RESET, 'data': {}}]
+            for event in missed:
+                subscription.queue.put_nowait(event)
+        for channel in channels:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        for channel in subscription.channels:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def stream_count(self):
+        return len({s for subscribers in self._subscribers.values() for s in subscribers})
+
+
+hub = Hub()
+
+
+# Backends
+
+class LocalBackend:
+    """Delivers to this process's hub after commit."""
+
+    def publish(self, events):
+        transaction.on_commit(lambda: hub.deliver(events))
+
+    def start(self, hub):
+        pass
+
+
+class PostgresBackend:
+    """pg_notify() on publish; one LISTEN connection per worker feeds the hub."""
+
+    def __init__(self):
+        self._task = None
+
+    def publish(self, events):
+        with connections['default'].cursor() as cursor:
+            for payload in self._payloads(events):
+                cursor.execute('SELECT pg_notify(%s, %s)', [NOTIFY_CHANNEL, payload])
+
+    @staticmethod
+    def _payloads(events):
+        batch, size = [], 2
+        for event in events:
+            encoded = json.dumps(event, separators=(',', ':'))
+            if batch and size + len(encoded) + 1 > NOTIFY_MAX_BYTES:
+                yield '[' + ','.join(batch) + ']'
+                batch, size = [], 2
+            batch.append(encoded)
+            size += len(encoded) + 1
+        if batch:
+            yield '[' + ','.join(batch) + ']'
+
+    def start(self, hub):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._listen(hub))
+
+    @staticmethod
+    def _conninfo():
+        from psycopg.conninfo import make_conninfo
+
+        db = connections['default'].settings_dict
+        return make_conninfo(dbname=db['NAME'], user=db['USER'] or None, password=db['PASSWORD'] or None,
+                             host=db['HOST'] or None, port=db['PORT'] or None)
+
+    async def _listen(self, hub):
+        import psycopg
+
+        delay = 1
+        connected_before = False
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self._conninfo(), autocommit=True) as conn:
+                    await conn.execute(f'LISTEN {NOTIFY_CHANNEL}')
+                    if connected_before:
+                        hub.reset_all()  # Notifications sent while disconnected are gone
+                    connected_before, delay = True, 1
+                    async for notify in conn.notifies():
+                        hub.dispatch(json.loads(notify.payload))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Live events listener failed, reconnecting in %s s", delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(_config()['BACKEND'])()
+    return _backend
+
+
+@receiver(setting_changed)
+def _reset_backend(setting, **kwargs):
+    global _backend
+    if setting == 'LIVE_EVENTS':
+        _backend = None
+
+
+# Publishing
+
+def publish(events):
+    if events:
+        get_backend().publish(events)
+
+
+def orders_changed(new_status, changes):
+    """`changes` are (user_id, order_id, old status); one event per user."""
+    by_user = defaultdict(list)
+    for user_id, order_id, old_status in changes:
+        by_user[user_id].append({'order_id': order_id, 'from': old_status})
+    publish([make_event(user_channel(user_id), 'order.status', {'status': new_status, 'orders': orders})
+             for user_id, orders in by_user.items()])
+
+
+def stock_changed(rows):
+    """`rows` are (book_id, quantity, availability_status) as stored after the change."""
+    publish([make_event(book_channel(book_id), 'book.stock',
+                        {'book_id': book_id, 'quantity': quantity, 'available': available})
+             for book_id, quantity, available in rows])
+
+
+def _stock(book):
+    values = book.__dict__
+    if 'quantity' in values and 'availability_status' in values:
+        return values['quantity'], values['availability_status']
+    return None  # Deferred, and reading them here would query
+
+
+@receiver(post_init, sender=Book)
+def _snapshot(sender, instance, **kwargs):
+    instance._live_stock = _stock(instance) if instance.pk is not None else None
+
+
+@receiver(post_save, sender=Book)
+def _book_saved(sender, instance, created, raw=False, **kwargs):
+    stock = _stock(instance)
+    if raw or stock is None:
+        return
+    if created or stock != instance._live_stock:
+        stock_changed([(instance.pk, *stock)])
+    instance._live_stock = stock
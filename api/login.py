@@ -0,0 +1,45 @@
+"""
+Password verification on a bounded thread pool.
+
+Hashing is CPU bound (the hashers release the GIL), so at most
+LOGIN_HASH_WORKERS logins hash at once and at most LOGIN_HASH_QUEUE more
+wait. Beyond that logins are refused with LoginBusy instead of piling up
+and starving every other endpoint of CPU.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.db import close_old_connections
+
+WORKERS = getattr(settings, 'LOGIN_HASH_WORKERS', os.cpu_count() or 1)
+QUEUE = getattr(settings, 'LOGIN_HASH_QUEUE', 64)
+TIMEOUT = getattr(settings, 'LOGIN_HASH_TIMEOUT', 10)
+
+_pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='login-hash')
+_slots = threading.BoundedSemaphore(WORKERS + QUEUE)
+
+
+class LoginBusy(Exception):
+    pass
+
+
+def _authenticate(username, password):
+    try:
+        return authenticate(username=username, password=password)
+    finally:
+        close_old_connections()  # Pool threads never see request_finished
+
+
+def verify_credentials(username, password):
+    """authenticate() on the hashing pool. Raises LoginBusy when saturated."""
+    if not _slots.acquire(blocking=False):
+        raise LoginBusy("Too many logins in progress.")
+    future = _pool.submit(_authenticate, username, password)
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=TIMEOUT)
+    except TimeoutError:
+        raise LoginBusy("Login timed out waiting for the password hasher.")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api.recommendations import build
+
+
+class Command(BaseCommand):
+    help = "Refresh the 'customers also bought' similarity arrays from orders and reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Rebuild from the whole history instead of the orders/reviews since the last run.")
+
+    def handle(self, *args, **options):
+        summary = build(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['mode'].capitalize()} build: {summary['events']} event(s), {summary['books']} book(s), "
+            f"{summary['recomputed']} similarity row(s) recomputed."
+        ))
@@ -0,0 +1,48 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from api.duplicates import hash_fields
+from api.image_processing import hash_cover
+from api.models import Book
+
+HASH_FIELDS = ['cover_phash', 'cover_dhash', 'phash_chunk_0', 'phash_chunk_1', 'phash_chunk_2', 'phash_chunk_3']
+
+
+class Command(BaseCommand):
+    help = "Compute perceptual hashes for book covers that have none yet, in a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--all', action='store_true', help="Rehash every cover, not only unhashed ones.")
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            books = books.filter(cover_phash__isnull=True)
+        rows = list(books.order_by('book_id').values_list('book_id', 'image'))
+
+        hashed, failed = 0, 0
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=options['workers'], mp_context=context) as pool:
+            for start in range(0, len(rows), options['batch_size']):
+                batch = rows[start:start + options['batch_size']]
+                # hash_cover lives in a Django-free module, so spawned workers can import it
+                futures = [pool.submit(hash_cover, default_storage.path(name)) for _, name in batch]
+                updates = []
+                for (book_id, name), future in zip(batch, futures):
+                    try:
+                        hashes = future.result()
+                    except Exception as exc:  # Reported per file, the batch goes on
+                        failed += 1
+                        self.stderr.write(f"Book {book_id} ({name}): {type(exc).__name__}: {exc}")
+                        continue
+                    updates.append(Book(book_id=book_id, **hash_fields(hashes['phash'], hashes['dhash'])))
+                Book.objects.bulk_update(updates, HASH_FIELDS)  # No cached response shows them (api.cache)
+                hashed += len(updates)
+
+        self.stdout.write(self.style.SUCCESS(f"Hashed {hashed} cover(s), {failed} failed."))
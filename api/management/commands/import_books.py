@@ -0,0 +1,64 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importers import FORMATS, detect_format, read_rows, upsert_books
+from api.matching import RequestIndex, rematch
+
+
+class Command(BaseCommand):
+    help = ("Stream books from a CSV or JSONL file and upsert them in chunks. "
+            "Existing (seller, title, author) rows get their quantity increased.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' for stdin.")
+        parser.add_argument('--format', choices=FORMATS,
+                            help="Input format (default: from the file extension, else csv).")
+        parser.add_argument('--seller', type=int, help="Seller id for rows that do not set one.")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--report', help="Write the per-row error report (JSONL) here instead of stderr.")
+        parser.add_argument('--no-match', action='store_true',
+                            help="Skip matching the imported books against open requests.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        defaults = {'seller': options['seller']} if options['seller'] else None
+
+        try:
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+            report = open(options['report'], 'w') if options['report'] else sys.stderr
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        def on_error(error):
+            report.write(json.dumps(error) + '\n')
+
+        index, matched = RequestIndex(), 0
+
+        def on_written(book_ids):
+            nonlocal matched
+            if not options['no_match']:
+                matched += rematch(book_ids, index=index)
+
+        started = time.perf_counter()
+        try:
+            result = upsert_books(read_rows(stream, fmt), chunk_size=options['chunk_size'],
+                                  defaults=defaults, on_error=on_error, on_written=on_written)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if report is not sys.stderr:
+                report.close()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Upserted {result.upserted} row(s), rejected {result.failed}, in {elapsed:.2f}s."
+        ))
+
+        if result.upserted and not options['no_match']:
+            self.stdout.write(f"Recorded {matched} request match(es).")
@@ -0,0 +1,48 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api import partitions
+
+
+class Command(BaseCommand):
+    help = ("Partition the order table by month (postgres), create upcoming partitions and move old ones "
+            "into the archive table. Meant to run daily, e.g. from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--setup', action='store_true',
+                            help="Convert api_order into a partitioned table first (locks it during the copy).")
+        parser.add_argument('--keep-legacy', action='store_true',
+                            help="With --setup, keep the unpartitioned table as api_order_legacy.")
+        parser.add_argument('--months-ahead', type=int, default=3, help="Future months to create partitions for.")
+        parser.add_argument('--archive-after', type=int, default=None, metavar='MONTHS',
+                            help="Archive partitions that ended more than this many months ago.")
+        parser.add_argument('--archive-tablespace', default=None,
+                            help="Tablespace (e.g. on cheaper disks) for the archive table when it is created.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Order partitioning needs the postgres backend.")
+
+        if options['setup']:
+            if partitions.is_partitioned():
+                raise CommandError(f"{partitions.TABLE} is already partitioned.")
+            copied = partitions.convert(options['months_ahead'], keep_legacy=options['keep_legacy'])
+            self.stdout.write(f"Converted {partitions.TABLE}: {copied} order(s) copied into monthly partitions.")
+        elif not partitions.is_partitioned():
+            raise CommandError(f"{partitions.TABLE} is not partitioned yet, run with --setup.")
+
+        this_month = partitions.month_start(datetime.now(dt_timezone.utc))
+        created = partitions.ensure_partitions(partitions.add_months(this_month, options['months_ahead']))
+        for month in created:
+            self.stdout.write(f"Created partition {partitions.partition_name(month)}.")
+
+        if options['archive_after'] is not None:
+            cutoff = partitions.add_months(this_month, -options['archive_after'])
+            for month, rows in partitions.archive(cutoff, options['archive_tablespace']):
+                self.stdout.write(f"Archived {partitions.partition_name(month)}: {rows} order(s).")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(partitions.partition_months())} monthly partition(s) in {partitions.TABLE}."
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import invalidate_lists
+from api.facets import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed facet counts (BookFacetCell) from the Book table."
+
+    def handle(self, *args, **options):
+        cells = rebuild()
+        invalidate_lists('books')  # Facet counts only
+        self.stdout.write(self.style.SUCCESS(f"Facet counts rebuilt, {cells} cell(s)."))
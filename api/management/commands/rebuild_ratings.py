@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.models import Book
+from api.ratings import AGGREGATE_FIELDS, computed_aggregates, empty_aggregates
+
+
+def _differs(book, values):
+    for field in AGGREGATE_FIELDS:
+        stored, expected = getattr(book, field), values[field]
+        if field == 'rating_avg':
+            if (stored is None) != (expected is None):
+                return True
+            if stored is not None and abs(stored - expected) > 1e-9:
+                return True
+        elif stored != expected:
+            return True
+    return False
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized Book rating aggregates from the Review table and report drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Only report drift, do not write. Exits with an error if drift is found.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+        batch_size = options['batch_size']
+        expected = dict(computed_aggregates())
+
+        drifted = 0
+        batch = []
+        books = Book.objects.only('book_id', *AGGREGATE_FIELDS).order_by('book_id')
+        for book in books.iterator(chunk_size=batch_size):
+            values = expected.get(book.book_id) or empty_aggregates()
+            if not _differs(book, values):
+                continue
+            drifted += 1
+            if check_only:
+                self.stdout.write(f"Book {book.book_id}: drift in rating aggregates")
+                continue
+            for field, value in values.items():
+                setattr(book, field, value)
+            batch.append(book)
+            if len(batch) >= batch_size:
+                self._flush(batch)
+
+        if batch:
+            self._flush(batch)
+
+        if check_only and drifted:
+            raise CommandError(f"{drifted} book(s) have drifted rating aggregates.")
+        verb = "found" if check_only else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"Rating aggregates checked, {drifted} drifted book(s) {verb}."))
+
+    def _flush(self, batch):
+        with transaction.atomic():
+            Book.objects.bulk_update(batch, AGGREGATE_FIELDS)
+        batch.clear()
@@ -0,0 +1,41 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.analytics import rollup_rows
+from api.models import SellerDailySales
+
+
+class Command(BaseCommand):
+    help = "Rebuild the SellerDailySales rollups from the Order table and the order archive, if any."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only rebuild days from this date on (YYYY-MM-DD).")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError("--since must be a date in YYYY-MM-DD format.")
+
+        created = 0
+        with transaction.atomic():
+            existing = SellerDailySales.objects.all()
+            if since is not None:
+                existing = existing.filter(day__gte=since)
+            existing.delete()
+
+            batch = []
+            for row in rollup_rows(since):
+                batch.append(row)
+                if len(batch) >= options['batch_size']:
+                    created += len(SellerDailySales.objects.bulk_create(batch))
+                    batch = []
+            if batch:
+                created += len(SellerDailySales.objects.bulk_create(batch))
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {created} seller rollup row(s)."))
@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.matching import rematch
+
+
+class Command(BaseCommand):
+    help = "Match every available listing against the open book requests and record candidate sellers."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        matched = rematch()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Recorded {matched} request match(es) in {elapsed:.2f}s."))
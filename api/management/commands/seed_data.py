@@ -0,0 +1,202 @@
+import json
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api import facets
+from api.cache import invalidate
+from api.matching import request_index
+from api.models import Book, Order, Request, Review, Seller, User
+from api.search import book_index
+
+CATEGORIES = ['fiction', 'science', 'history', 'biography', 'children', 'fantasy', 'technology', 'poetry']
+WORDS = [
+    'river', 'shadow', 'garden', 'empire', 'silent', 'winter', 'atlas', 'machine', 'forest', 'glass',
+    'ocean', 'paper', 'crown', 'signal', 'harbor', 'stone', 'echo', 'lantern', 'orbit', 'mirror',
+]
+SURNAMES = ['Rao', 'Smith', 'Okafor', 'Tanaka', 'Garcia', 'Novak', 'Haddad', 'Silva', 'Kumar', 'Larsen']
+ORDER_STATUSES = ['pending', 'shipped', 'delivered', 'cancelled']
+ORDER_STATUS_WEIGHTS = [30, 20, 45, 5]
+
+
+class Command(BaseCommand):
+    help = "Seed deterministic benchmark data (users, sellers, books, orders, reviews, requests) with bulk_create."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--sellers', type=int, default=100, help="Taken from the seeded users.")
+        parser.add_argument('--books', type=int, default=10000)
+        parser.add_argument('--orders', type=int, default=50000)
+        parser.add_argument('--reviews', type=int, default=20000)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=90, help="Spread order dates over this many past days.")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='bench', help="Username/email prefix of the seeded users.")
+        parser.add_argument('--password', default='bench-password', help="Password of every seeded user.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--clear', action='store_true',
+                            help="Replace previously seeded rows (same prefix). Without it, seeding twice is refused.")
+        parser.add_argument('--manifest', help="Write usernames, ids and listings for benchmarks/load_test.py here.")
+
+    def handle(self, *args, **options):
+        if options['sellers'] > options['users']:
+            raise CommandError("--sellers cannot exceed --users.")
+        if options['books'] and not options['sellers']:
+            raise CommandError("Books need at least one seller.")
+        if (options['orders'] or options['reviews']) and not (options['users'] and options['books']):
+            raise CommandError("Orders and reviews need users and books.")
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+
+        with transaction.atomic():
+            seeded = User.objects.filter(username__startswith=f'{prefix}_')
+            if options['clear']:
+                deleted, _ = seeded.delete()
+                self.stdout.write(f"Deleted {deleted} previously seeded row(s).")
+            elif seeded.exists():
+                raise CommandError(f"Users prefixed '{prefix}_' are already seeded: pass --clear to replace them, "
+                                   "or use another --prefix.")
+
+            users = self.seed_users(prefix, options['users'], options['password'])
+            sellers = self.seed_sellers(prefix, users[:options['sellers']])
+            books = self.seed_books(sellers, options['books'])
+            self.seed_orders(users, books, options['orders'], options['days'])
+            self.seed_reviews(users, books, options['reviews'])
+            self.seed_requests(users, books, options['requests'])
+
+        # bulk_create skips the model signals: rebuild what they maintain
+        call_command('rebuild_ratings', stdout=self.stdout)
+        call_command('rebuild_seller_analytics', stdout=self.stdout)
+        facets.rebuild()
+        book_index.reset()
+        request_index.reset()
+        invalidate('books', 'reviews', 'sellers')
+
+        if options['manifest']:
+            self.write_manifest(options['manifest'], users, sellers, books, options['password'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(users)} users, {len(sellers)} sellers, {len(books)} books, {options['orders']} orders, "
+            f"{options['reviews']} reviews and {options['requests']} requests."
+        ))
+
+    def bulk(self, model, rows):
+        created = []
+        for start in range(0, len(rows), self.batch_size):
+            created.extend(model.objects.bulk_create(rows[start:start + self.batch_size]))
+        return created
+
+    def seed_users(self, prefix, count, password):
+        encoded = make_password(password)  # Hash once: every seeded user shares it
+        return self.bulk(User, [
+            User(
+                username=f'{prefix}_{i}', email=f'{prefix}_{i}@example.com', password=encoded,
+                first_name='Bench', last_name=self.rng.choice(SURNAMES),
+            )
+            for i in range(count)
+        ])
+
+    def seed_sellers(self, prefix, users):
+        for user in users:
+            user.is_seller = True
+        User.objects.bulk_update(users, ['is_seller'], batch_size=self.batch_size)
+        return self.bulk(Seller, [
+            Seller(user=user, shop_name=f'{user.last_name} Books #{user.pk}', approved_status=True,
+                   gstin=f'{prefix[:3].upper()}{user.pk:012d}')
+            for user in users
+        ])
+
+    def title(self):
+        return ' '.join(self.rng.sample(WORDS, self.rng.randint(2, 4))).title()
+
+    def seed_books(self, sellers, count):
+        rows = []
+        for i in range(count):
+            rows.append(Book(
+                seller=sellers[i % len(sellers)],
+                title=f'{self.title()} {i}',  # Unique per (seller, title, author)
+                author=f'{self.rng.choice(WORDS).title()} {self.rng.choice(SURNAMES)}',
+                category=self.rng.choice(CATEGORIES),
+                price=Decimal(self.rng.randint(199, 4999)) / 100,
+                availability_status=True,
+                rental_option=self.rng.random() < 0.2,
+                condition=self.rng.choice(['new', 'used']),
+                quantity=self.rng.randint(5, 50),
+            ))
+        return self.bulk(Book, rows)
+
+    def seed_orders(self, users, books, count, days):
+        rows = []
+        for _ in range(count):
+            book = self.rng.choice(books)
+            quantity = self.rng.randint(1, 3)
+            rows.append(Order(
+                user=self.rng.choice(users), book=book, quantity=quantity, total_amount=book.price * quantity,
+                status=self.rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS)[0],
+            ))
+        orders = self.bulk(Order, rows)
+
+        # order_date is auto_now_add, so backdate the rows in one UPDATE per day
+        now = timezone.now()
+        by_day = {}
+        for order in orders:
+            by_day.setdefault(self.rng.randrange(max(days, 1)), []).append(order.pk)
+        for day, ids in by_day.items():
+            for start in range(0, len(ids), self.batch_size):
+                Order.objects.filter(pk__in=ids[start:start + self.batch_size]).update(
+                    order_date=now - timedelta(days=day, seconds=self.rng.randrange(86400)),
+                )
+
+    def seed_reviews(self, users, books, count):
+        self.bulk(Review, [
+            Review(
+                user=self.rng.choice(users), book=self.rng.choice(books),
+                rating=self.rng.choices([1, 2, 3, 4, 5], [5, 5, 15, 35, 40])[0],
+                comment=' '.join(self.rng.choices(WORDS, k=12)),
+            )
+            for _ in range(count)
+        ])
+
+    def seed_requests(self, users, books, count):
+        rows = []
+        for _ in range(count):
+            if books and self.rng.random() < 0.3:  # Some requests are for listed titles
+                book = self.rng.choice(books)
+                title, author = book.title, book.author
+            else:
+                title, author = self.title(), f'{self.rng.choice(WORDS).title()} {self.rng.choice(SURNAMES)}'
+            rows.append(Request(user=self.rng.choice(users), book_title=title, author=author))
+        self.bulk(Request, rows)
+
+    def write_manifest(self, path, users, sellers, books, password):
+        seller_users = {seller.pk: seller.user for seller in sellers}
+        listings = {}
+        for book in books:
+            listings.setdefault(book.seller_id, [])
+            if len(listings[book.seller_id]) < 20:
+                listings[book.seller_id].append({
+                    'book_id': book.pk, 'title': book.title, 'author': book.author,
+                    'category': book.category, 'price': str(book.price), 'condition': book.condition,
+                })
+        manifest = {
+            'password': password,
+            'buyers': [{'user_id': user.pk, 'username': user.username} for user in users],
+            'sellers': [
+                {'seller_id': seller_id, 'user_id': seller_users[seller_id].pk,
+                 'username': seller_users[seller_id].username, 'listings': rows}
+                for seller_id, rows in listings.items()
+            ],
+            'book_ids': [book.pk for book in books],
+            'categories': CATEGORIES,
+            'search_terms': WORDS,
+        }
+        with open(path, 'w') as handle:
+            json.dump(manifest, handle)
+        self.stdout.write(f"Wrote manifest to {path}.")
@@ -0,0 +1,243 @@
+"""
+Matching of seller listings against open book Requests.
+
+Titles and authors are normalized (accents, case, punctuation, leading
+articles) and compared by character-trigram Dice similarity. Open requests
+live in an in-process inverted index (trigram -> request ids), so a listing
+is matched by probing only its rarest trigrams (prefix filtering) and
+verifying the few candidates found, not by scanning every request.
+
+Every worker holds its own index. A committed Request change is applied to
+the local index and bumps a version counter in the default cache, which
+must be shared between workers (Redis). An index whose last seen version
+is behind reloads from the database before its next match, so changes made
+through other workers are never missed.
+"""
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.models import Book, Request, RequestMatch
+
+TITLE_WEIGHT = 0.7
+AUTHOR_WEIGHT = 0.3
+MIN_TITLE_SIMILARITY = 0.6
+MIN_SCORE = 0.65
+
+LEADING_ARTICLES = ('the ', 'a ', 'an ')
+NON_ALNUM_RE = re.compile(r'[^0-9a-z]+')
+
+VERSION_KEY = 'api:matching:version'
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+    text = NON_ALNUM_RE.sub(' ', text).strip()
+    for article in LEADING_ARTICLES:
+        if text.startswith(article):
+            text = text[len(article):]
+            break
+    return text
+
+
+def trigrams(normalized):
+    grams = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def dice(a, b):
+    if not a or not b:
+        return 1.0 if a == b else 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def _shared_version():
+    cache = caches['default']
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def _bump_version():
+    cache = caches['default']
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        return None  # Counter was lost: treat every index as stale
+
+
+class RequestIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(set)  # title trigram -> request ids
+        self._entries = {}                 # request id -> (title grams, author grams, exact key)
+        self._exact = defaultdict(set)     # (title, author) -> request ids
+        self._loaded = False
+        self._version = None  # Shared version the index reflects
+
+    def reset(self):
+        """Drop the index here and make every other worker reload theirs."""
+        with self._lock:
+            self._clear()
+            _bump_version()
+
+    def _clear(self):
+        self._postings.clear()
+        self._entries.clear()
+        self._exact.clear()
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        version = _shared_version()
+        if self._loaded and version == self._version:
+            return
+        with self._lock:
+            if self._loaded and version == self._version:
+                return
+            self._clear()
+            rows = Request.objects.filter(request_status='open').values_list('request_id', 'book_title', 'author')
+            for request_id, title, author in rows.iterator(chunk_size=5000):
+                self._add(request_id, title, author)
+            self._loaded, self._version = True, version
+
+    def _published(self):
+        """Bump the shared version after a local change; stay current only if no other worker bumped it."""
+        version = _bump_version()
+        if self._loaded and version is not None and version == self._version + 1:
+            self._version = version
+        else:
+            self._loaded = False
+
+    def _add(self, request_id, title, author):
+        self._remove(request_id)
+        title, author = normalize(title), normalize(author)
+        title_grams = trigrams(title)
+        self._entries[request_id] = (title_grams, trigrams(author), (title, author))
+        self._exact[(title, author)].add(request_id)
+        for gram in title_grams:
+            self._postings[gram].add(request_id)
+
+    def _remove(self, request_id):
+        entry = self._entries.pop(request_id, None)
+        if entry is None:
+            return
+        title_grams, _, key = entry
+        self._exact[key].discard(request_id)
+        for gram in title_grams:
+            self._postings[gram].discard(request_id)
+
+    def update(self, request_id, title, author, is_open):
+        with self._lock:
+            if self._loaded:
+                if is_open:
+                    self._add(request_id, title, author)
+                else:
+                    self._remove(request_id)
+            self._published()
+
+    def remove(self, request_id):
+        with self._lock:
+            if self._loaded:
+                self._remove(request_id)
+            self._published()
+
+    def match(self, title, author):
+        """Return [(request_id, score)] for the open requests matching a listing."""
+        self._ensure_loaded()
+        title, author = normalize(title), normalize(author)
+        title_grams, author_grams = trigrams(title), trigrams(author)
+        with self._lock:
+            matches = {request_id: 1.0 for request_id in self._exact.get((title, author), ())}
+            if not title_grams:
+                return list(matches.items())
+
+            # A request with Dice >= t must share at least k = ceil(t * |A| / 2)
+            # trigrams, so it shares one of any |A| - k + 1 of them: probe the rarest.
+            needed = math.ceil(MIN_TITLE_SIMILARITY * len(title_grams) / 2)
+            probes = sorted(title_grams, key=lambda gram: len(self._postings.get(gram, ())))
+            candidates = set()
+            for gram in probes[:len(title_grams) - needed + 1]:
+                candidates.update(self._postings.get(gram, ()))
+
+            for request_id in candidates - matches.keys():
+                request_title, request_author, _ = self._entries[request_id]
+                title_score = dice(title_grams, request_title)
+                if title_score < MIN_TITLE_SIMILARITY:
+                    continue
+                score = TITLE_WEIGHT * title_score + AUTHOR_WEIGHT * dice(author_grams, request_author)
+                if score >= MIN_SCORE:
+                    matches[request_id] = score
+        return list(matches.items())
+
+
+request_index = RequestIndex()
+
+
+def _match_rows(book_id, seller_id, title, author, index):
+    return [
+        RequestMatch(request_id=request_id, seller_id=seller_id, book_id=book_id, score=score)
+        for request_id, score in index.match(title, author)
+    ]
+
+
+def record_matches(book):
+    """Match one listing against the open requests and store the candidates."""
+    rows = _match_rows(book.pk, book.seller_id, book.title, book.author, request_index)
+    if rows:
+        RequestMatch.objects.bulk_create(rows, ignore_conflicts=True)
+    return len(rows)
+
+
+def rematch(book_ids=None, batch_size=2000, index=None):
+    """
+    Batch mode: match available listings (all, or `book_ids`) against a fresh
+    index of open requests, or `index` when calls share one (e.g. per import
+    chunk). Cost is linear in listings times candidates.
+    """
+    index = index or RequestIndex()
+    books = Book.objects.filter(availability_status=True).order_by('book_id')
+    if book_ids is None:
+        querysets = [books]
+    else:
+        book_ids = sorted(book_ids)
+        querysets = (books.filter(pk__in=book_ids[i:i + 500]) for i in range(0, len(book_ids), 500))
+
+    recorded, batch = 0, []
+    for queryset in querysets:
+        rows = queryset.values_list('book_id', 'seller_id', 'title', 'author')
+        for book_id, seller_id, title, author in rows.iterator(chunk_size=batch_size):
+            batch.extend(_match_rows(book_id, seller_id, title, author, index))
+            if len(batch) >= batch_size:
+                RequestMatch.objects.bulk_create(batch, ignore_conflicts=True)
+                recorded, batch = recorded + len(batch), []
+    if batch:
+        RequestMatch.objects.bulk_create(batch, ignore_conflicts=True)
+        recorded += len(batch)
+    return recorded
+
+
+@receiver(post_save, sender=Request)
+def _index_request(sender, instance, **kwargs):
+    # After commit: a rolled-back request must not be matched, nor other workers told about it
+    values = (instance.pk, instance.book_title, instance.author, instance.request_status == 'open')
+    transaction.on_commit(lambda: request_index.update(*values))
+
+
+@receiver(post_delete, sender=Request)
+def _unindex_request(sender, instance, **kwargs):
+    request_id = instance.pk
+    transaction.on_commit(lambda: request_index.remove(request_id))
@@ -0,0 +1,240 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware records, for each request: route, DB query count and
+time, serializer time, render time and response size. The numbers feed
+in-process Prometheus-style histograms and counters, exposed as text by
+metrics_view. Requests slower than PERF_SLOW_REQUEST_MS are logged together
+with the SQL they ran.
+
+The hot path is a handful of perf_counter() calls and one context variable
+lookup per query/serializer call. Metrics are per process: scrape every
+worker, or sum them in Prometheus.
+"""
+import hmac
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.authentication import CachedJWTAuthentication
+
+from api.cache import cache_stats
+
+logger = logging.getLogger('api.performance')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_CAPTURED_QUERIES = 200
+
+_current = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'query_time', 'serializer_time', 'serializer_depth', 'render_time', 'sql')
+
+    def __init__(self, capture_sql):
+        self.queries = 0
+        self.query_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.render_time = 0.0
+        self.sql = [] if capture_sql else None
+
+
+def _label(value):
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))  # (method, route, status)
+        self.counters = defaultdict(float)  # (name, method, route) -> value
+
+    def record(self, method, route, status, duration, stats, response_bytes):
+        labels = (method, route)
+        with self._lock:
+            self.latency[(method, route, status)].observe(duration)
+            self.counters[('db_queries_total',) + labels] += stats.queries
+            self.counters[('db_query_seconds_total',) + labels] += stats.query_time
+            self.counters[('serializer_seconds_total',) + labels] += stats.serializer_time
+            self.counters[('render_seconds_total',) + labels] += stats.render_time
+            self.counters[('response_bytes_total',) + labels] += response_bytes
+
+    def render(self):
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by route.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            for (method, route, status), histogram in sorted(self.latency.items()):
+                labels = f'method="{_label(method)}",route="{_label(route)}",status="{_label(status)}"'
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                cumulative += histogram.counts[-1]
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+                lines.append(f'http_request_duration_seconds_sum{{{labels}}} {histogram.sum}')
+                lines.append(f'http_request_duration_seconds_count{{{labels}}} {cumulative}')
+
+            names = sorted({key[0] for key in self.counters})
+            for name in names:
+                lines.append(f'# TYPE {name} counter')
+                for (metric, method, route), value in sorted(self.counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{{method="{_label(method)}",route="{_label(route)}"}} {value}')
+
+        for name, value in cache_stats().items():
+            lines.append(f'# TYPE response_cache_{name}_total counter')
+            lines.append(f'response_cache_{name}_total {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.queries += 1
+        stats.query_time += elapsed
+        if stats.sql is not None and len(stats.sql) < MAX_CAPTURED_QUERIES:
+            stats.sql.append((round(elapsed * 1000, 2), sql))
+
+
+@receiver(connection_created)
+def _install_query_recorder(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+class TimedSerializerMixin:
+    """DRF hook: time to_representation() of the outermost serializer call."""
+
+    def to_representation(self, instance):
+        stats = _current.get()
+        if stats is None or stats.serializer_depth:
+            return super().to_representation(instance)
+        stats.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serializer_time += time.perf_counter() - started
+            stats.serializer_depth -= 1
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match is not None else 'unmatched'
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'PERF_SLOW_REQUEST_MS', None)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token, started = self.start()
+        response = self.get_response(request)
+        return self.finish(request, response, token, started)
+
+    async def __acall__(self, request):
+        token, started = self.start()
+        response = await self.get_response(request)
+        return self.finish(request, response, token, started)
+
+    def start(self):
+        return _current.set(RequestStats(capture_sql=self.slow_ms is not None)), time.perf_counter()
+
+    def finish(self, request, response, token, started):
+        slow_ms = self.slow_ms
+        duration = time.perf_counter() - started
+        stats = _current.get()
+        _current.reset(token)
+        size = 0 if response.streaming else len(response.content)
+        route = _route(request)
+        registry.record(request.method, route, response.status_code, duration, stats, size)
+        response['Server-Timing'] = (
+            f'db;dur={stats.query_time * 1000:.1f}, serialize;dur={stats.serializer_time * 1000:.1f}, '
+            f'render;dur={stats.render_time * 1000:.1f}, total;dur={duration * 1000:.1f}'
+        )
+        if slow_ms is not None and duration * 1000 >= slow_ms:
+            logger.warning(
+                "Slow request %s %s (%s): %.1f ms, %d queries in %.1f ms, serializer %.1f ms, render %.1f ms\n%s",
+                request.method, request.path, route, duration * 1000, stats.queries, stats.query_time * 1000,
+                stats.serializer_time * 1000, stats.render_time * 1000,
+                '\n'.join(f'  [{ms} ms] {sql}' for ms, sql in stats.sql),
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses render after the view returns; time it via a post-render callback
+        stats = _current.get()
+        if stats is not None:
+            render_started = time.perf_counter()
+
+            def rendered(response):
+                stats.render_time += time.perf_counter() - render_started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+
+def _may_scrape(request):
+    """The METRICS_TOKEN bearer token, or a staff user's access token."""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    header = request.headers.get('Authorization', '')
+    if token and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+        return True
+    try:
+        authenticated = CachedJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+def metrics_view(request):
+    """Prometheus text exposition, for the METRICS_TOKEN holder or staff users."""
+    if not _may_scrape(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4')
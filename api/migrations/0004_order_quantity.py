@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_unique_book_per_seller'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='quantity',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_sellerdailysales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('matched_at', models.DateTimeField(auto_now_add=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='request_matches', to='api.book')),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='api.request')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='request_matches', to='api.seller')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('request', 'book'), name='unique_request_match')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_book_cover_hashes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookFacetCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=100)),
+                ('condition', models.CharField(max_length=10)),
+                ('rental_option', models.BooleanField()),
+                ('availability_status', models.BooleanField()),
+                ('price_bucket', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'condition', 'rental_option', 'availability_status', 'price_bucket'), name='unique_book_facet_cell')],
+            },
+        ),
+    ]
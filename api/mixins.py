@@ -0,0 +1,226 @@
+from functools import lru_cache
+from operator import attrgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import ManyRelatedField, PKOnlyObject, PrimaryKeyRelatedField, RelatedField
+from rest_framework.settings import api_settings
+
+
+def _relation_path(model, source_parts):
+    """
+    Walk `source_parts` through model relations and return
+    (related path, is_many, final model). Stops at the first non-relation.
+    """
+    path = []
+    many = False
+    for part in source_parts:
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            break
+        if not field.is_relation or field.related_model is None:
+            break
+        path.append(part)
+        many = many or field.many_to_many or field.one_to_many
+        model = field.related_model
+    return '__'.join(path), many, model
+
+
+def _collect(serializer, model, prefix, select, prefetch):
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        if isinstance(field, serializers.ListSerializer):
+            child, source_parts = field.child, field.source.split('.')
+        elif isinstance(field, ManyRelatedField):
+            child, source_parts = None, field.source.split('.')
+        else:
+            child, source_parts = field, field.source.split('.')
+
+        path, many, related_model = _relation_path(model, source_parts)
+        if not path:
+            continue
+        if isinstance(field, RelatedField) and field.use_pk_only_optimization() and len(source_parts) == 1:
+            continue  # Rendered from the `<field>_id` column, no join needed
+
+        full_path = prefix + path
+        (prefetch if many or isinstance(field, (serializers.ListSerializer, ManyRelatedField)) else select).add(full_path)
+        if isinstance(child, serializers.Serializer):
+            _collect(child, related_model, full_path + '__', select, prefetch)
+
+
+@lru_cache(maxsize=None)
+def serializer_query_plan(serializer_class, model):
+    """
+    Return (select_related, prefetch_related) tuples for the relations the
+    serializer actually reads when rendering instances of `model`.
+    """
+    select, prefetch = set(), set()
+    _collect(serializer_class(), model, '', select, prefetch)
+    # Relations below a prefetched one are fetched by the prefetch query instead
+    nested = {path for path in select if any(path.startswith(p + '__') for p in prefetch)}
+    select -= nested
+    prefetch |= nested
+    return tuple(sorted(select)), tuple(sorted(prefetch))
+
+
+def _split_param(request, name):
+    value = request.query_params.get(name)
+    return [part.strip() for part in value.split(',') if part.strip()] if value else []
+
+
+def sparse_field_names(request, available):
+    """
+    Names kept by `?fields=a,b` / `?exclude=c` on a safe request, in serializer
+    order, or None when no sparse fieldset was asked for. `available` is a
+    callable returning the serializer's field names.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None  # Writes need every field for validation
+    include, exclude = _split_param(request, 'fields'), _split_param(request, 'exclude')
+    if not include and not exclude:
+        return None
+    available = available()
+    unknown = sorted(set(include + exclude) - set(available))
+    if unknown:
+        raise serializers.ValidationError({'fields': f"Unknown field(s): {', '.join(unknown)}."})
+    return tuple(name for name in available if (not include or name in include) and name not in exclude)
+
+
+@lru_cache(maxsize=None)
+def serializer_field_names(serializer_class):
+    return tuple(serializer_class().fields)
+
+
+@lru_cache(maxsize=1024)
+def sparse_columns(serializer_class, model, names):
+    """
+    Model fields to load with .only() for the serializer fields `names`, or
+    None when some field's source is unknown (then nothing is deferred).
+    SerializerMethodFields declare what they read in `sparse_sources`.
+    """
+    fields = serializer_class().fields
+    sources = getattr(serializer_class, 'sparse_sources', {})
+    columns = {model._meta.pk.name}
+    for name in names:
+        field = fields[name]
+        if field.source == '*':
+            if name not in sources:
+                return None
+            columns.update(sources[name])
+            continue
+        try:
+            model_field = model._meta.get_field(field.source.split('.')[0])
+        except FieldDoesNotExist:
+            return None  # A property or method on the model
+        if not model_field.concrete or model_field.many_to_many:
+            return None
+        columns.add(model_field.name)
+    return tuple(sorted(columns))
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin: drop the fields left out by `?fields=` / `?exclude=`."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        names = sparse_field_names(self.context.get('request'), lambda: list(self.fields))
+        if names is not None:
+            for name in set(self.fields) - set(names):
+                self.fields.pop(name)
+
+
+# Fields whose to_representation() returns model values unchanged
+IDENTITY_FIELDS = {
+    serializers.CharField, serializers.EmailField, serializers.ChoiceField,
+    serializers.IntegerField, serializers.BooleanField, serializers.FloatField,
+}
+
+
+def _decimal_to_string(field):
+    places = field.decimal_places
+
+    def convert(value):
+        if value.as_tuple().exponent == -places:
+            return f'{value:f}'  # Already quantized, as loaded from the column
+        return field.to_representation(value)
+    return convert
+
+
+class FastRepresentationMixin:
+    """
+    Read path without per-field DRF machinery: the first to_representation()
+    call compiles the readable fields into plain attribute getters; field
+    types it does not know fall back to DRF's own handling. Output is the
+    same as the stock Serializer.to_representation().
+    """
+
+    def _compile(self, model):
+        plan = []
+        for field in self._readable_fields:
+            getter, convert = None, None
+            if len(field.source_attrs) == 1:
+                source = field.source_attrs[0]
+                if type(field) in IDENTITY_FIELDS:
+                    getter = attrgetter(source)
+                elif isinstance(field, PrimaryKeyRelatedField) and field.pk_field is None:
+                    try:
+                        model_field = model._meta.get_field(source)
+                    except FieldDoesNotExist:
+                        model_field = None
+                    if model_field is not None and model_field.many_to_one:
+                        getter = attrgetter(model_field.attname)  # The `<fk>_id` column
+                elif (type(field) is serializers.DecimalField
+                      and getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+                      and not field.localize):
+                    getter, convert = attrgetter(source), _decimal_to_string(field)
+            plan.append((field.field_name, field, getter, convert))
+        return plan
+
+    def to_representation(self, instance):
+        plans = self.__dict__.setdefault('_fast_plans', {})
+        plan = plans.get(type(instance))
+        if plan is None:
+            plan = plans[type(instance)] = self._compile(type(instance))
+
+        ret = {}
+        for name, field, getter, convert in plan:
+            if getter is not None:
+                value = getter(instance)
+                ret[name] = convert(value) if convert is not None and value is not None else value
+                continue
+            try:
+                attribute = field.get_attribute(instance)
+            except SkipField:
+                continue
+            check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            ret[name] = None if check_for_none is None else field.to_representation(attribute)
+        return ret
+
+
+class OptimizedQuerysetMixin:
+    """
+    Apply select_related/prefetch_related to the viewset queryset, derived
+    from the fields emitted by the serializer of the current action, and
+    narrow it with .only() to a requested sparse fieldset.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        select, prefetch = serializer_query_plan(serializer_class, queryset.model)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+
+        names = sparse_field_names(self.request, lambda: serializer_field_names(serializer_class))
+        if names is not None and not select:  # .only() would clash with the joined relations
+            columns = sparse_columns(serializer_class, queryset.model, names)
+            if columns is not None:
+                queryset = queryset.only(*columns)
+        return queryset
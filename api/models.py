@@ -31,6 +31,43 @@ class Book(models.Model):
     condition = models.CharField(max_length=10, choices=CONDITION_CHOICES)
     quantity = models.PositiveIntegerField(default=1)
     image = models.ImageField(upload_to='book_images/', null=True, blank=True)
+    image_hash = models.CharField(max_length=64, blank=True)  # sha256 of the uploaded cover
+    image_variants = models.JSONField(default=dict, blank=True)  # Thumbnails written by api.images
+    # 64-bit perceptual hashes of the cover (signed), set by api.images; see api.duplicates
+    cover_phash = models.BigIntegerField(null=True, blank=True)
+    cover_dhash = models.BigIntegerField(null=True, blank=True)
+    phash_chunk_0 = models.IntegerField(null=True, blank=True)  # 16-bit slices of cover_phash,
+    phash_chunk_1 = models.IntegerField(null=True, blank=True)  # the multi-index for hamming search
+    phash_chunk_2 = models.IntegerField(null=True, blank=True)
+    phash_chunk_3 = models.IntegerField(null=True, blank=True)
+
+    # Denormalized review aggregates, kept up to date by api.ratings
+    rating_avg = models.FloatField(null=True, blank=True)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)  # Star histogram
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # One listing per (seller, title, author); restocks add to quantity
+            models.UniqueConstraint(fields=['seller', 'title', 'author'], name='unique_book_per_seller'),
+        ]
+        indexes = [
+            models.Index(fields=['category', 'price'], name='book_category_price_idx'),
+            # Storefront browsing only ever shows books in stock
+            models.Index(fields=['category', 'price'], condition=models.Q(availability_status=True),
+                         name='book_available_cat_price_idx'),
+            models.Index(fields=['price'], condition=models.Q(availability_status=True),
+                         name='book_available_price_idx'),
+            models.Index(fields=['phash_chunk_0'], name='book_phash_chunk_0_idx'),
+            models.Index(fields=['phash_chunk_1'], name='book_phash_chunk_1_idx'),
+            models.Index(fields=['phash_chunk_2'], name='book_phash_chunk_2_idx'),
+            models.Index(fields=['phash_chunk_3'], name='book_phash_chunk_3_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} by {self.author} - {self.seller.shop_name}"
@@ -54,6 +91,7 @@ class Seller(models.Model):
         return f"{self.shop_name} - {'Approved' if self.approved_status else 'Pending'}"
 
 class Order(models.Model):
+    """On postgres, manage.py partition_orders splits the table by month of order_date (see api.partitions)"""
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('shipped', 'Shipped'),
@@ -65,12 +103,36 @@ class Order(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="orders")  # User FK
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="orders")  # Book FK
     order_date = models.DateTimeField(auto_now_add=True)  # Auto set when order is created
-    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField(default=1)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)  # Book.price * quantity, set on placement
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')  # Enum Choices
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-order_date'], name='order_user_date_idx'),  # Order history
+        ]
+
     def __str__(self):
         return f"Order {self.order_id} - {self.user.username} - {self.status}"
 
+class OrderEvent(models.Model):
+    """Outbox record of order status changes, one per call, written in the same transaction"""
+    event_type = models.CharField(max_length=50)  # e.g. "order.status_changed"
+    payload = models.JSONField(default=dict)  # {"status": ..., "orders": [{"order_id": ..., "from": ...}]}
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                              related_name="order_events")
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)  # Set once relayed to consumers
+
+    class Meta:
+        indexes = [
+            # The outbox relay polls for unpublished events in order
+            models.Index(fields=['id'], condition=models.Q(published_at__isnull=True), name='order_event_unpublished_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} #{self.pk}"
+
 class Review(models.Model):
     review_id = models.AutoField(primary_key=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="reviews")
@@ -79,6 +141,11 @@ class Review(models.Model):
     comment = models.TextField()
     review_date = models.DateTimeField(auto_now_add=True)  # Auto set timestamp on creation
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['book', '-review_date'], name='review_book_date_idx'),  # Reviews of a book
+        ]
+
     def __str__(self):
         return f"Review by {self.user.username} for {self.book.title} - {self.rating}⭐"
 
@@ -104,5 +171,68 @@ class Request(models.Model):
     request_status = models.CharField(max_length=15, choices=REQUEST_STATUS_CHOICES, default='open')
     accepted_seller = models.ForeignKey('Seller', on_delete=models.SET_NULL, null=True, blank=True, related_name="accepted_requests")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['request_status'], name='request_status_idx'),
+        ]
+
     def __str__(self):
         return f"{self.book_title} by {self.author} - {self.status}"
+
+
+class BookFacetCell(models.Model):
+    """Number of books per combination of facet values, maintained by api.facets"""
+    category = models.CharField(max_length=100)
+    condition = models.CharField(max_length=10)
+    rental_option = models.BooleanField()
+    availability_status = models.BooleanField()
+    price_bucket = models.PositiveSmallIntegerField()  # Index into settings.FACET_PRICE_BUCKETS
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'condition', 'rental_option', 'availability_status',
+                                            'price_bucket'], name='unique_book_facet_cell'),
+        ]
+
+    def __str__(self):
+        return f"{self.category}/{self.condition}/{self.rental_option}/{self.availability_status}/{self.price_bucket}: {self.count}"
+
+
+class SellerDailySales(models.Model):
+    """Orders rolled up per (seller, book, day, status), maintained by api.analytics"""
+    seller = models.ForeignKey(Seller, on_delete=models.CASCADE, related_name="daily_sales")
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="daily_sales")
+    day = models.DateField()  # Day the orders were placed
+    status = models.CharField(max_length=10, choices=Order.STATUS_CHOICES)
+    order_count = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['seller', 'book', 'day', 'status'], name='unique_daily_sales_row'),
+        ]
+        indexes = [
+            models.Index(fields=['seller', 'day'], name='daily_sales_seller_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.seller_id} / {self.book_id} / {self.day} / {self.status}: {self.order_count}"
+
+
+class RequestMatch(models.Model):
+    """A seller's listing that matches an open Request, found by api.matching"""
+    request = models.ForeignKey(Request, on_delete=models.CASCADE, related_name="matches")
+    seller = models.ForeignKey(Seller, on_delete=models.CASCADE, related_name="request_matches")
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="request_matches")
+    score = models.FloatField()  # 1.0 for an exact normalized title/author match
+    matched_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['request', 'book'], name='unique_request_match'),
+        ]
+
+    def __str__(self):
+        return f"Request {self.request_id} ~ Book {self.book_id} ({self.score:.2f})"
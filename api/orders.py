@@ -0,0 +1,152 @@
+"""
+Order placement and status changes, keeping Book stock in step.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from api import analytics, live
+from api.inventory import release_stock, release_stock_many, reserve_stock
+from api.models import Order, OrderEvent
+
+# Allowed status changes; delivered and cancelled orders are final
+TRANSITIONS = {
+    'pending': {'shipped', 'cancelled'},
+    'shipped': {'delivered'},
+    'delivered': set(),
+    'cancelled': set(),
+}
+
+STATUS_CHANGED = 'order.status_changed'
+DELETED = 'order.deleted'
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def check_transition(old_status, new_status):
+    """Raise InvalidTransition unless `old_status` may move to `new_status` (or stays put)."""
+    if new_status not in TRANSITIONS:
+        raise InvalidTransition(f"Unknown status {new_status!r}.")
+    if old_status != new_status and new_status not in TRANSITIONS[old_status]:
+        raise InvalidTransition(f"Cannot change an order from {old_status} to {new_status}.")
+
+
+def source_statuses(new_status):
+    return [status for status, targets in TRANSITIONS.items() if new_status in targets]
+
+
+@transaction.atomic
+def place_order(user, book_id, quantity=1, save=None):
+    """
+    Reserve stock and create the order with a total computed from Book.price.
+
+    `save` lets a serializer persist the order (serializer.save); by default
+    the Order is created directly. Raises inventory.OutOfStock.
+    """
+    price = reserve_stock(book_id, quantity)
+    values = {'user': user, 'total_amount': price * quantity, 'status': 'pending'}
+    if save is not None:
+        order = save(**values)
+    else:
+        order = Order.objects.create(book_id=book_id, quantity=quantity, **values)
+    analytics.order_placed(order)
+    live.orders_changed(order.status, [(order.user_id, order.pk, None)])
+    return order
+
+
+@transaction.atomic
+def delete_order(order_id, actor=None):
+    """
+    Delete an order and undo its effects: open orders put their copies back,
+    the seller rollups drop it, and the outbox records the deletion.
+    """
+    order = Order.objects.select_for_update().get(pk=order_id)
+    if TRANSITIONS[order.status]:  # Pending or shipped orders still hold their copies
+        release_stock(order.book_id, order.quantity)
+    analytics.order_removed(order)
+    OrderEvent.objects.create(
+        event_type=DELETED,
+        actor=actor if actor is not None and actor.is_authenticated else None,
+        payload={'orders': [{'order_id': order.pk, 'from': order.status}]},
+    )
+    order.delete()
+
+
+def record_status_event(new_status, previous, actor=None):
+    """One outbox row for the orders in `previous` ({order_id: old status}) moved to `new_status`."""
+    return OrderEvent.objects.create(
+        event_type=STATUS_CHANGED,
+        actor=actor if actor is not None and actor.is_authenticated else None,
+        payload={
+            'status': new_status,
+            'orders': [{'order_id': order_id, 'from': old} for order_id, old in sorted(previous.items())],
+        },
+    )
+
+
+def status_changed(order, old_status, actor=None):
+    """Side effects of an order moving from `old_status` to `order.status`."""
+    if order.status == old_status:
+        return
+    if order.status == 'cancelled':
+        release_stock(order.book_id, order.quantity)
+    analytics.order_status_changed(order, old_status)
+    record_status_event(order.status, {order.pk: old_status}, actor)
+    live.orders_changed(order.status, [(order.user_id, order.pk, old_status)])
+
+
+@transaction.atomic
+def bulk_transition(order_ids, new_status, actor=None, queryset=None):
+    """
+    Move the orders `order_ids` to `new_status` under the TRANSITIONS state
+    machine with one conditional UPDATE, and return {order_id: (outcome,
+    previous status)}, outcome being "updated", "unchanged", "invalid" or
+    "not_found". Orders outside `queryset` count as not found.
+
+    Stock releases, analytics rollups and the outbox event are written once
+    per call, not once per order.
+    """
+    if new_status not in TRANSITIONS:
+        raise InvalidTransition(f"Unknown status {new_status!r}.")
+    queryset = Order.objects.all() if queryset is None else queryset
+    rows = (
+        queryset.filter(pk__in=order_ids)
+        .select_for_update(of=('self',))  # Orders only, the joined books stay unlocked
+        .values_list('order_id', 'status', 'book_id', 'book__seller_id', 'order_date', 'quantity', 'total_amount',
+                     'user_id')
+    )
+
+    outcomes = {order_id: ('not_found', None) for order_id in order_ids}
+    moving = []
+    for row in rows:
+        order_id, old_status = row[0], row[1]
+        if old_status == new_status:
+            outcomes[order_id] = ('unchanged', old_status)
+        elif new_status in TRANSITIONS[old_status]:
+            outcomes[order_id] = ('updated', old_status)
+            moving.append(row)
+        else:
+            outcomes[order_id] = ('invalid', old_status)
+    if not moving:
+        return outcomes
+
+    # The rows are locked, so the status guard only repeats what was checked above
+    Order.objects.filter(pk__in=[row[0] for row in moving], status__in=source_statuses(new_status)).update(
+        status=new_status,
+    )
+
+    if new_status == 'cancelled':
+        released = defaultdict(int)
+        for _, _, book_id, _, _, quantity, _, _ in moving:
+            released[book_id] += quantity
+        release_stock_many(released)
+    analytics.orders_status_changed(
+        [(seller_id, book_id, order_date, old_status, quantity, total)
+         for _, old_status, book_id, seller_id, order_date, quantity, total, _ in moving],
+        new_status,
+    )
+    record_status_event(new_status, {row[0]: row[1] for row in moving}, actor)
+    live.orders_changed(new_status, [(row[-1], row[0], row[1]) for row in moving])
+    return outcomes
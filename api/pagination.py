@@ -0,0 +1,40 @@
+from collections import OrderedDict
+
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset (cursor) pagination ordered on the model's auto primary key.
+
+    Each page is fetched with `WHERE pk > <last seen pk> ORDER BY pk LIMIT n`,
+    so deep pages cost the same as the first one (no OFFSET scan).
+    The cursor handed to clients is DRF's opaque base64 token.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_ordering(self, request, queryset, view):
+        """Order on the primary key (book_id, order_id, review_id, ...)"""
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering:
+            return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+        return (queryset.model._meta.pk.name,)
+
+    def get_paginated_response(self, data):
+        # Cursors come first and the (potentially large) results list last,
+        # so clients parsing the body incrementally can start on the rows
+        # without buffering the whole response.
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('page_size', self.page_size),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['page_size'] = {'type': 'integer', 'example': self.page_size}
+        return response_schema
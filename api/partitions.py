@@ -0,0 +1,232 @@
+"""
+Monthly range partitioning of the order table on postgres.
+
+convert() turns api_order into a table partitioned by month of order_date
+(UTC) and copies the existing rows in. The partitions are
+api_order_pYYYY_MM, plus a DEFAULT partition that catches anything outside
+them. Postgres requires the partition key in the primary key, so the
+database key becomes (order_id, order_date). order_id stays unique through
+its sequence and stays the primary key as far as Django is concerned.
+
+Queries that filter on order_date only touch the partitions in range, e.g.
+OrderViewSet with ?start=&end= or the exports (see exports.day_bounds).
+
+ensure_partitions() creates the months ahead. archive() detaches partitions
+older than a cutoff and moves their rows into api_order_archive, a plain
+table indexed with BRIN on order_date. The hot table stays a bounded size
+while history remains queryable in SQL; the ORM only sees the hot table, so
+rebuilds that aggregate all orders (api.analytics.rollup_rows) read both.
+"""
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from api.models import Order
+
+TABLE = Order._meta.db_table
+LEGACY_TABLE = f'{TABLE}_legacy'
+DEFAULT_PARTITION = f'{TABLE}_default'
+ARCHIVE_TABLE = f'{TABLE}_archive'
+SEQUENCE = f'{TABLE}_partitioned_id_seq'
+PARTITION_PREFIX = f'{TABLE}_p'
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{PARTITION_PREFIX}{month.year:04d}_{month.month:02d}'
+
+
+def partition_month(name):
+    """Month of a partition named by partition_name(), else None."""
+    if not name.startswith(PARTITION_PREFIX):
+        return None
+    try:
+        year, month = name[len(PARTITION_PREFIX):].split('_')
+        return date(int(year), int(month), 1)
+    except ValueError:
+        return None
+
+
+def _bound(month):
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _literal(month):
+    # DDL takes no bind parameters; the bound is built from a date, so inlining it is safe
+    return f"'{month.isoformat()} 00:00:00+00'"
+
+
+def _q(name):
+    return connection.ops.quote_name(name)
+
+
+def is_partitioned():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid))",
+            [TABLE],
+        )
+        return cursor.fetchone()[0]
+
+
+def has_archive():
+    """Whether archive() has created the archive table (never on other backends)."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [ARCHIVE_TABLE])
+        return cursor.fetchone()[0] is not None
+
+
+def partition_months():
+    """Months that have a partition, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [TABLE],
+        )
+        months = (partition_month(name) for name, in cursor.fetchall())
+        return sorted(month for month in months if month is not None)
+
+
+def _create_partition(cursor, month):
+    name, lower, upper = partition_name(month), _bound(month), _bound(add_months(month, 1))
+    bounds = f"FOR VALUES FROM ({_literal(month)}) TO ({_literal(add_months(month, 1))})"
+    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {_q(DEFAULT_PARTITION)} WHERE order_date >= %s AND order_date < %s)",
+                   [lower, upper])
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"CREATE TABLE {_q(name)} PARTITION OF {_q(TABLE)} {bounds}")
+        return
+    # Postgres refuses a partition whose rows already sit in DEFAULT: move them into a table, then attach it
+    cursor.execute(f"CREATE TABLE {_q(name)} (LIKE {_q(TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {_q(DEFAULT_PARTITION)} WHERE order_date >= %s AND order_date < %s "
+        f"RETURNING *) INSERT INTO {_q(name)} SELECT * FROM moved",
+        [lower, upper],
+    )
+    cursor.execute(f"ALTER TABLE {_q(TABLE)} ATTACH PARTITION {_q(name)} {bounds}")
+
+
+@transaction.atomic
+def ensure_partitions(through, since=None):
+    """Create the missing monthly partitions from `since` (default: the newest one) through `through`."""
+    existing = set(partition_months())
+    month = month_start(since) if since else (max(existing) if existing else month_start(through))
+    created = []
+    with connection.cursor() as cursor:
+        while month <= month_start(through):
+            if month not in existing:
+                _create_partition(cursor, month)
+                created.append(month)
+            month = add_months(month, 1)
+    return created
+
+
+def _indexes_and_constraints(cursor):
+    """Recreate the model's indexes and foreign keys on the partitioned table."""
+    cursor.execute(f"ALTER TABLE {_q(TABLE)} ADD PRIMARY KEY (order_id, order_date)")
+    for field in Order._meta.concrete_fields:
+        if field.remote_field is None:
+            continue
+        target = field.remote_field.model._meta
+        cursor.execute(f"CREATE INDEX {_q(f'{TABLE}_{field.column}_part_idx')} ON {_q(TABLE)} ({_q(field.column)})")
+        cursor.execute(
+            f"ALTER TABLE {_q(TABLE)} ADD CONSTRAINT {_q(f'{TABLE}_{field.column}_part_fk')} "
+            f"FOREIGN KEY ({_q(field.column)}) REFERENCES {_q(target.db_table)} ({_q(target.pk.column)}) "
+            f"DEFERRABLE INITIALLY DEFERRED"
+        )
+    with connection.schema_editor(atomic=False) as editor:
+        for index in Order._meta.indexes:
+            editor.add_index(Order, index)
+
+
+@transaction.atomic
+def convert(months_ahead=3, keep_legacy=False):
+    """
+    Rebuild api_order as a partitioned table holding the same rows. Takes an
+    exclusive lock on the table for the duration of the copy.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {_q(TABLE)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"SELECT min(order_date), max(order_id) FROM {_q(TABLE)}")
+        oldest, last_id = cursor.fetchone()
+
+        cursor.execute(f"ALTER TABLE {_q(TABLE)} RENAME TO {_q(LEGACY_TABLE)}")
+        # Index names are schema-wide: move the legacy ones out of the way
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [LEGACY_TABLE])
+        for name, in cursor.fetchall():
+            cursor.execute(f"ALTER INDEX {_q(name)} RENAME TO {_q(f'{name[:55]}_legacy')}")
+
+        cursor.execute(
+            f"CREATE TABLE {_q(TABLE)} (LIKE {_q(LEGACY_TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (order_date)"
+        )
+        # The legacy id sequence belongs to the legacy table; give the new one its own
+        cursor.execute(f"CREATE SEQUENCE {_q(SEQUENCE)} OWNED BY {_q(TABLE)}.order_id")
+        cursor.execute("SELECT setval(%s, %s, %s)", [SEQUENCE, last_id or 1, last_id is not None])
+        cursor.execute(f"ALTER TABLE {_q(TABLE)} ALTER COLUMN order_id SET DEFAULT nextval('{SEQUENCE}'::regclass)")
+        cursor.execute(f"CREATE TABLE {_q(DEFAULT_PARTITION)} PARTITION OF {_q(TABLE)} DEFAULT")
+
+    this_month = month_start(datetime.now(dt_timezone.utc))
+    ensure_partitions(add_months(this_month, months_ahead), since=oldest or this_month)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {_q(TABLE)} SELECT * FROM {_q(LEGACY_TABLE)}")
+        copied = cursor.rowcount
+        # Indexes after the copy: one sorted build per partition instead of row-by-row maintenance
+        _indexes_and_constraints(cursor)
+        if not keep_legacy:
+            cursor.execute(f"DROP TABLE {_q(LEGACY_TABLE)}")
+        cursor.execute(f"ANALYZE {_q(TABLE)}")
+    return copied
+
+
+def _ensure_archive(cursor, tablespace=None):
+    cursor.execute("SELECT to_regclass(%s)", [ARCHIVE_TABLE])
+    if cursor.fetchone()[0] is not None:
+        return
+    suffix = f" TABLESPACE {_q(tablespace)}" if tablespace else ''
+    cursor.execute(f"CREATE TABLE {_q(ARCHIVE_TABLE)} (LIKE {_q(TABLE)}){suffix}")
+    # Rows arrive in order_date order, so a BRIN index is tiny and still selective
+    cursor.execute(f"CREATE INDEX {_q(f'{ARCHIVE_TABLE}_date_brin')} ON {_q(ARCHIVE_TABLE)} USING brin (order_date)")
+    cursor.execute(f"CREATE INDEX {_q(f'{ARCHIVE_TABLE}_user_date_idx')} "
+                   f"ON {_q(ARCHIVE_TABLE)} (user_id, order_date DESC)")
+    # Django's cascading deletes only see the hot table: let the database clear archived rows
+    for field in Order._meta.concrete_fields:
+        if field.remote_field is not None:
+            target = field.remote_field.model._meta
+            cursor.execute(
+                f"ALTER TABLE {_q(ARCHIVE_TABLE)} ADD FOREIGN KEY ({_q(field.column)}) "
+                f"REFERENCES {_q(target.db_table)} ({_q(target.pk.column)}) ON DELETE CASCADE"
+            )
+
+
+def archive(before, tablespace=None):
+    """
+    Move every partition that ends on or before the month of `before` into
+    the archive table, one transaction per partition. Returns
+    [(month, rows moved)].
+    """
+    cutoff = month_start(before)
+    moved = []
+    for month in partition_months():
+        if add_months(month, 1) > cutoff:
+            break
+        name = partition_name(month)
+        with transaction.atomic(), connection.cursor() as cursor:
+            _ensure_archive(cursor, tablespace)
+            cursor.execute(f"ALTER TABLE {_q(TABLE)} DETACH PARTITION {_q(name)}")
+            cursor.execute(f"INSERT INTO {_q(ARCHIVE_TABLE)} SELECT * FROM {_q(name)} ORDER BY order_date")
+            moved.append((month, cursor.rowcount))
+            cursor.execute(f"DROP TABLE {_q(name)}")
+    return moved
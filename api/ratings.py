@@ -0,0 +1,63 @@
+"""
+Incremental maintenance of the rating aggregates stored on Book.
+
+Each change is a single conditional UPDATE built from F() expressions, so
+concurrent reviews on the same book never lose an increment.
+"""
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast, NullIf
+
+from api.models import Book, Review
+
+STARS = range(1, 6)
+HISTOGRAM_FIELDS = [f'rating_{star}' for star in STARS]
+AGGREGATE_FIELDS = ['rating_avg', 'rating_count', 'rating_sum'] + HISTOGRAM_FIELDS
+
+
+def _apply(book_id, rating, sign):
+    new_count = F('rating_count') + sign
+    new_sum = F('rating_sum') + sign * rating
+    Book.objects.filter(pk=book_id).update(
+        rating_count=new_count,
+        rating_sum=new_sum,
+        rating_avg=Cast(new_sum, FloatField()) / NullIf(new_count, 0),
+        **{f'rating_{rating}': F(f'rating_{rating}') + sign},
+    )
+
+
+def review_added(review):
+    _apply(review.book_id, review.rating, 1)
+
+
+def review_removed(review):
+    _apply(review.book_id, review.rating, -1)
+
+
+def review_changed(old_book_id, old_rating, review):
+    if (old_book_id, old_rating) == (review.book_id, review.rating):
+        return
+    _apply(old_book_id, old_rating, -1)
+    _apply(review.book_id, review.rating, 1)
+
+
+def histogram(book):
+    return {str(star): getattr(book, f'rating_{star}') for star in STARS}
+
+
+def computed_aggregates():
+    """Yield (book_id, {field: value}) computed from the Review table."""
+    rows = Review.objects.values('book_id').annotate(
+        rating_count=Count('pk'),
+        rating_sum=Sum('rating'),
+        **{f'rating_{star}': Count('pk', filter=Q(rating=star)) for star in STARS},
+    ).order_by()
+    for row in rows.iterator(chunk_size=2000):
+        book_id = row.pop('book_id')
+        row['rating_avg'] = row['rating_sum'] / row['rating_count']
+        yield book_id, row
+
+
+def empty_aggregates():
+    values = dict.fromkeys(AGGREGATE_FIELDS, 0)
+    values['rating_avg'] = None
+    return values
@@ -0,0 +1,284 @@
+"""
+"Customers also bought" recommendations.
+
+Orders and positive reviews form a sparse user x book interaction matrix R.
+Item-item cosine similarity (R^T R scaled by the book norms) is computed
+with SciPy in blocks of books, and only the top-k neighbours of each book
+are kept.
+
+The result is written as plain .npy arrays into a new version directory
+under RECOMMENDATIONS['PATH'], then published by atomically replacing the
+CURRENT pointer file. Workers np.load() the arrays with mmap_mode='r', so
+every process shares one copy through the page cache. A lookup is a binary
+search plus an array slice and never touches the database.
+
+Incremental refreshes fold in orders and reviews newer than the stored
+watermarks. They recompute only the books whose similarity rows can have
+changed. Cancellations and edited or deleted reviews are picked up by the
+next full rebuild.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+
+from api.models import Order, Review
+
+CURRENT = 'CURRENT'
+KEEP_VERSIONS = 2  # Older versions may still be mapped by a worker until it reloads
+
+
+def _config():
+    config = {
+        'PATH': os.path.join(settings.BASE_DIR, 'var', 'recommendations'),
+        'TOP_K': 20,  # Neighbours stored per book
+        'MIN_COOCCURRENCE': 1,  # Users two books must share to be considered similar
+        'ORDER_WEIGHT': 1.0,
+        'REVIEW_WEIGHTS': {5: 1.0, 4: 0.5},  # Ratings below 4 carry no signal
+        'MAX_WEIGHT': 2.0,  # Cap on one user's weight for one book (repeat purchases)
+        'BLOCK_SIZE': 2048,  # Books per similarity block, bounds peak memory
+        'RELOAD_SECONDS': 5,  # How often workers check CURRENT for a new version
+    }
+    config.update(getattr(settings, 'RECOMMENDATIONS', {}))
+    return config
+
+
+# Building
+
+def _interactions(order_after=0, review_after=0):
+    """(user ids, book ids, weights, last order id, last review id) of the events after the watermarks."""
+    config = _config()
+    users, books, weights = [], [], []
+    last_order, last_review = order_after, review_after
+
+    orders = (Order.objects.filter(order_id__gt=order_after).exclude(status='cancelled')
+              .order_by('order_id').values_list('order_id', 'user_id', 'book_id'))
+    for order_id, user_id, book_id in orders.iterator(chunk_size=10000):
+        users.append(user_id)
+        books.append(book_id)
+        weights.append(config['ORDER_WEIGHT'])
+        last_order = order_id
+
+    review_weights = {int(rating): weight for rating, weight in config['REVIEW_WEIGHTS'].items()}
+    reviews = (Review.objects.filter(review_id__gt=review_after).order_by('review_id')
+               .values_list('review_id', 'user_id', 'book_id', 'rating'))
+    for review_id, user_id, book_id, rating in reviews.iterator(chunk_size=10000):
+        last_review = review_id
+        weight = review_weights.get(rating)
+        if weight:
+            users.append(user_id)
+            books.append(book_id)
+            weights.append(weight)
+
+    return (np.asarray(users, dtype=np.int64), np.asarray(books, dtype=np.int64),
+            np.asarray(weights, dtype=np.float32), last_order, last_review)
+
+
+def _interaction_matrix(user_ids, book_ids, rows, cols, weights):
+    """Sum duplicate (user, book) events into a capped CSR matrix over the given id axes."""
+    matrix = sparse.coo_matrix((weights, (rows, cols)), shape=(len(user_ids), len(book_ids))).tocsr()
+    matrix.sum_duplicates()
+    np.minimum(matrix.data, _config()['MAX_WEIGHT'], out=matrix.data)
+    return matrix
+
+
+def _top_k(interactions, columns, norms, top_k, min_cooccurrence):
+    """Top-k (neighbour index, cosine) for each book index in `columns`."""
+    neighbours = np.full((len(columns), top_k), -1, dtype=np.int64)
+    scores = np.zeros((len(columns), top_k), dtype=np.float32)
+    block_size = _config()['BLOCK_SIZE']
+    by_column = interactions.tocsc()
+    if min_cooccurrence > 1:
+        binary = interactions.copy()
+        binary.data[:] = 1
+        binary_by_column = binary.tocsc()
+
+    for start in range(0, len(columns), block_size):
+        block = columns[start:start + block_size]
+        similarity = (by_column[:, block].T @ interactions).tocsr()  # Dot products, block x books
+        if min_cooccurrence > 1:
+            support = (binary_by_column[:, block].T @ binary).tocsr()
+            similarity = similarity.multiply(support >= min_cooccurrence).tocsr()
+        # Cosine: scale row i by 1/|b_i| and column j by 1/|b_j|
+        similarity = sparse.diags(1 / norms[block]) @ similarity @ sparse.diags(1 / norms)
+        similarity = similarity.tocsr()
+
+        for offset in range(len(block)):
+            lo, hi = similarity.indptr[offset], similarity.indptr[offset + 1]
+            indices, values = similarity.indices[lo:hi], similarity.data[lo:hi]
+            keep = indices != block[offset]  # Not similar to itself
+            indices, values = indices[keep], values[keep]
+            if len(values) > top_k:
+                best = np.argpartition(-values, top_k)[:top_k]
+                indices, values = indices[best], values[best]
+            order = np.argsort(-values, kind='stable')
+            neighbours[start + offset, :len(order)] = indices[order]
+            scores[start + offset, :len(order)] = values[order]
+    return neighbours, scores
+
+
+def _publish(root, arrays, meta):
+    """Write a new version directory and point CURRENT at it."""
+    version = f'v{time.time_ns()}'
+    directory = os.path.join(root, version)
+    os.makedirs(directory)
+    for name, array in arrays.items():
+        if sparse.issparse(array):
+            sparse.save_npz(os.path.join(directory, f'{name}.npz'), array, compressed=False)
+        else:
+            np.save(os.path.join(directory, f'{name}.npy'), array)
+    with open(os.path.join(directory, 'meta.json'), 'w') as handle:
+        json.dump(meta, handle)
+
+    pointer = os.path.join(root, CURRENT)
+    with open(pointer + '.tmp', 'w') as handle:
+        handle.write(version)
+    os.replace(pointer + '.tmp', pointer)
+
+    versions = sorted(name for name in os.listdir(root) if name.startswith('v'))
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return version
+
+
+def _current_directory(root):
+    try:
+        with open(os.path.join(root, CURRENT)) as handle:
+            return os.path.join(root, handle.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def build(full=False):
+    """
+    Refresh the similarity arrays: incrementally from the stored watermarks,
+    or from the whole history when `full` or nothing was built yet.
+    Returns a summary dict.
+    """
+    config = _config()
+    root = config['PATH']
+    os.makedirs(root, exist_ok=True)
+    directory = None if full else _current_directory(root)
+
+    if directory is None:
+        users, books, weights, last_order, last_review = _interactions()
+        user_ids, rows = np.unique(users, return_inverse=True)
+        book_ids, cols = np.unique(books, return_inverse=True)
+        interactions = _interaction_matrix(user_ids, book_ids, rows, cols, weights)
+        changed = np.arange(len(book_ids))
+        neighbours = np.full((len(book_ids), config['TOP_K']), -1, dtype=np.int64)
+        scores = np.zeros((len(book_ids), config['TOP_K']), dtype=np.float32)
+    else:
+        with open(os.path.join(directory, 'meta.json')) as handle:
+            meta = json.load(handle)
+        users, books, weights, last_order, last_review = _interactions(meta['last_order_id'], meta['last_review_id'])
+        if not len(users) and meta['top_k'] == config['TOP_K']:
+            return {'mode': 'incremental', 'events': 0, 'books': meta['books'], 'recomputed': 0}
+
+        old_users = np.load(os.path.join(directory, 'user_ids.npy'))
+        old_books = np.load(os.path.join(directory, 'book_ids.npy'))
+        old = sparse.load_npz(os.path.join(directory, 'interactions.npz')).tocoo()
+        user_ids = np.union1d(old_users, users)
+        book_ids = np.union1d(old_books, books)
+        rows = np.concatenate([np.searchsorted(user_ids, old_users[old.row]), np.searchsorted(user_ids, users)])
+        cols = np.concatenate([np.searchsorted(book_ids, old_books[old.col]), np.searchsorted(book_ids, books)])
+        interactions = _interaction_matrix(user_ids, book_ids, rows, cols,
+                                           np.concatenate([old.data.astype(np.float32), weights]))
+
+        # Rows to redo: the touched books and every book sharing a user with them
+        touched = np.unique(np.searchsorted(book_ids, books))
+        touched_users = np.unique(interactions.tocsc()[:, touched].indices)
+        changed = np.unique(interactions[touched_users].indices)
+
+        # Carry the other rows over, re-indexed onto the grown book axis
+        neighbours = np.full((len(book_ids), config['TOP_K']), -1, dtype=np.int64)
+        scores = np.zeros((len(book_ids), config['TOP_K']), dtype=np.float32)
+        if meta['top_k'] == config['TOP_K']:
+            old_neighbours = np.load(os.path.join(directory, 'neighbour_ids.npy'))
+            old_scores = np.load(os.path.join(directory, 'scores.npy'))
+            positions = np.searchsorted(book_ids, old_books)
+            valid = old_neighbours >= 0
+            remapped = np.full_like(old_neighbours, -1)
+            remapped[valid] = np.searchsorted(book_ids, old_neighbours[valid])
+            neighbours[positions], scores[positions] = remapped, old_scores
+        else:
+            changed = np.arange(len(book_ids))
+
+    norms = np.sqrt(np.asarray(interactions.multiply(interactions).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    if len(changed):
+        neighbours[changed], scores[changed] = _top_k(
+            interactions, changed, norms, config['TOP_K'], config['MIN_COOCCURRENCE'])
+
+    # Neighbours are stored as book ids so lookups need no second indirection
+    neighbour_ids = np.where(neighbours >= 0, book_ids[np.clip(neighbours, 0, None)], -1)
+    version = _publish(root, {
+        'user_ids': user_ids,
+        'book_ids': book_ids,
+        'interactions': interactions,
+        'neighbour_ids': neighbour_ids,
+        'scores': scores,
+    }, {
+        'last_order_id': last_order,
+        'last_review_id': last_review,
+        'top_k': config['TOP_K'],
+        'books': int(len(book_ids)),
+        'built_at': time.time(),
+    })
+    recommender.reload()
+    return {'mode': 'incremental' if directory else 'full', 'events': int(len(users)),
+            'books': int(len(book_ids)), 'recomputed': int(len(changed)), 'version': version}
+
+
+# Serving
+
+class Recommender:
+    """Memory-mapped view of the current version, re-checked every RELOAD_SECONDS."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None  # (version directory, book_ids, neighbour_ids, scores)
+        self._checked_at = None
+
+    def reload(self):
+        self._checked_at = None
+
+    def _stale(self, now):
+        return self._checked_at is None or now - self._checked_at >= _config()['RELOAD_SECONDS']
+
+    def _arrays(self):
+        now = time.monotonic()
+        if not self._stale(now):
+            return self._state
+        with self._lock:
+            if self._stale(now):
+                directory = _current_directory(_config()['PATH'])
+                if directory is None:
+                    self._state = None
+                elif self._state is None or self._state[0] != directory:
+                    self._state = (directory,) + tuple(
+                        np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+                        for name in ('book_ids', 'neighbour_ids', 'scores')
+                    )
+                self._checked_at = now
+        return self._state
+
+    def similar(self, book_id, limit=10):
+        """[(book_id, score)] most similar first; empty for books without history."""
+        state = self._arrays()
+        if state is None:
+            return []
+        _, book_ids, neighbour_ids, scores = state
+        row = int(np.searchsorted(book_ids, book_id))
+        if row >= len(book_ids) or book_ids[row] != book_id:
+            return []
+        ids, values = neighbour_ids[row, :limit], scores[row, :limit]
+        return [(int(neighbour), float(score)) for neighbour, score in zip(ids, values) if neighbour >= 0]
+
+
+recommender = Recommender()
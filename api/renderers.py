@@ -0,0 +1,48 @@
+"""
+Compact response renderers.
+
+ORJSONRenderer serves application/json through orjson, falling back to
+DRF's encoder when orjson is not installed. MessagePackRenderer answers
+`Accept: application/msgpack` (or `?format=msgpack`) and is only listed in
+DEFAULT_RENDERER_CLASSES when msgpack is installed.
+"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+_encoder = JSONEncoder()
+
+
+def _default(value):
+    """Types orjson/msgpack do not know (Decimal, lazy strings, ...) go through DRF's encoder."""
+    return _encoder.default(value)
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_default, use_bin_type=True, datetime=False)
@@ -0,0 +1,179 @@
+"""
+Read-replica routing.
+
+Writes, and every read by default, go to the primary ('default'). During a
+safe (GET/HEAD/OPTIONS) request to a view flagged `replica_reads = True`,
+ReplicaRoutingMiddleware switches reads to a random alias from
+DATABASE_REPLICAS. After a user's unsafe request they are pinned to the
+primary for REPLICA_STICKY_SECONDS, so they read their own writes despite
+replication lag.
+
+The pins live in the REPLICA_PIN_CACHE cache alias ('default'), which every
+worker must share. With a process-local backend (LocMem, dummy) a write on
+one worker would not pin reads served by another, so replicas are not used
+at all and the system check reports it.
+"""
+import base64
+import json
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from api.cache import is_shared
+
+_use_replicas = ContextVar('use_replicas', default=False)
+
+def _pin_cache_alias():
+    return getattr(settings, 'REPLICA_PIN_CACHE', 'default')
+
+
+def replica_aliases():
+    replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+    if replicas and not is_shared(_pin_cache_alias()):
+        return []  # Read-your-writes could not hold across workers
+    return replicas
+
+
+@checks.register(checks.Tags.database)
+def check_pin_cache(app_configs, **kwargs):
+    if getattr(settings, 'DATABASE_REPLICAS', []) and not is_shared(_pin_cache_alias()):
+        return [checks.Warning(
+            "DATABASE_REPLICAS is ignored: the REPLICA_PIN_CACHE cache "
+            f"'{_pin_cache_alias()}' is not shared between workers.",
+            hint="Point it at a shared backend, e.g. set REDIS_URL.",
+            id='api.W001',
+        )]
+    return []
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if not replicas or not _use_replicas.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS  # Reads inside a transaction must see its writes
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replica_aliases()  # Replicas get their schema from the primary
+
+
+def _sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+
+
+def _pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def _request_user_id(request):
+    """
+    The requesting user's id. JWT authentication only runs inside the view, so
+    before that the id is read from the token payload without verifying it:
+    it only decides whether this request reads from the primary.
+    """
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        user = None  # Session user not loaded yet; loading it would query (and cannot run in async code)
+    if user is not None and user.is_authenticated:
+        return user.pk
+    parts = request.headers.get('Authorization', '').split()
+    if len(parts) != 2 or parts[0] not in jwt_settings.AUTH_HEADER_TYPES:
+        return None
+    try:
+        payload = parts[1].split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return claims.get(jwt_settings.USER_ID_CLAIM)
+    except (IndexError, ValueError, AttributeError):
+        return None
+
+
+def pin_to_primary(user_id):
+    caches[_pin_cache_alias()].set(_pin_key(user_id), True, _sticky_seconds())
+
+
+async def apin_to_primary(user_id):
+    await caches[_pin_cache_alias()].aset(_pin_key(user_id), True, _sticky_seconds())
+
+
+def pinned_to_primary(user_id):
+    return user_id is not None and caches[_pin_cache_alias()].get(_pin_key(user_id)) is not None
+
+
+async def apinned_to_primary(user_id):
+    return user_id is not None and await caches[_pin_cache_alias()].aget(_pin_key(user_id)) is not None
+
+
+def _reads_replicas(request, view_func):
+    """Whether the view may read from replicas, before the per-user pin is checked."""
+    view_class = getattr(view_func, 'cls', None)
+    return request.method in SAFE_METHODS and bool(replica_aliases()) and getattr(view_class, 'replica_reads', False)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Runs in both modes, so under ASGI neither the chain nor process_view is
+    wrapped in a thread: async views (the live streams) pass without a hop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _use_replicas.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replicas.reset(token)
+
+        if request.method not in SAFE_METHODS and replica_aliases():
+            user_id = _request_user_id(request)  # request.user is the DRF-authenticated user by now
+            if user_id is not None:
+                pin_to_primary(user_id)
+        return response
+
+    async def __acall__(self, request):
+        token = _use_replicas.set(False)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_replicas.reset(token)
+
+        if request.method not in SAFE_METHODS and replica_aliases():
+            user_id = _request_user_id(request)
+            if user_id is not None:
+                await apin_to_primary(user_id)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if _reads_replicas(request, view_func) and not pinned_to_primary(_request_user_id(request)):
+            _use_replicas.set(True)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        if _reads_replicas(request, view_func) and not await apinned_to_primary(_request_user_id(request)):
+            _use_replicas.set(True)
@@ -0,0 +1,282 @@
+"""
+Catalogue search over Book title/author/category.
+
+On PostgreSQL the search runs against a weighted `tsvector` expression backed
+by a GIN index, with pg_trgm word similarity for typo tolerance.  Other
+backends (SQLite in tests) use an in-process inverted index that is kept in
+sync through Book save/delete signals.
+"""
+import bisect
+import re
+import threading
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.models import Book
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Field weights, mirrored by the tsvector setweight() labels A/B/C
+FIELD_WEIGHTS = {'title': 1.0, 'author': 0.6, 'category': 0.3}
+
+PREFIX_MATCH_WEIGHT = 0.8
+FUZZY_MATCH_WEIGHT = 0.5
+FUZZY_MIN_SIMILARITY = 0.5
+
+# Ranked candidates handed to the database per filtering query
+MAX_CANDIDATES = 1000
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').casefold())
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def search_vector_sql(table=''):
+    """The tsvector expression, shared by the GIN index and the search query."""
+    prefix = f'{table}.' if table else ''
+    return (
+        f"setweight(to_tsvector('simple', coalesce({prefix}title, '')), 'A') || "
+        f"setweight(to_tsvector('simple', coalesce({prefix}author, '')), 'B') || "
+        f"setweight(to_tsvector('simple', coalesce({prefix}category, '')), 'C')"
+    )
+
+
+def create_postgres_search_indexes(using='default'):
+    """Create the GIN indexes used by the postgres search path (idempotent)."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    table = Book._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_search_gin ON {table} "
+            f"USING gin (({search_vector_sql()}))"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_title_trgm ON {table} USING gin (title gin_trgm_ops)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_author_trgm ON {table} USING gin (author gin_trgm_ops)"
+        )
+
+
+def _parse_bool(name, value):
+    lowered = value.lower()
+    if lowered in ('true', '1', 'yes'):
+        return True
+    if lowered in ('false', '0', 'no'):
+        return False
+    raise ValueError(f"Invalid value for {name}: {value!r}")
+
+
+def _parse_price(value):
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        price = None
+    if price is None or not price.is_finite():
+        raise ValueError("min_price and max_price must be numbers.")
+    return price
+
+
+def filter_books(queryset, params):
+    """Apply the category/price/condition/rental/availability filters from query params."""
+    if params.get('category'):
+        queryset = queryset.filter(category__in=params['category'].split(','))
+    if params.get('min_price'):
+        queryset = queryset.filter(price__gte=_parse_price(params['min_price']))
+    if params.get('max_price'):
+        queryset = queryset.filter(price__lte=_parse_price(params['max_price']))
+
+    condition = params.get('condition')
+    if condition:
+        if condition not in dict(Book.CONDITION_CHOICES):
+            raise ValueError("Invalid condition. Choose from: new or used.")
+        queryset = queryset.filter(condition=condition)
+
+    for name in ('rental_option', 'availability_status'):
+        if params.get(name):
+            queryset = queryset.filter(**{name: _parse_bool(name, params[name])})
+    return queryset
+
+
+class BookSearchIndex:
+    """
+    In-process inverted index used when the database has no full-text search.
+
+    Every query token must match (AND), either exactly, as a prefix of an
+    indexed token, or fuzzily through token trigram similarity.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)  # token -> {book_id: weight}
+        self._documents = {}                # book_id -> set of tokens
+        self._vocabulary = []               # sorted tokens, for prefix lookups
+        self._token_trigrams = defaultdict(set)  # trigram -> tokens
+        self._loaded = False
+
+    def reset(self):
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self._vocabulary = []
+            self._token_trigrams.clear()
+            self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            rows = Book.objects.values_list('book_id', 'title', 'author', 'category')
+            for book_id, title, author, category in rows.iterator(chunk_size=2000):
+                self._add(book_id, title, author, category)
+            self._loaded = True
+
+    def _add(self, book_id, title, author, category):
+        weights = {}
+        for field, text in (('title', title), ('author', author), ('category', category)):
+            for token in tokenize(text):
+                weights[token] = max(weights.get(token, 0), FIELD_WEIGHTS[field])
+        for token, weight in weights.items():
+            if token not in self._postings:
+                bisect.insort(self._vocabulary, token)
+                for gram in trigrams(token):
+                    self._token_trigrams[gram].add(token)
+            self._postings[token][book_id] = weight
+        self._documents[book_id] = set(weights)
+
+    def _remove(self, book_id):
+        for token in self._documents.pop(book_id, ()):
+            self._postings[token].pop(book_id, None)
+
+    def update(self, book):
+        if not self._loaded:
+            return
+        with self._lock:
+            self._remove(book.pk)
+            self._add(book.pk, book.title, book.author, book.category)
+
+    def remove(self, book_id):
+        if not self._loaded:
+            return
+        with self._lock:
+            self._remove(book_id)
+
+    def _expand(self, token):
+        """Indexed tokens matching `token`, with a match-quality multiplier."""
+        expansions = {}
+        start = bisect.bisect_left(self._vocabulary, token)
+        for candidate in self._vocabulary[start:]:
+            if not candidate.startswith(token):
+                break
+            expansions[candidate] = 1.0 if candidate == token else PREFIX_MATCH_WEIGHT
+
+        if len(token) >= 3:
+            grams = trigrams(token)
+            shared = defaultdict(int)
+            for gram in grams:
+                for candidate in self._token_trigrams.get(gram, ()):
+                    shared[candidate] += 1
+            for candidate, count in shared.items():
+                similarity = count / len(grams | trigrams(candidate))
+                if similarity >= FUZZY_MIN_SIMILARITY and candidate not in expansions:
+                    expansions[candidate] = FUZZY_MATCH_WEIGHT * similarity
+        return expansions
+
+    def search(self, tokens):
+        """Return [(book_id, score)] ordered by descending relevance."""
+        self._ensure_loaded()
+        with self._lock:
+            scores = None
+            for token in tokens:
+                token_scores = {}
+                for candidate, quality in self._expand(token).items():
+                    for book_id, weight in self._postings.get(candidate, {}).items():
+                        score = weight * quality
+                        if score > token_scores.get(book_id, 0):
+                            token_scores[book_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        book_id: score + token_scores[book_id]
+                        for book_id, score in scores.items() if book_id in token_scores
+                    }
+                if not scores:
+                    return []
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+book_index = BookSearchIndex()
+
+
+@receiver(post_save, sender=Book)
+def _index_book(sender, instance, **kwargs):
+    book_index.update(instance)
+
+
+@receiver(post_delete, sender=Book)
+def _unindex_book(sender, instance, **kwargs):
+    book_index.remove(instance.pk)
+
+
+def _postgres_search(queryset, tokens):
+    table = Book._meta.db_table
+    vector = search_vector_sql(table)
+    tsquery = ' & '.join(f'{token}:*' for token in tokens)
+    phrase = ' '.join(tokens)
+    match = RawSQL(
+        f"(({vector}) @@ to_tsquery('simple', %s) "
+        f"OR %s <%% {table}.title OR %s <%% {table}.author)",
+        (tsquery, phrase, phrase),
+        output_field=BooleanField(),
+    )
+    rank = RawSQL(
+        f"ts_rank({vector}, to_tsquery('simple', %s)) + "
+        f"0.5 * greatest(word_similarity(%s, {table}.title), word_similarity(%s, {table}.author))",
+        (tsquery, phrase, phrase),
+        output_field=FloatField(),
+    )
+    return (
+        queryset.alias(search_hit=match).filter(search_hit=True)
+        .annotate(search_rank=rank).order_by('-search_rank', 'book_id')
+    )
+
+
+def search_books(query, params=None, limit=20):
+    """
+    Search the catalogue and return up to `limit` books, best match first.
+    Raises ValueError for malformed filter values.
+    """
+    tokens = tokenize(query)
+    queryset = filter_books(Book.objects.all(), params or {})
+    if not tokens:
+        return []
+
+    if connections[queryset.db].vendor == 'postgresql':
+        return list(_postgres_search(queryset, tokens)[:limit])
+
+    # Filter in rank order, a chunk at a time, so filtered-out top hits do not crowd out lower ranked matches
+    ranked, books = [book_id for book_id, _ in book_index.search(tokens)], []
+    for start in range(0, len(ranked), MAX_CANDIDATES):
+        chunk = ranked[start:start + MAX_CANDIDATES]
+        found = queryset.in_bulk(chunk)
+        books.extend(found[book_id] for book_id in chunk if book_id in found)
+        if len(books) >= limit:
+            break
+    return books[:limit]
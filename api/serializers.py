@@ -1,16 +1,47 @@
 from rest_framework import serializers
-from .models import Book,User,Seller,Order,Review,Request
+from .models import Book,User,Seller,Order,Review,Request,RequestMatch
 from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from api.images import variant_urls
+from api.inventory import restock
+from api.matching import record_matches
+from api.metrics import TimedSerializerMixin
+from api.mixins import FastRepresentationMixin, SparseFieldsetMixin
+from api.orders import InvalidTransition, check_transition
+from api.ratings import histogram
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(TimedSerializerMixin, SparseFieldsetMixin, FastRepresentationMixin, serializers.ModelSerializer):
     seller = serializers.PrimaryKeyRelatedField(queryset=Seller.objects.all())  # ✅ Should reference Seller, not User
     image = serializers.ImageField(required=False)  
+    rating_histogram = serializers.SerializerMethodField()  # Precomputed, no aggregate at request time
+    image_variants = serializers.SerializerMethodField()  # Resized WebP/JPEG covers + placeholder
+
+    # Columns the method fields read, so ?fields= can narrow the query with .only()
+    sparse_sources = {
+        'rating_histogram': ['rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5'],
+        'image_variants': ['image_variants'],
+    }
 
     class Meta:
         model = Book
         fields = ['book_id', 'seller', 'title', 'author', 'category', 'price', 'availability_status', 
-                  'rental_option', 'condition', 'quantity', 'image']
+                  'rental_option', 'condition', 'quantity', 'image',
+                  'rating_avg', 'rating_count', 'rating_histogram', 'image_variants']
+        read_only_fields = ['rating_avg', 'rating_count']
+        validators = []  # Duplicates (seller, title, author) are merged in create()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is not None:
+            fields['quantity'].read_only = True  # Stock only moves through the inventory helpers, e.g. restock
+        return fields
+
+    def get_rating_histogram(self, obj):
+        return histogram(obj)
+
+    def get_image_variants(self, obj):
+        return variant_urls(obj, self.context.get('request'))
 
     def create(self, validated_data):
         """
@@ -20,19 +51,34 @@ class BookSerializer(serializers.ModelSerializer):
         seller = validated_data.get('seller')  # ✅ Use 'seller' instead of 'seller_id'
         title = validated_data.get('title')
         author = validated_data.get('author')
+        quantity = validated_data.get('quantity', 1)
         
         # Check if a book with the same seller, title, and author exists
         existing_book = Book.objects.filter(seller=seller, title=title, author=author).first()
 
         if existing_book:
-            existing_book.quantity += validated_data.get('quantity', 1)  # ✅ Increase quantity
-            existing_book.save()
-            return existing_book  # ✅ Return the updated book instance
+            book = restock(existing_book, quantity)  # ✅ Atomic quantity increase
+        else:
+            try:
+                with transaction.atomic():
+                    book = super().create(validated_data)  # ✅ Otherwise, create a new book entry
+            except IntegrityError:
+                # Listed concurrently by another request, restock that row instead
+                existing_book = Book.objects.get(seller=seller, title=title, author=author)
+                book = restock(existing_book, quantity)
+
+        record_matches(book)  # Offer the listing to matching open requests
+        return book
 
-        return super().create(validated_data)  # ✅ Otherwise, create a new book entry
+    def update(self, instance, validated_data):
+        """Write only the submitted columns, so concurrent stock and rating updates are kept"""
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
 
         
-class UserSerializer(serializers.HyperlinkedModelSerializer):
+class UserSerializer(TimedSerializerMixin, SparseFieldsetMixin, FastRepresentationMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)  # Ensure password is write-only
 
     class Meta:
@@ -54,7 +100,7 @@ class UserSerializer(serializers.HyperlinkedModelSerializer):
         return user
 
 
-class SellerSerializer(serializers.Serializer):
+class SellerSerializer(TimedSerializerMixin, SparseFieldsetMixin, FastRepresentationMixin, serializers.Serializer):
     seller_id = serializers.IntegerField(read_only=True)
     user = serializers.PrimaryKeyRelatedField(read_only=True)
     shop_name = serializers.CharField(max_length=255)
@@ -84,21 +130,41 @@ class SellerSerializer(serializers.Serializer):
 
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, SparseFieldsetMixin, FastRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Order
-        fields = ['order_id', 'user', 'book', 'order_date', 'total_amount', 'status']
-        read_only_fields = ['order_id', 'order_date']  # These fields should not be modified manually
-
-    def validate_total_amount(self, value):
-        """Ensure total_amount is a positive value"""
-        if value <= 0:
-            raise serializers.ValidationError("Total amount must be greater than zero.")
+        fields = ['order_id', 'user', 'book', 'order_date', 'quantity', 'total_amount', 'status']
+        # total_amount is computed from Book.price when the order is placed
+        read_only_fields = ['order_id', 'order_date', 'total_amount']
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is None:
+            fields['status'].read_only = True  # New orders start as pending; later changes go through TRANSITIONS
+        else:
+            # Stock was reserved for this book and quantity when the order was placed
+            fields['book'].read_only = True
+            fields['quantity'].read_only = True
+        return fields
+
+    def validate_quantity(self, value):
+        """Ensure at least one copy is ordered"""
+        if value < 1:
+            raise serializers.ValidationError("Quantity must be at least 1.")
         return value
 
+    def validate(self, data):
+        """Status changes follow TRANSITIONS"""
+        if self.instance is not None and 'status' in data:
+            try:
+                check_transition(self.instance.status, data['status'])
+            except InvalidTransition as exc:
+                raise serializers.ValidationError({'status': str(exc)})
+        return data
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+
+class ReviewSerializer(TimedSerializerMixin, SparseFieldsetMixin, FastRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Review
         fields = ['review_id', 'user', 'book', 'rating', 'comment', 'review_date']
@@ -111,10 +177,19 @@ class ReviewSerializer(serializers.ModelSerializer):
         return value
     
 
-class RequestSerializer(serializers.ModelSerializer):
+class RequestMatchSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = RequestMatch
+        fields = ['seller', 'book', 'score', 'matched_at']
+        read_only_fields = fields
+
+
+class RequestSerializer(TimedSerializerMixin, SparseFieldsetMixin, FastRepresentationMixin, serializers.ModelSerializer):
+    matches = RequestMatchSerializer(many=True, read_only=True)  # Candidate sellers found by api.matching
+
     class Meta:
         model = Request
-        fields = ['request_id', 'user', 'book_title', 'author', 'status']
+        fields = ['request_id', 'user', 'book_title', 'author', 'status', 'matches']
         read_only_fields = ['request_id']  # Ensure ID is not required for input
 
     def validate_status(self, value):
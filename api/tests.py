@@ -1,3 +1,1315 @@
-from django.test import TestCase
+import base64
+import csv
+import json
+import os
+import random
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from itertools import count
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api import facets, image_processing, images, matching, metrics, orders, partitions, ratings, recommendations
+from api.authentication import BloomFilter, CachedJWTAuthentication, tokens_for_user, user_cache
+from api.duplicates import hash_fields, near_duplicates
+from api.image_processing import process_cover
+from api.inventory import OutOfStock
+from api.importers import BookImportSerializer, rows_from_list, upsert_books
+from api.live import Hub, make_event
+from api.matching import RequestIndex, request_index
+from api.models import (
+    Book, BookFacetCell, Order, OrderEvent, Request, RequestMatch, Review, Seller, SellerDailySales, User,
+)
+from api.orders import place_order
+from api.pagination import KeysetPagination
+from api.recommendations import recommender
+from api.routers import ReplicaRouter, ReplicaRoutingMiddleware, check_pin_cache
+from api.search import book_index, search_books
+from api.serializers import BookSerializer
+from api.throttling import check_throttle_cache
+
+_sequence = count(1)
+
+
+def make_user(**kwargs):
+    n = next(_sequence)
+    defaults = {'username': f'user{n}', 'email': f'user{n}@example.com'}
+    defaults.update(kwargs)
+    user = User(**defaults)
+    user.set_unusable_password()  # Skip password hashing, it dominates test setup time
+    user.save()
+    return user
+
+
+def make_seller(user=None):
+    n = next(_sequence)
+    return Seller.objects.create(user=user or make_user(is_seller=True),
+                                 shop_name=f'Shop {n}', gstin=f'GSTIN{n:010d}')
+
+
+def make_book(seller=None, **kwargs):
+    n = next(_sequence)
+    defaults = {'title': f'Book {n}', 'author': f'Author {n}', 'category': 'fiction',
+                'price': Decimal('199.00'), 'condition': 'new', 'quantity': 5}
+    defaults.update(kwargs)
+    return Book.objects.create(seller=seller or make_seller(), **defaults)
+
+
+class ListQueryCountTests(TestCase):
+    """
+    Guard against N+1 queries: a list endpoint must issue the same number
+    of queries whatever the number of rows it renders.
+    """
+
+    def setUp(self):
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def seed(self, rows):
+        for _ in range(rows):
+            book = make_book()
+            Order.objects.create(user=make_user(), book=book, total_amount=book.price)
+            Review.objects.create(user=make_user(), book=book, rating=4, comment='Good read')
+            Request.objects.create(user=make_user(), book_title=book.title, author=book.author)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertQueryCountConstant(self, url):
+        self.seed(3)
+        small = self.count_queries(url)
+        self.seed(6)
+        large = self.count_queries(url)
+        self.assertEqual(small, large, f"{url} query count grows with rows: {small} -> {large}")
+
+    def test_books(self):
+        self.assertQueryCountConstant('/api/v1/books/')
+
+    def test_orders(self):
+        self.assertQueryCountConstant('/api/v1/orders/')
+
+    def test_reviews(self):
+        self.assertQueryCountConstant('/api/v1/reviews/')
+
+    def test_requests(self):
+        self.assertQueryCountConstant('/api/v1/request/')
+
+    def test_sellers(self):
+        self.assertQueryCountConstant('/api/v1/seller/')
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_user())
+        self.seller = make_seller()
+        self.books = [make_book(self.seller).pk for _ in range(5)]
+
+    def page(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_cursors_are_stable_across_writes(self):
+        first = self.page('/api/v1/books/', {'page_size': 2})
+        seen = [book['book_id'] for book in first['results']]
+        added = [make_book(self.seller).pk for _ in range(2)]  # Land after the cursor, not on earlier pages
+        Book.objects.filter(pk=seen[0]).delete()  # An OFFSET page 2 would now skip a book
+
+        page = self.page(first['next'])
+        self.assertEqual([book['book_id'] for book in self.page(page['previous'])['results']], seen[1:])
+        while True:
+            seen += [book['book_id'] for book in page['results']]
+            if page['next'] is None:
+                break
+            page = self.page(page['next'])
+        self.assertEqual(seen, self.books + added)
+
+    def test_envelope_lists_cursors_before_results(self):
+        first = self.page('/api/v1/books/', {'page_size': 3})
+        self.assertEqual(list(first), ['next', 'previous', 'page_size', 'results'])
+        self.assertEqual((first['previous'], first['page_size'], len(first['results'])), (None, 3, 3))
+        last = self.page(first['next'])
+        self.assertEqual((last['next'], len(last['results'])), (None, 2))
+        self.assertIsNotNone(last['previous'])
+
+    def test_page_size_is_capped(self):
+        Book.objects.bulk_create(
+            Book(seller=self.seller, title=f'Bulk {n}', author='Author', category='fiction',
+                 price=Decimal('99.00'), condition='new')
+            for n in range(KeysetPagination.max_page_size)
+        )
+        page = self.page('/api/v1/books/', {'page_size': 10_000, 'fields': 'book_id'})
+        self.assertEqual((page['page_size'], len(page['results'])), (500, 500))
+        self.assertIsNotNone(page['next'])
+
+    def test_invalid_cursor_is_not_found(self):
+        self.assertEqual(self.client.get('/api/v1/books/', {'cursor': 'garbage'}).status_code, 404)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_user())
+        self.book = make_book()
+
+    def test_fields_and_exclude(self):
+        response = self.client.get(f'/api/v1/books/{self.book.pk}/', {'fields': 'book_id,title,price'})
+        self.assertEqual(response.json(), {'book_id': self.book.pk, 'title': self.book.title, 'price': '199.00'})
+        response = self.client.get(f'/api/v1/books/{self.book.pk}/', {'exclude': 'rating_histogram,image'})
+        self.assertNotIn('rating_histogram', response.json())
+        self.assertIn('seller', response.json())
+        response = self.client.get('/api/v1/books/', {'fields': 'title,nope'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_sparse_fieldset_narrows_the_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/v1/books/', {'fields': 'book_id,title'})
+        book_query = next(query['sql'] for query in ctx.captured_queries if '"api_book"' in query['sql'])
+        self.assertNotIn('"author"', book_query)
+
+    def test_fast_path_matches_drf(self):
+        class StockSerializer(serializers.ModelSerializer):
+            class Meta:
+                model = Book
+                fields = [name for name in BookSerializer.Meta.fields
+                          if name not in ('rating_histogram', 'image_variants')]
+
+        self.book.refresh_from_db()
+        fast = BookSerializer(self.book).data
+        self.assertEqual({name: fast[name] for name in StockSerializer.Meta.fields}, StockSerializer(self.book).data)
+
+
+
+class BulkOrderStatusTests(TestCase):
+    def setUp(self):
+        self.seller = make_seller()
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller.user)
+        self.book = make_book(self.seller, quantity=10)
+        buyer = make_user()
+        self.orders = [place_order(buyer, self.book.pk) for _ in range(3)]
+
+    def bulk(self, order_ids, new_status):
+        return self.client.post('/api/v1/orders/bulk-status/', {'order_ids': order_ids, 'status': new_status},
+                                format='json')
+
+    def test_state_machine_outcomes(self):
+        delivered = self.orders[2]
+        Order.objects.filter(pk=delivered.pk).update(status='delivered')
+        other_shop_order = place_order(make_user(), make_book().pk)
+
+        ids = [order.pk for order in self.orders] + [other_shop_order.pk]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.bulk(ids, 'cancelled')
+        self.assertEqual(response.status_code, 200)
+        results = {row['order_id']: row['result'] for row in response.json()['results']}
+        self.assertEqual(results, {self.orders[0].pk: 'updated', self.orders[1].pk: 'updated',
+                                   delivered.pk: 'invalid', other_shop_order.pk: 'not_found'})
+        self.assertEqual(sum('UPDATE "api_order"' in query['sql'] for query in ctx.captured_queries), 1)
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.quantity, 9)  # Two cancelled copies back in stock
+        self.assertEqual(OrderEvent.objects.count(), 1)
+        self.assertEqual(len(OrderEvent.objects.get().payload['orders']), 2)
+
+    def test_new_orders_start_pending(self):
+        buyer = make_user()
+        self.client.force_authenticate(buyer)
+        order = {'user': buyer.pk, 'book': self.book.pk, 'quantity': 1, 'status': 'cancelled'}
+        response = self.client.post('/api/v1/orders/', order, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.get(user=buyer).status, 'pending')
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.quantity, 6)
+
+    def test_single_update_rejects_invalid_transition(self):
+        order = self.orders[0]
+        self.assertEqual(self.client.patch(f'/api/v1/orders/{order.pk}/update_status/', {'status': 'delivered'},
+                                           format='json').status_code, 409)
+        self.assertEqual(self.client.patch(f'/api/v1/orders/{order.pk}/update_status/', {'status': 'shipped'},
+                                           format='json').status_code, 200)
+
+    def test_book_and_quantity_are_fixed_after_placement(self):
+        order = self.orders[0]
+        response = self.client.patch(f'/api/v1/orders/{order.pk}/', {'quantity': 100, 'book': make_book().pk},
+                                     format='json')
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual((order.book_id, order.quantity), (self.book.pk, 1))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.quantity, 7)
+
+    def test_deleting_an_open_order_releases_its_copies(self):
+        shipped, cancelled = self.orders[1], self.orders[2]
+        self.client.patch(f'/api/v1/orders/{shipped.pk}/update_status/', {'status': 'shipped'}, format='json')
+        self.bulk([cancelled.pk], 'cancelled')
+        for order in (shipped, cancelled):
+            self.assertEqual(self.client.delete(f'/api/v1/orders/{order.pk}/').status_code, 204)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.quantity, 9)  # The cancelled copy was already back
+        self.assertEqual(SellerDailySales.objects.filter(status__in=['shipped', 'cancelled'])
+                         .aggregate(total=Sum('order_count'))['total'], 0)
+        self.assertEqual(OrderEvent.objects.filter(event_type=orders.DELETED).count(), 2)
+
+
+class FacetCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_user())
+        seller = make_seller()
+        self.cheap = make_book(seller, price=Decimal('80.00'), quantity=1)
+        make_book(seller, category='poetry', price=Decimal('300.00'))
+        make_book(seller, condition='used', price=Decimal('120.00'))
+
+    def facets(self, query=''):
+        response = self.client.get(f'/api/v1/books/facets/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_disjunctive_counts_follow_book_changes(self):
+        data = self.facets('?category=fiction')
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['facets']['category'], {'fiction': 2, 'poetry': 1})  # Own filter not applied
+        self.assertEqual(data['facets']['condition'], {'new': 1, 'used': 1})
+        self.assertEqual(data['facets']['price'], {'0-100': 1, '100-250': 1})
+
+        place_order(make_user(), self.cheap.pk)  # Last copy: flips availability with a queryset update
+        book = Book.objects.get(category='poetry')
+        book.category = 'fiction'
+        book.save()
+        data = self.facets('?category=fiction&availability_status=true')
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['facets']['availability_status'], {'false': 1, 'true': 2})
+        self.assertEqual(data['facets']['category'], {'fiction': 2})
+
+    def test_cancellation_keeps_a_delisted_book_down(self):
+        order = place_order(make_user(), self.cheap.pk)  # Sold out
+        other = place_order(make_user(), make_book(quantity=3).pk)
+        Book.objects.filter(pk=other.book_id).update(availability_status=False)  # Taken down by the seller
+        facets.rebuild()
+        orders.bulk_transition([order.pk, other.pk], 'cancelled')
+
+        self.assertTrue(Book.objects.get(pk=order.book_id).availability_status)
+        self.assertFalse(Book.objects.get(pk=other.book_id).availability_status)
+        counted = self.facets()['facets']['availability_status']
+        facets.rebuild()
+        cache.clear()
+        self.assertEqual(self.facets()['facets']['availability_status'], counted)
+
+    def test_invalid_bucket(self):
+        self.assertEqual(self.client.get('/api/v1/books/facets/?price=1-2').status_code, 400)
+
+
+class OrderDateFilterTests(TestCase):
+    def test_start_end_filter_order_date(self):
+        buyer = make_user()
+        book = make_book(quantity=10)
+        old, recent = place_order(buyer, book.pk), place_order(buyer, book.pk)
+        Order.objects.filter(pk=old.pk).update(order_date=datetime(2024, 1, 31, 23, 30, tzinfo=dt_timezone.utc))
+        client = APIClient()
+        client.force_authenticate(buyer)
+
+        response = client.get('/api/v1/orders/?start=2024-01-01&end=2024-01-31')
+        self.assertEqual([row['order_id'] for row in response.json()['results']], [old.pk])
+        response = client.get('/api/v1/orders/?start=2024-02-01')
+        self.assertEqual([row['order_id'] for row in response.json()['results']], [recent.pk])
+        self.assertEqual(client.get('/api/v1/orders/?start=2024-02-01&end=2024-01-01').status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Needs real row locking and concurrent connections")
+class ConcurrentOrderTests(TransactionTestCase):
+    """
+    Hundreds of parallel buyers for one book must never oversell it. The
+    throughput is measured by benchmarks/order_contention.py.
+    """
+    buyers = 300
+    stock = 50
+    workers = 32
+
+    def test_no_overselling(self):
+        book = make_book(quantity=self.stock, price=Decimal('120.00'))
+        users = User.objects.bulk_create(
+            User(username=f'buyer{n}', email=f'buyer{n}@example.com', password='!') for n in range(self.buyers)
+        )
+
+        def buy(user):
+            try:
+                place_order(user, book.pk)
+                return True
+            except OutOfStock:
+                return False
+            finally:
+                connection.close()  # Each worker thread opened its own connection
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(buy, users))
+
+        book.refresh_from_db()
+        self.assertEqual(sum(results), self.stock)
+        self.assertEqual(Order.objects.filter(book=book).count(), self.stock)
+        self.assertEqual(book.quantity, 0)
+        self.assertFalse(book.availability_status)
+        self.assertEqual(
+            set(Order.objects.filter(book=book).values_list('total_amount', flat=True)), {Decimal('120.00')}
+        )
+
+    def test_concurrent_cancellations_release_stock_once(self):
+        book = make_book(quantity=5)
+        buyer = make_user()
+        order = place_order(buyer, book.pk)
+
+        def cancel(_):
+            client = APIClient()
+            client.force_authenticate(buyer)
+            try:
+                return client.patch(f'/api/v1/orders/{order.pk}/', {'status': 'cancelled'}, format='json').status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            statuses = list(pool.map(cancel, range(8)))
+
+        self.assertEqual(set(statuses), {200})  # Later requests find it cancelled already: no change
+        book.refresh_from_db()
+        self.assertEqual(book.quantity, 5)
+
+
+    def test_book_edits_keep_concurrent_orders(self):
+        book = make_book(quantity=5)
+        buyer = make_user()
+        client = APIClient()
+        client.force_authenticate(book.seller.user)
+        pool = ThreadPoolExecutor(max_workers=1)
+        update = BookSerializer.update
+
+        def buy():
+            try:
+                return place_order(buyer, book.pk)
+            finally:
+                connection.close()
+
+        def update_during_an_order(serializer, instance, validated_data):
+            # The order lands after the edit read the book, before it writes it back
+            wait([pool.submit(buy)], timeout=0.5)
+            return update(serializer, instance, validated_data)
+
+        with mock.patch.object(BookSerializer, 'update', update_during_an_order):
+            response = client.patch(f'/api/v1/books/{book.pk}/', {'title': 'Renamed', 'quantity': 50}, format='json')
+        pool.shutdown()
+        self.assertEqual(response.status_code, 200)
+        book.refresh_from_db()
+        self.assertEqual((book.title, book.quantity), ('Renamed', 4))
+
+@skipUnless(connection.vendor == 'postgresql', "EXPLAIN output is postgres specific")
+class QueryPlanTests(TestCase):
+    """
+    Every hot endpoint query must be servable by an index once a table grows
+    past QUERY_PLAN_SEQ_SCAN_ROW_LIMIT rows. Sequential scans are disabled for
+    the EXPLAIN, so a Seq Scan in the plan means no usable index exists.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        rows = settings.QUERY_PLAN_SEQ_SCAN_ROW_LIMIT + 100
+        users = User.objects.bulk_create(
+            User(username=f'plan{n}', email=f'plan{n}@example.com', password='!') for n in range(rows)
+        )
+        sellers = Seller.objects.bulk_create(
+            Seller(user=user, shop_name=f'Shop {n}', gstin=f'PLAN{n:011d}') for n, user in enumerate(users)
+        )
+        books = Book.objects.bulk_create(
+            Book(seller=seller, title=f'Title {n}', author=f'Author {n}', category=f'cat{n % 20}',
+                 price=Decimal(100 + n % 400), condition='new', availability_status=n % 3 != 0)
+            for n, seller in enumerate(sellers)
+        )
+        Order.objects.bulk_create(
+            Order(user=user, book=book, total_amount=book.price) for user, book in zip(users, books)
+        )
+        Review.objects.bulk_create(
+            Review(user=user, book=book, rating=1 + n % 5, comment='...')
+            for n, (user, book) in enumerate(zip(users, books))
+        )
+        Request.objects.bulk_create(
+            Request(user=user, book_title=f'Wanted {n}', author='Someone',
+                    request_status=['open', 'in_progress', 'closed'][n % 3])
+            for n, user in enumerate(users)
+        )
+        cls.user, cls.book = users[0], books[0]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def seq_scans(self, queryset):
+        """Relations read with a Seq Scan that hold more rows than the limit."""
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = json.loads(queryset.explain(format='json'))
+        relations = []
+        nodes = [plan[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.get('Plans', []))
+            if node['Node Type'] == 'Seq Scan':
+                relations.append(node['Relation Name'])
+
+        limit = settings.QUERY_PLAN_SEQ_SCAN_ROW_LIMIT
+        with connection.cursor() as cursor:
+            return [
+                name for name in relations
+                if self.row_estimate(cursor, name) > limit
+            ]
+
+    def row_estimate(self, cursor, relation):
+        cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [relation])
+        return cursor.fetchone()[0]
+
+    def assertIndexed(self, queryset):
+        scans = self.seq_scans(queryset)
+        self.assertFalse(scans, f"Sequential scan on {scans} for: {queryset.query}")
+
+    def test_order_history_by_user(self):
+        self.assertIndexed(Order.objects.filter(user=self.user).order_by('-order_date'))
+
+    def test_reviews_by_book(self):
+        self.assertIndexed(Review.objects.filter(book=self.book).order_by('-review_date'))
+
+    def test_available_books_by_category(self):
+        self.assertIndexed(Book.objects.filter(category='cat3', availability_status=True).order_by('price'))
+
+    def test_books_by_category_and_price(self):
+        self.assertIndexed(Book.objects.filter(category='cat3', price__lte=200))
+
+    def test_available_books_by_price(self):
+        self.assertIndexed(Book.objects.filter(availability_status=True, price__range=(100, 150)))
+
+    def test_requests_by_status(self):
+        self.assertIndexed(Request.objects.filter(request_status='open'))
+
+    def test_sellers_by_user(self):
+        self.assertIndexed(Seller.objects.filter(user__id=self.user.pk))
+
+    def test_book_keyset_page(self):
+        self.assertIndexed(Book.objects.filter(book_id__gt=self.book.pk).order_by('book_id')[:50])
+
+
+@skipUnless(connection.vendor == 'postgresql', "Declarative partitioning is postgres specific")
+class OrderPartitionTests(TransactionTestCase):
+    """convert() -> ensure_partitions() -> archive() on a table that already holds orders."""
+
+    def setUp(self):
+        self.addCleanup(self.restore_order_table)
+        self.user = make_user()
+        self.book = make_book(quantity=10)
+        self.this_month = partitions.month_start(datetime.now(dt_timezone.utc))
+        dates = [datetime(2024, 1, 5, tzinfo=dt_timezone.utc), datetime(2024, 1, 31, 23, 30, tzinfo=dt_timezone.utc),
+                 datetime(2024, 2, 1, 0, 30, tzinfo=dt_timezone.utc), None]
+        self.orders = []
+        for order_date in dates:
+            order = place_order(self.user, self.book.pk)
+            if order_date is not None:
+                Order.objects.filter(pk=order.pk).update(order_date=order_date)
+            self.orders.append(order.pk)
+
+    def restore_order_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {partitions.ARCHIVE_TABLE}, {partitions.TABLE} CASCADE")
+        with connection.schema_editor() as editor:
+            editor.create_model(Order)
+
+    def count(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {connection.ops.quote_name(table)}")
+            return cursor.fetchone()[0]
+
+    def test_orders_survive_conversion_and_archiving(self):
+        self.assertFalse(partitions.is_partitioned())
+        self.assertEqual(partitions.convert(months_ahead=1), 4)
+        self.assertTrue(partitions.is_partitioned())
+        months = partitions.partition_months()
+        self.assertEqual((months[0], months[-1]), (date(2024, 1, 1), partitions.add_months(self.this_month, 1)))
+        self.assertEqual(self.count(partitions.partition_name(date(2024, 1, 1))), 2)
+        self.assertEqual(self.count(partitions.DEFAULT_PARTITION), 0)
+
+        # The ORM reads through the parent table, and new ids continue the old sequence
+        self.assertEqual(sorted(Order.objects.values_list('pk', flat=True)), self.orders)
+        placed = place_order(self.user, self.book.pk)
+        self.assertGreater(placed.pk, max(self.orders))
+        self.assertEqual(Order.objects.select_related('book').get(pk=placed.pk).book.pk, self.book.pk)
+        self.assertEqual(self.count(partitions.partition_name(self.this_month)), 2)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Order.objects.create(user=self.user, book_id=self.book.pk + 1000, total_amount=1)
+
+        created = partitions.ensure_partitions(partitions.add_months(self.this_month, 3))
+        self.assertEqual(created, [partitions.add_months(self.this_month, n) for n in (2, 3)])
+        self.assertEqual(partitions.ensure_partitions(partitions.add_months(self.this_month, 3)), [])
+
+        moved = partitions.archive(date(2024, 3, 1))
+        self.assertEqual(moved, [(date(2024, 1, 1), 2), (date(2024, 2, 1), 1)])
+        self.assertEqual(partitions.partition_months()[0], date(2024, 3, 1))
+        self.assertEqual(self.count(partitions.ARCHIVE_TABLE), 3)
+        self.assertEqual(sorted(Order.objects.values_list('pk', flat=True)), [self.orders[-1], placed.pk])
+        self.assertFalse(Order.objects.filter(order_date__lt=datetime(2024, 3, 1, tzinfo=dt_timezone.utc)).exists())
+
+        # Archived rows still point at real books, and go with them
+        Book.objects.filter(pk=self.book.pk).delete()
+        self.assertEqual((self.count(partitions.ARCHIVE_TABLE), Order.objects.count()), (0, 0))
+
+    @override_settings(TIME_ZONE='Asia/Kolkata')
+    def test_rebuilt_rollups_keep_archived_months(self):
+        def rollups():
+            return sorted(SellerDailySales.objects.values_list('day', 'status', 'order_count', 'units', 'revenue'))
+
+        call_command('rebuild_seller_analytics', stdout=StringIO())
+        expected = rollups()
+        # 2024-01-31 23:30 UTC and 2024-02-01 00:30 UTC are the same local day, split across archive and hot table
+        self.assertEqual(SellerDailySales.objects.get(day=date(2024, 2, 1)).order_count, 2)
+
+        partitions.convert(months_ahead=1)
+        self.assertEqual(partitions.archive(date(2024, 2, 1)), [(date(2024, 1, 1), 2)])
+        call_command('rebuild_seller_analytics', stdout=StringIO())
+        self.assertEqual(rollups(), expected)
+        call_command('rebuild_seller_analytics', since='2024-02-01', stdout=StringIO())
+        self.assertEqual(rollups(), expected)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'], REPLICA_STICKY_SECONDS=60, REPLICA_PIN_CACHE='pins',
+                   CACHES={**settings.CACHES, 'pins': {
+                       'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                       'LOCATION': os.path.join(tempfile.gettempdir(), 'bookhub-test-replica-pins'),
+                   }})
+class ReplicaRoutingTests(SimpleTestCase):
+    """Routing decisions only: no query is run, so the replica alias need not exist."""
+
+    def setUp(self):
+        caches['pins'].clear()
+        payload = base64.urlsafe_b64encode(json.dumps({'user_id': 7}).encode()).decode().rstrip('=')
+        self.factory = RequestFactory(HTTP_AUTHORIZATION=f'Bearer header.{payload}.signature')
+
+    def route(self, method, replica_reads=True):
+        """Run a request through the middleware and return the alias a read would use."""
+        def view(request):
+            return HttpResponse()
+        view.cls = type('View', (), {'replica_reads': replica_reads})
+
+        routed = []
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            routed.append(ReplicaRouter().db_for_read(Book))
+            return view(request)
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        middleware(getattr(self.factory, method)('/'))
+        return routed[0]
+
+    def aroute(self, method, replica_reads=True):
+        """route() through the async side of the middleware."""
+        def view(request):
+            return HttpResponse()
+        view.cls = type('View', (), {'replica_reads': replica_reads})
+
+        routed = []
+
+        async def get_response(request):
+            await middleware.process_view(request, view, (), {})
+            routed.append(ReplicaRouter().db_for_read(Book))
+            return view(request)
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        async_to_sync(middleware)(getattr(self.factory, method)('/'))
+        return routed[0]
+
+    def test_safe_requests_to_flagged_views_read_from_replicas(self):
+        self.assertEqual(self.route('get'), 'replica_1')
+        self.assertEqual(self.route('get', replica_reads=False), 'default')
+        self.assertEqual(ReplicaRouter().db_for_read(Book), 'default')  # Outside a request
+
+    def test_writes_pin_the_user_to_the_primary(self):
+        self.assertEqual(self.route('post'), 'default')
+        self.assertEqual(self.route('get'), 'default')
+        caches['pins'].clear()  # Stickiness expired
+        self.assertEqual(self.route('get'), 'replica_1')
+
+    def test_async_requests_are_routed_the_same(self):
+        self.assertTrue(iscoroutinefunction(ReplicaRoutingMiddleware(self.async_view)))
+        self.assertEqual(self.aroute('get'), 'replica_1')
+        self.assertEqual(self.aroute('post'), 'default')
+        self.assertEqual(self.aroute('get'), 'default')
+        self.assertEqual(self.route('get'), 'default')  # The pin is shared with sync requests
+
+    async def async_view(self, request):
+        return HttpResponse()
+
+    def test_process_local_pin_cache_disables_replicas(self):
+        with override_settings(REPLICA_PIN_CACHE='default'):  # LocMem in tests
+            self.assertEqual(self.route('get'), 'default')
+            self.assertEqual([error.id for error in check_pin_cache(None)], ['api.W001'])
+        self.assertEqual(check_pin_cache(None), [])
+
+
+@override_settings(LIVE_EVENTS={'BACKEND': 'api.live.LocalBackend', 'QUEUE_SIZE': 3})
+class LiveEventHubTests(SimpleTestCase):
+    async def test_fan_out_and_resume(self):
+        hub = Hub()
+        stream = hub.subscribe(['book:1'])
+        events = [make_event('book:1', 'book.stock', {'quantity': n}) for n in range(3)]
+        hub.dispatch(events[:1])
+        self.assertEqual(stream.queue.get_nowait(), events[0])
+        hub.dispatch(events[1:])
+
+        resumed = hub.subscribe(['book:1'], last_event_id=events[0]['id'])
+        self.assertEqual([resumed.queue.get_nowait() for _ in range(2)], events[1:])
+        evicted = hub.subscribe(['book:1'], last_event_id='gone')
+        self.assertEqual(evicted.queue.get_nowait()['type'], 'reset')
+
+    async def test_slow_stream_is_dropped(self):
+        hub = Hub()
+        stream = hub.subscribe(['user:1'])
+        hub.dispatch([make_event('user:1', 'order.status', {'status': 'shipped'}) for _ in range(4)])
+        self.assertIsNone(stream.queue.get_nowait())  # End of stream, the client resumes from its last id
+        self.assertEqual(hub.stream_count(), 0)
+
+
+class RequestMatchingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        request_index.reset()
+        self.addCleanup(request_index.reset)  # Rolled-back requests must not stay indexed
+
+    def open_request(self, title, author):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Request.objects.create(user=make_user(), book_title=title, author=author)
+
+    def test_listing_matches_similar_open_requests(self):
+        wanted = self.open_request("Harry Potter and the Philosopher's Stone", 'J.K. Rowling')
+        self.open_request('Dune', 'Frank Herbert')
+        book = make_book(title='Harry Potter & the Philosophers Stone', author='J. K. Rowling')
+
+        self.assertEqual(matching.record_matches(book), 1)
+        match = RequestMatch.objects.get()
+        self.assertEqual((match.request_id, match.book_id), (wanted.pk, book.pk))
+        self.assertGreaterEqual(match.score, matching.MIN_SCORE)
+
+    def test_closed_requests_are_not_matched(self):
+        request = self.open_request('Dune', 'Frank Herbert')
+        self.assertEqual(request_index.match('The Dune', 'Frank Herbert'), [(request.pk, 1.0)])
+        request.request_status = 'closed'
+        with self.captureOnCommitCallbacks(execute=True):
+            request.save()
+        self.assertEqual(request_index.match('Dune', 'Frank Herbert'), [])
+
+    def test_index_reloads_after_changes_through_another_worker(self):
+        other_worker = RequestIndex()
+        self.assertEqual(other_worker.match('Dune', 'Frank Herbert'), [])
+        request = self.open_request('Dune', 'Frank Herbert')  # Reaches other_worker only through the cache
+        self.assertEqual(other_worker.match('Dune', 'Frank Herbert'), [(request.pk, 1.0)])
+
+
+@override_settings(LOGIN_THROTTLE={'IP_RATE': 0.01, 'IP_BURST': 4, 'USERNAME_RATE': 0.01, 'USERNAME_BURST': 2,
+                                   'ACCOUNT_RATE': 0.01, 'ACCOUNT_BURST': 3})
+class LoginThrottleTests(TransactionTestCase):
+    """Passwords are checked on the hashing pool's threads, which only see committed users."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user(username='reader')
+        self.user.set_password('correct horse')
+        self.user.save()
+
+    def login(self, password, ip='10.0.0.1'):
+        return APIClient().post('/api/token/', {'username': 'reader', 'password': password}, REMOTE_ADDR=ip)
+
+    def test_failures_lock_out_the_guessing_address_only(self):
+        self.assertEqual([self.login('guess').status_code for _ in range(3)], [401, 401, 429])
+        self.assertEqual(self.login('correct horse').status_code, 429)
+        self.assertEqual(self.login('correct horse', ip='10.0.0.2').status_code, 200)  # The owner elsewhere
+
+    def test_guessing_from_many_addresses_is_limited_per_username(self):
+        statuses = [self.login('guess', ip=f'10.0.1.{n}').status_code for n in range(4)]
+        self.assertEqual(statuses, [401, 401, 401, 429])
+        self.assertEqual(self.login('correct horse', ip='10.0.0.2').status_code, 429)
+
+    def test_attempts_are_limited_per_address(self):
+        statuses = [self.login('correct horse').status_code for _ in range(5)]
+        self.assertEqual(statuses, [200, 200, 200, 200, 429])
+        self.assertEqual(self.login('correct horse', ip='10.0.0.2').status_code, 200)
+
+    def test_deploy_check_reports_a_process_local_cache(self):
+        self.assertEqual([warning.id for warning in check_throttle_cache(None)], ['api.W002'])  # LocMem in tests
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        book_index.reset()
+        self.addCleanup(book_index.reset)
+        self.client = APIClient()
+        self.client.force_authenticate(make_user())
+
+    def search(self, **params):
+        response = self.client.get('/api/v1/books/search/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [book['title'] for book in response.data['results']]
+
+    def test_title_matches_rank_above_author_matches(self):
+        make_book(title='Collected Essays', author='Orwell')
+        make_book(title='Orwell: A Life', author='Taylor')
+        self.assertEqual(self.search(q='orwell'), ['Orwell: A Life', 'Collected Essays'])
+
+    def test_filters(self):
+        make_book(title='Dune', price=Decimal('150.00'), category='scifi')
+        make_book(title='Dune Messiah', price=Decimal('450.00'), category='scifi')
+        make_book(title='Dune Country', price=Decimal('150.00'), category='travel')
+        self.assertEqual(self.search(q='dune', max_price='150', category='scifi'), ['Dune'])
+        self.assertEqual(self.search(q='dune', min_price='450.00'), ['Dune Messiah'])
+        for bad in ('abc', 'NaN', '1e'):
+            response = self.client.get('/api/v1/books/search/', {'q': 'dune', 'max_price': bad})
+            self.assertEqual(response.status_code, 400, bad)
+
+    def test_fallback_filters_before_cutting_candidates(self):
+        for n in range(3):
+            make_book(title=f'Dune {n}', category='scifi')
+        make_book(title='Dune Travels', category='travel')  # Ranked below the exact-title hits
+        with mock.patch.object(connection, 'vendor', 'sqlite'), mock.patch('api.search.MAX_CANDIDATES', 2):
+            books = search_books('dune travels', {'category': 'travel'})
+            self.assertEqual([book.title for book in books], ['Dune Travels'])
+            books = search_books('dune', {'category': 'travel'})
+            self.assertEqual([book.title for book in books], ['Dune Travels'])
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(make_user())
+        self.book, self.other = make_book(), make_book()
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def cache_states(self, *urls):
+        return [self.get(url)['X-Cache'] for url in urls]
+
+    def test_order_invalidates_only_its_book(self):
+        urls = ['/api/v1/books/', f'/api/v1/books/{self.book.pk}/', f'/api/v1/books/{self.other.pk}/']
+        self.cache_states(*urls)
+        place_order(make_user(), self.other.pk, 1)
+        self.assertEqual(self.cache_states(*urls), ['MISS', 'HIT', 'MISS'])
+        self.assertEqual(self.get(urls[2]).data['quantity'], 4)
+
+    def test_saving_hidden_columns_keeps_entries(self):
+        url = f'/api/v1/books/{self.book.pk}/'
+        self.cache_states('/api/v1/books/', url)
+        self.book.cover_phash = 42
+        self.book.save()
+        self.assertEqual(self.cache_states('/api/v1/books/', url), ['HIT', 'HIT'])
+        self.book.title = 'Renamed'
+        self.book.save()
+        self.assertEqual(self.cache_states('/api/v1/books/', url), ['MISS', 'MISS'])
+        self.assertEqual(self.get(url).data['title'], 'Renamed')
+
+    @override_settings(API_RESPONSE_CACHE={'ENABLED': False})
+    def test_cache_can_be_switched_off(self):
+        self.assertNotIn('X-Cache', self.get('/api/v1/books/'))
+        self.assertNotIn('X-Cache', self.get('/api/v1/books/'))
+
+    def test_review_invalidates_its_book(self):
+        urls = [f'/api/v1/books/{self.book.pk}/', f'/api/v1/books/{self.other.pk}/']
+        self.cache_states(*urls)
+        Review.objects.create(user=make_user(), book=self.book, rating=5, comment='Great')
+        self.assertEqual(self.cache_states(*urls), ['MISS', 'HIT'])
+
+    def test_replica_reads_are_cached_briefly(self):
+        url = f'/api/v1/books/{self.book.pk}/'
+        with mock.patch.object(cache, 'set', wraps=cache.set) as store:
+            self.get(url)
+            # Only the cache asks api.cache.router: the view's own queries still go to the test database
+            with mock.patch('api.cache.router') as router:
+                router.db_for_read.return_value = 'replica_1'
+                self.get('/api/v1/books/')
+        self.assertEqual([call.kwargs['timeout'] for call in store.call_args_list], [300, 5])
+
+
+class BookImportTests(TestCase):
+    def cells(self):
+        return set(BookFacetCell.objects.exclude(count=0).values_list(*facets.KEY_FIELDS, 'count'))
+
+    def test_rows_merge_into_existing_books_and_facets_follow(self):
+        seller = make_seller()
+        book = make_book(seller=seller, title='Dune', author='Frank Herbert', quantity=5)
+        make_book(seller=seller)  # Untouched
+        rows = rows_from_list([
+            {'seller': seller.pk, 'title': 'Dune', 'author': 'Frank Herbert', 'category': 'scifi',
+             'price': '250.00', 'condition': 'used', 'quantity': 2},
+            {'seller': seller.pk, 'title': 'Dune', 'author': 'Frank Herbert', 'category': 'scifi',
+             'price': '250.00', 'condition': 'used', 'quantity': 1},
+            {'seller': seller.pk, 'title': 'Emma', 'author': 'Jane Austen', 'category': 'classics',
+             'price': '99.00', 'condition': 'new'},
+            {'seller': seller.pk, 'title': 'No price', 'author': 'Nobody', 'condition': 'bent', 'quantity': -1},
+        ])
+        written = []
+        with mock.patch('api.live.stock_changed') as stock_changed:
+            result = upsert_books(rows, chunk_size=2, on_written=written.append)
+
+        self.assertEqual((result.upserted, result.failed), (3, 1))
+        self.assertEqual(result.errors[0]['row'], 4)
+        rejected = BookImportSerializer(data={'seller': seller.pk, 'title': 'No price', 'author': 'Nobody',
+                                              'condition': 'bent', 'quantity': -1})
+        self.assertFalse(rejected.is_valid())
+        self.assertEqual(result.errors[0]['errors'], rejected.errors)  # Same messages as a full serializer pass
+        book.refresh_from_db()
+        self.assertEqual((book.quantity, book.category, book.price), (8, 'scifi', Decimal('250.00')))
+        emma = Book.objects.get(title='Emma')
+        self.assertEqual(written, [[book.pk], [emma.pk]])  # One call per chunk
+        self.assertEqual([call.args[0] for call in stock_changed.call_args_list],
+                         [[(book.pk, 8, True)], [(emma.pk, 1, True)]])
+
+        cells = self.cells()
+        facets.rebuild()
+        self.assertEqual(cells, self.cells())
+
+
+class TokenAuthenticationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.user = make_user(is_seller=True)
+
+    def authenticate(self, token):
+        request = RequestFactory(HTTP_AUTHORIZATION=f'Bearer {token}').get('/')
+        user, _ = CachedJWTAuthentication().authenticate(request)
+        return user
+
+    def test_claims_build_the_user_without_a_query(self):
+        with self.assertNumQueries(0):
+            user = self.authenticate(tokens_for_user(self.user).access_token)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual((user.username, user.is_seller, user.is_staff, user.is_active),
+                         (self.user.username, True, False, True))
+
+    def test_inactive_users_are_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        with self.assertLogs('rest_framework_simplejwt', 'WARNING'):  # Issuing it is logged
+            token = tokens_for_user(self.user).access_token
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_tokens_without_claims_are_served_from_the_user_cache(self):
+        token = RefreshToken.for_user(self.user).access_token
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(token).email, self.user.email)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate(token).email, self.user.email)
+
+    def test_saving_a_user_drops_the_cached_row(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.authenticate(token)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        jtis = [f'jti-{n}' for n in range(1000)]
+        for jti in jtis:
+            bloom.add(jti)
+        self.assertTrue(all(jti in bloom for jti in jtis))
+        false_positives = sum(f'other-{n}' in bloom for n in range(1000))
+        self.assertLess(false_positives, 50)
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        self.book, self.other = make_book(), make_book()
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def aggregates(self, book):
+        book.refresh_from_db()
+        return book.rating_count, book.rating_avg, ratings.histogram(book)
+
+    def test_review_writes_keep_the_aggregates_current(self):
+        for rating in (5, 3):
+            response = self.client.post('/api/v1/reviews/', {'user': self.user.pk, 'book': self.book.pk,
+                                                            'rating': rating, 'comment': 'Ok'})
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.aggregates(self.book), (2, 4.0, {'1': 0, '2': 0, '3': 1, '4': 0, '5': 1}))
+
+        review_id = response.data['review_id']
+        self.client.patch(f'/api/v1/reviews/{review_id}/', {'book': self.other.pk, 'rating': 1})
+        self.assertEqual(self.aggregates(self.book), (1, 5.0, {'1': 0, '2': 0, '3': 0, '4': 0, '5': 1}))
+        self.assertEqual(self.aggregates(self.other), (1, 1.0, {'1': 1, '2': 0, '3': 0, '4': 0, '5': 0}))
+
+        self.client.delete(f'/api/v1/reviews/{review_id}/')
+        self.assertEqual(self.aggregates(self.other), (0, None, {'1': 0, '2': 0, '3': 0, '4': 0, '5': 0}))
+
+    def test_rebuild_ratings_repairs_drift(self):
+        Review.objects.create(user=make_user(), book=self.book, rating=4, comment='Bypasses the view')
+        with self.assertRaises(CommandError):
+            call_command('rebuild_ratings', '--check', stdout=StringIO())
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.assertEqual(self.aggregates(self.book), (1, 4.0, {'1': 0, '2': 0, '3': 0, '4': 1, '5': 0}))
+        call_command('rebuild_ratings', '--check', stdout=StringIO())
+
+
+class AsyncEndpointTests(TestCase):
+    def setUp(self):
+        self.books = [make_book() for _ in range(3)]
+        token = RefreshToken.for_user(make_user()).access_token
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def test_book_list_pages_like_the_sync_endpoint(self):
+        response = self.client.get('/api/v1/async/books/?page_size=2', **self.headers)
+        self.assertEqual(response.status_code, 200)
+        first = response.json()
+        self.assertEqual([row['book_id'] for row in first['results']], [book.pk for book in self.books[:2]])
+        second = self.client.get(first['next'], **self.headers).json()
+        self.assertEqual([row['book_id'] for row in second['results']], [self.books[2].pk])
+        self.assertIsNone(second['next'])
+
+        synced = APIClient()
+        synced.force_authenticate(make_user())
+        detail = self.client.get(f'/api/v1/async/books/{self.books[0].pk}/', **self.headers).json()
+        self.assertEqual(detail, synced.get(f'/api/v1/books/{self.books[0].pk}/').json())
+
+    def test_requires_a_valid_token(self):
+        self.assertEqual(self.client.get('/api/v1/async/books/').status_code, 401)
+        response = self.client.get('/api/v1/async/books/', HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertEqual(response.status_code, 401)
+
+
+class CoverProcessingTests(TransactionTestCase):
+    """Results are stored from the executor's callback thread, which only sees committed books."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def upload(self, name='book_images/cover.jpg'):
+        """A 400x200 JPEG whose EXIF says to rotate it upright (orientation 6)."""
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Camera Maker'
+        Image.new('RGB', (400, 200), (200, 40, 40)).save(path, 'JPEG', exif=exif)
+        return name
+
+    def test_variants_are_upright_without_metadata_and_stored_once(self):
+        source = os.path.join(self.media_root, self.upload())
+        digest, manifest = process_cover(source, self.media_root, (160, 320))
+        with Image.open(os.path.join(self.media_root, manifest['original'])) as original:
+            self.assertEqual(original.size, (200, 400))
+            self.assertEqual(len(original.getexif()), 0)
+        self.assertEqual(set(manifest['sizes']), {'160', '320'})
+        with Image.open(os.path.join(self.media_root, manifest['sizes']['160']['webp'])) as variant:
+            self.assertEqual(variant.size, (160, 320))
+        self.assertTrue(manifest['placeholder'].startswith('data:image/jpeg;base64,'))
+        self.assertEqual(process_cover(source, self.media_root, (160, 320)), (digest, manifest))
+
+    def test_workers_writing_the_same_file_do_not_collide(self):
+        path = os.path.join(self.media_root, 'original.jpg')
+        image = Image.new('RGB', (8, 8))
+
+        class RacingImage:
+            """Another worker writes the same file while this one is still writing it."""
+            raced = False
+
+            def save(self, fp, fmt, **options):
+                image.save(fp, fmt, **options)
+                if not self.raced:
+                    self.raced = True
+                    image_processing._save(image, path, fmt)
+
+        image_processing._save(RacingImage(), path, 'JPEG')
+        with Image.open(path) as saved:
+            self.assertEqual(saved.size, (8, 8))
+        self.assertEqual(os.listdir(self.media_root), ['original.jpg'])  # No temp file left behind
+
+    def test_book_is_pointed_at_the_processed_cover(self):
+        upload = self.upload()
+        book = Book.objects.filter(pk=make_book().pk)
+        book.update(image=upload)
+        done = Future()
+        done.set_result(process_cover(os.path.join(self.media_root, upload), self.media_root, (160,)))
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(images._store_result, book.get().pk, upload, done).result()
+
+        book = book.get()
+        self.assertEqual(book.image.name, book.image_variants['original'])
+        self.assertFalse(images.needs_processing(book))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, upload)))
+
+
+class SellerAnalyticsTests(TestCase):
+    def setUp(self):
+        self.seller = make_seller()
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller.user)
+        self.book = make_book(self.seller, price=Decimal('100.00'), quantity=10)
+        buyer = make_user()
+        self.orders = [place_order(buyer, self.book.pk, quantity) for quantity in (1, 2, 3)]
+        self.set_status(self.orders[0], 'cancelled')
+        self.set_status(self.orders[1], 'shipped')
+
+    def set_status(self, order, new_status):
+        response = self.client.patch(f'/api/v1/orders/{order.pk}/update_status/', {'status': new_status}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def dashboard(self):
+        response = self.client.get(f'/api/v1/sellers/{self.seller.pk}/analytics/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_rollups_follow_orders_and_match_a_rebuild(self):
+        data = self.dashboard()
+        self.assertEqual((Decimal(data['revenue']), data['units_sold']), (Decimal('500.00'), 5))
+        self.assertEqual(data['orders_by_status'], {'pending': 1, 'shipped': 1, 'delivered': 0, 'cancelled': 1})
+        self.assertEqual(data['top_books'][0]['book_id'], self.book.pk)
+
+        call_command('rebuild_seller_analytics', stdout=StringIO())
+        self.assertEqual(self.dashboard(), data)
+
+    def test_only_the_owner_can_read_it(self):
+        self.client.force_authenticate(make_user())
+        self.assertEqual(self.client.get(f'/api/v1/sellers/{self.seller.pk}/analytics/').status_code, 403)
+
+
+class SeedDataTests(TestCase):
+    counts = {'users': 6, 'sellers': 2, 'books': 8, 'orders': 12, 'reviews': 5, 'requests': 4}
+
+    def seed(self, **options):
+        call_command('seed_data', days=3, prefix='smoke', stdout=StringIO(), **self.counts, **options)
+
+    def seeded(self):
+        books = Book.objects.filter(seller__user__username__startswith='smoke_')
+        return {
+            'users': User.objects.filter(username__startswith='smoke_').count(),
+            'sellers': Seller.objects.filter(user__username__startswith='smoke_').count(),
+            'books': books.count(),
+            'orders': Order.objects.filter(book__in=books).count(),
+            'reviews': Review.objects.filter(book__in=books).count(),
+            'requests': Request.objects.filter(user__username__startswith='smoke_').count(),
+        }
+
+    def test_seeds_the_requested_rows_once(self):
+        self.seed()
+        self.assertEqual(self.seeded(), self.counts)
+        self.assertEqual(SellerDailySales.objects.aggregate(orders=Sum('order_count'))['orders'], 12)
+        titles = sorted(Book.objects.values_list('title', flat=True))
+
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.assertEqual(self.seeded(), self.counts)
+
+        self.seed(clear=True)
+        self.assertEqual(self.seeded(), self.counts)
+        self.assertEqual(sorted(Book.objects.values_list('title', flat=True)), titles)  # Same --seed, same data
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.seller = make_seller()
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller.user)
+        self.book = make_book(self.seller, title='Dune, Part "One"', quantity=10)
+        buyer = make_user()
+        self.orders = [place_order(buyer, self.book.pk) for _ in range(3)]
+        response = self.client.patch(f'/api/v1/orders/{self.orders[0].pk}/update_status/', {'status': 'cancelled'},
+                                     format='json')
+        self.assertEqual(response.status_code, 200)
+        place_order(buyer, make_book().pk)  # Another shop's order
+
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return list(response.streaming_content)
+
+    def test_csv_streams_only_the_sellers_orders(self):
+        with mock.patch('api.exports.FLUSH_BYTES', 1):
+            chunks = self.export('/api/v1/export/orders.csv?status=pending')
+        self.assertEqual(len(chunks), 3)  # Header and one chunk per row
+        rows = list(csv.DictReader(b''.join(chunks).decode().splitlines()))
+        self.assertEqual([int(row['order_id']) for row in rows], [order.pk for order in self.orders[1:]])
+        self.assertEqual({row['book_title'] for row in rows}, {self.book.title})
+
+    def test_ndjson_books(self):
+        lines = b''.join(self.export('/api/v1/export/books.ndjson')).decode().splitlines()
+        self.assertEqual([json.loads(line)['book_id'] for line in lines], [self.book.pk])
+        self.assertEqual(json.loads(lines[0])['price'], '199.00')
+
+    def test_asgi_streams_chunk_by_chunk(self):
+        token = RefreshToken.for_user(self.seller.user).access_token
+
+        async def export():
+            response = await self.async_client.get('/api/v1/export/orders.csv', headers={'Authorization': f'Bearer {token}'})
+            return response.is_async, [chunk async for chunk in response.streaming_content]
+
+        with mock.patch('api.exports.FLUSH_BYTES', 1):
+            is_async, chunks = async_to_sync(export)()
+            self.assertTrue(is_async)  # A sync iterator would be read whole before the first byte goes out
+            self.assertEqual(chunks, self.export('/api/v1/export/orders.csv'))
+
+    def test_other_shops_are_refused(self):
+        other = make_seller()
+        self.assertEqual(self.client.get(f'/api/v1/export/orders.csv?seller={other.pk}').status_code, 403)
+        self.assertEqual(self.client.get('/api/v1/export/orders.xml').status_code, 404)
+
+
+class PerformanceMetricsTests(TestCase):
+    def setUp(self):
+        make_book()
+        self.user = make_user()
+
+    def client_for(self, user):
+        client = APIClient()  # Middleware settings are read when a client's handler loads it
+        client.force_authenticate(user)
+        return client
+
+    def queries_counted(self):
+        return sum(value for (name, method, route), value in metrics.registry.counters.items()
+                   if name == 'db_queries_total' and method == 'GET' and 'books' in route)
+
+    def test_requests_are_timed_and_exposed(self):
+        before = self.queries_counted()
+        response = self.client_for(self.user).get('/api/v1/books/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+, serialize;dur=[\d.]+, render;dur=[\d.]+, '
+                                                    r'total;dur=[\d.]+$')
+        self.assertGreater(self.queries_counted(), before)
+
+        with self.settings(METRICS_TOKEN='secret'):
+            scrape = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(scrape.status_code, 200)
+            self.assertIn('http_request_duration_seconds_bucket{method="GET"', scrape.content.decode())
+            self.assertEqual(self.client.get('/metrics').status_code, 403)  # Even from 127.0.0.1
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer guess').status_code, 403)
+
+    def test_staff_users_scrape_with_their_access_token(self):
+        for user, status in ((self.user, 403), (make_user(is_staff=True), 200)):
+            token = tokens_for_user(user).access_token
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION=f'Bearer {token}')
+            self.assertEqual(response.status_code, status)
+
+    def test_label_values_are_escaped(self):
+        registry = metrics.Registry()
+        registry.record('GET', 'a"b\\c\nd', 200, 0.01, metrics.RequestStats(capture_sql=False), 10)
+        exposition = registry.render()
+        self.assertIn('route="a\\"b\\\\c\\nd"', exposition)
+        self.assertFalse(any(line.startswith('d"') for line in exposition.splitlines()))
+
+    @override_settings(PERF_SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with self.assertLogs('api.performance', 'WARNING') as logs:
+            self.client_for(self.user).get('/api/v1/books/')
+        self.assertIn('SELECT', logs.output[0])
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        override = override_settings(RECOMMENDATIONS={'PATH': root.name, 'RELOAD_SECONDS': 0})
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(recommender.reload)
+        self.books = [make_book() for _ in range(5)]
+
+    def bought(self, user, *books):
+        for book in books:
+            Order.objects.create(user=user, book=book, total_amount=book.price)
+
+    def similarities(self):
+        return {book.pk: {similar: round(score, 5) for similar, score in recommender.similar(book.pk, 10)}
+                for book in self.books}
+
+    def test_incremental_build_matches_a_full_rebuild(self):
+        a, b, c, d, e = self.books
+        self.bought(make_user(), a, b)
+        self.bought(make_user(), a, c)
+        self.bought(make_user(), d, e)
+        self.assertEqual(recommendations.build()['mode'], 'full')
+        self.assertEqual({similar for similar, _ in recommender.similar(a.pk)}, {b.pk, c.pk})
+
+        self.bought(make_user(), b, c)
+        Review.objects.create(user=make_user(), book=c, rating=5, comment='Loved it')
+        Review.objects.create(user=make_user(), book=e, rating=2, comment='No signal')
+        summary = recommendations.build()
+        self.assertEqual((summary['mode'], summary['events'], summary['recomputed']), ('incremental', 3, 3))
+        incremental = self.similarities()
+        self.assertEqual(set(incremental[d.pk]), {e.pk})  # Carried over, not recomputed
+
+        recommendations.build(full=True)
+        self.assertEqual(self.similarities(), incremental)
+
+    def test_similar_endpoint_reads_no_rows(self):
+        a, b = self.books[:2]
+        self.bought(make_user(), a, b)
+        recommendations.build()
+        client = APIClient()
+        client.force_authenticate(make_user())
+        with self.assertNumQueries(0):
+            response = client.get(f'/api/v1/books/{a.pk}/similar/')
+        self.assertEqual(response.json()['results'], [{'book_id': b.pk, 'score': 1.0}])
+
+
+class NearDuplicateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_user())
+        rng = random.Random(0)
+        self.phash = rng.getrandbits(64)
+        self.distances = {}
+        for _ in range(3):
+            for flips in range(14):
+                mask = sum(1 << bit for bit in rng.sample(range(64), flips))
+                book = make_book(**hash_fields(f'{self.phash ^ mask:016x}', '0' * 16))
+                self.distances[book.pk] = flips
+
+    def test_chunk_probes_find_exactly_the_books_in_range(self):
+        for max_distance in (0, 3, 4, 8, 11):
+            found = near_duplicates(self.phash, max_distance=max_distance, limit=100)
+            expected = sorted(pk for pk, distance in self.distances.items() if distance <= max_distance)
+            self.assertEqual(sorted(match['book_id'] for match in found), expected)
+            self.assertEqual([match['phash_distance'] for match in found],
+                             sorted(self.distances[match['book_id']] for match in found))
+        with self.assertRaises(ValueError):
+            near_duplicates(self.phash, max_distance=12)
+
+    def test_book_endpoint(self):
+        book = make_book(**hash_fields(f'{self.phash:016x}', '0' * 16))
+        response = self.client.get(f'/api/v1/books/{book.pk}/near-duplicates/?distance=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({match['book_id'] for match in response.json()['results']},
+                         {pk for pk, distance in self.distances.items() if distance <= 2})
+        unhashed = make_book()
+        self.assertEqual(self.client.get(f'/api/v1/books/{unhashed.pk}/near-duplicates/').status_code, 409)
@@ -0,0 +1,103 @@
+"""
+Attempt limits for the login endpoint.
+
+Each attempt is counted against the client IP. Failed attempts are also
+counted against the (username, IP) pair, so password guessing from one
+address is cut off early; a client elsewhere cannot lock the owner out
+through that pair. Guessing spread over many addresses is caught by a
+username-only count of failures with a looser budget (ACCOUNT_BURST), so
+only such a distributed attack can hold an account shut, and only while it
+keeps failing. Rejected attempts never reach the password hasher.
+
+Counters are fixed windows of `burst` attempts per `burst / rate` seconds,
+updated with the cache's atomic add() and incr(), so attempts racing on
+several workers are all counted. The cache (LOGIN_THROTTLE['CACHE']) must
+be shared between workers, otherwise each worker allows its own quota;
+`manage.py check --deploy` reports a process-local one.
+"""
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from api.cache import is_shared
+
+
+def _config():
+    config = {'CACHE': 'default', 'IP_RATE': 1.0, 'IP_BURST': 20, 'USERNAME_RATE': 0.1, 'USERNAME_BURST': 5,
+              'ACCOUNT_RATE': 0.05, 'ACCOUNT_BURST': 50}
+    config.update(getattr(settings, 'LOGIN_THROTTLE', {}))
+    return config
+
+
+@checks.register(checks.Tags.security, deploy=True)
+def check_throttle_cache(app_configs, **kwargs):
+    alias = _config()['CACHE']
+    if not is_shared(alias):
+        return [checks.Warning(
+            f"The login throttle cache '{alias}' is not shared between workers: each allows its own quota.",
+            hint="Point it at a shared backend, e.g. set REDIS_URL.",
+            id='api.W002',
+        )]
+    return []
+
+
+class AttemptCounter:
+    def __init__(self, key, rate, burst):
+        self.key = f'throttle:{key}'
+        self.burst = burst                          # Attempts per window
+        self.window = max(1, round(burst / rate))   # Seconds, so `rate` attempts per second on average
+
+    def _window_key(self):
+        return f'{self.key}:{int(time.time() // self.window)}'
+
+    def available(self):
+        return caches[_config()['CACHE']].get(self._window_key(), 0) < self.burst
+
+    def take(self):
+        """Count an attempt; returns whether it was within the limit."""
+        cache, key = caches[_config()['CACHE']], self._window_key()
+        cache.add(key, 0, timeout=self.window + 1)
+        try:
+            attempts = cache.incr(key)
+        except ValueError:  # Expired between add() and incr()
+            cache.add(key, 1, timeout=self.window + 1)
+            attempts = 1
+        return attempts <= self.burst
+
+    def wait(self):
+        return self.window - time.time() % self.window
+
+
+class LoginRateThrottle(BaseThrottle):
+    def _counters(self, request):
+        config = _config()
+        ip = self.get_ident(request)
+        ip_counter = AttemptCounter(f'login:ip:{ip}', config['IP_RATE'], config['IP_BURST'])
+        username = str(request.data.get('username', '')).lower()
+        user_counter = AttemptCounter(f'login:user:{username}:{ip}', config['USERNAME_RATE'], config['USERNAME_BURST'])
+        account_counter = AttemptCounter(f'login:account:{username}', config['ACCOUNT_RATE'], config['ACCOUNT_BURST'])
+        return ip_counter, user_counter, account_counter
+
+    def allow_request(self, request, view):
+        ip_counter, user_counter, account_counter = self._counters(request)
+        self._wait = 0.0
+        for counter in (user_counter, account_counter):
+            if not counter.available():
+                self._wait = counter.wait()
+                return False
+        if not ip_counter.take():
+            self._wait = ip_counter.wait()
+            return False
+        return True
+
+    def wait(self):
+        return self._wait
+
+    def record_failure(self, request):
+        """Charge a failed login to the username, for this IP and overall."""
+        _, user_counter, account_counter = self._counters(request)
+        user_counter.take()
+        account_counter.take()
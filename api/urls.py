@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.urls import path,include
-from api.views import BookViewSet,UsersViewSet,RegisterUserViewSet,SellerViewSet,OrderViewSet,ReviewViewSet,RequestViewSet,GetSellersByUserID,SetSellerStatusView
+from api.views import BookViewSet,UsersViewSet,RegisterUserViewSet,SellerViewSet,OrderViewSet,ReviewViewSet,RequestViewSet,GetSellersByUserID,SetSellerStatusView,SellerAnalyticsView,OrderExportView,BookExportView
 from rest_framework import routers
+from api import async_views
 
 router = routers.DefaultRouter()
 router.register(r"books",BookViewSet)
@@ -19,6 +20,18 @@ urlpatterns = [
     path("",include(router.urls)),
     path("sellers/<int:user_id>/", GetSellersByUserID.as_view(), name="get_sellers_by_user"),
     path("set-seller/", SetSellerStatusView.as_view(), name="set_seller"),
+    path("sellers/<int:seller_id>/analytics/", SellerAnalyticsView.as_view(), name="seller_analytics"),
+    path("export/orders.<str:fmt>", OrderExportView.as_view(), name="export_orders"),
+    path("export/books.<str:fmt>", BookExportView.as_view(), name="export_books"),
+
+    # ASGI-native read paths (serve with uvicorn/daphne)
+    path("async/books/", async_views.book_list, name="async_book_list"),
+    path("async/books/search/", async_views.book_search, name="async_book_search"),
+    path("async/books/<int:book_id>/", async_views.book_detail, name="async_book_detail"),
+    path("async/books/<int:book_id>/reviews/", async_views.book_reviews, name="async_book_reviews"),
+    path("async/sellers/<int:user_id>/", async_views.sellers_by_user, name="async_sellers_by_user"),
+    path("async/orders/events/", async_views.order_events, name="async_order_events"),
+    path("async/books/events/", async_views.book_events, name="async_book_events"),
 
 
        
@@ -1,3 +1,6 @@
+import io
+
+from PIL import Image, ImageOps
 from django.shortcuts import render
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -6,6 +9,16 @@ from rest_framework import status
 from rest_framework import viewsets,permissions
 from api.models import Book,User,Seller,Order,Review,Request
 from api.serializers import BookSerializer,UserSerializer,SellerSerializer,OrderSerializer,ReviewSerializer,RequestSerializer
+from api.mixins import OptimizedQuerysetMixin
+from api.pagination import KeysetPagination
+from api.search import search_books
+from api import analytics, duplicates, exports, matching, orders, ratings
+from api.facets import facet_counts
+from api.image_processing import perceptual_hashes
+from api.inventory import OutOfStock
+from api.recommendations import recommender
+from api.cache import cache_response
+from api.importers import detect_format, read_rows, rows_from_list, upsert_books
 from rest_framework.permissions import (
     IsAuthenticated,
     IsAdminUser,
@@ -13,18 +26,141 @@ from rest_framework.permissions import (
 )
 
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from api.authentication import tokens_for_user
+from api.login import LoginBusy, verify_credentials
+from api.throttling import LoginRateThrottle
 from rest_framework.views import APIView
-from django.contrib.auth import authenticate
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils.dateparse import parse_date
 
 
 from rest_framework import status   
 # Create your views here.
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination  # Paginated by book_id
+    replica_reads = True  # Safe requests read from DATABASE_REPLICAS
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('update', 'partial_update'):
+            # Locked until the update commits, so the facet and cache snapshots match the stored row
+            queryset = queryset.select_for_update(of=('self',))
+        return queryset
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    @cache_response('books')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response('books', detail=True)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=False, methods=['get'])
+    @cache_response('books')
+    def search(self, request):
+        """Ranked search over title/author/category, e.g. ?q=harry pot&max_price=500"""
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response({"error": "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = min(max(int(request.query_params.get("limit", 20)), 1), 100)
+            books = search_books(query, request.query_params, limit=limit)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(books, many=True)
+        return Response({"query": query, "count": len(books), "results": serializer.data})
+
+    @action(detail=False, methods=['get'])
+    @cache_response('books')
+    def facets(self, request):
+        """Counts per category/condition/rental/availability/price bucket, e.g. ?category=fiction,poetry&price=0-100"""
+        try:
+            return Response(facet_counts(request.query_params))
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """'Customers also bought': top-k from the memory-mapped similarity arrays, no database query"""
+        try:
+            book_id = int(pk)
+            limit = min(max(int(request.query_params.get("limit", 10)), 1), 50)
+        except ValueError:
+            return Response({"error": "Book id and limit must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        results = [{"book_id": similar_id, "score": round(score, 4)}
+                   for similar_id, score in recommender.similar(book_id, limit)]
+        return Response({"book_id": book_id, "results": results})
+
+    @action(detail=True, methods=['get'], url_path='near-duplicates')
+    def near_duplicates(self, request, pk=None):
+        """Listings from any seller whose cover looks like this book's, e.g. ?distance=8"""
+        book = self.get_object()
+        if book.cover_phash is None:
+            return Response({"error": "This book's cover has not been hashed yet."}, status=status.HTTP_409_CONFLICT)
+        try:
+            results = duplicates.near_duplicates(book.cover_phash, book.cover_dhash, cover_distance(request),
+                                                 exclude_book_id=book.pk)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"book_id": book.pk, "count": len(results), "results": results})
+
+    @action(detail=False, methods=['post'], url_path='near-duplicates')
+    def cover_lookup(self, request):
+        """Visual lookup: listings whose cover looks like the uploaded `image`"""
+        upload = request.FILES.get("image")
+        if upload is None:
+            return Response({"error": "Upload the cover as 'image'."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with Image.open(upload) as image:
+                hashes = perceptual_hashes(ImageOps.exif_transpose(image))
+        except (OSError, Image.DecompressionBombError):
+            return Response({"error": "Not a readable image."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            results = duplicates.near_duplicates(int(hashes["phash"], 16), int(hashes["dhash"], 16),
+                                                 cover_distance(request))
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({**hashes, "count": len(results), "results": results})
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create or restock many books at once, from a JSON list or an uploaded
+        CSV/JSONL `file`. Existing (seller, title, author) rows get their
+        quantity increased.
+        """
+        upload = request.FILES.get("file")
+        if upload is not None:
+            fmt = request.data.get("format") or detect_format(upload.name)
+            rows = read_rows(io.TextIOWrapper(upload.file, encoding="utf-8", newline=""), fmt)
+        elif isinstance(request.data, list):
+            rows = rows_from_list(request.data)
+        else:
+            return Response({"error": "Send a JSON list of books or a CSV/JSONL 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        allowed_sellers = None
+        if not request.user.is_staff:
+            allowed_sellers = set(request.user.sellers.values_list("seller_id", flat=True))
+
+        index = matching.RequestIndex()  # Shared by the chunks' rematch() calls
+        try:
+            result = upsert_books(rows, allowed_sellers=allowed_sellers,
+                                  on_written=lambda book_ids: matching.rematch(book_ids, index=index))
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"upserted": result.upserted, "failed": result.failed, "errors": result.errors})
     
 class UsersViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
@@ -40,7 +176,7 @@ class RegisterUserViewSet(viewsets.ModelViewSet):
             return [AllowAny()]  # Allow anyone to register
         return [IsAdminUser()]  # Only admin can view all users
     
-class SellerViewSet(viewsets.ModelViewSet):
+class SellerViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
     serializer_class = SellerSerializer
     permission_classes = [IsAuthenticated]  # Only logged-in users can access
     queryset = Seller.objects.all()
@@ -49,10 +185,35 @@ class SellerViewSet(viewsets.ModelViewSet):
         """Assign the logged-in user to the seller"""
         serializer.save(user=self.request.user)
         
-class OrderViewSet(viewsets.ModelViewSet):
+BULK_STATUS_MAX_ORDERS = 1000
+
+
+class OrderViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]  # Only authenticated users can access
+    pagination_class = KeysetPagination  # Paginated by order_id
+
+    def get_queryset(self):
+        """?start=&end= (YYYY-MM-DD) filter on order_date, so postgres only scans those months' partitions"""
+        queryset = super().get_queryset()
+        try:
+            start, end = date_range_params(self.request)
+        except ValueError:
+            raise ValidationError({"error": "start and end must be YYYY-MM-DD dates, start <= end."})
+        lower, upper = exports.day_bounds(start, end)
+        if lower:
+            queryset = queryset.filter(order_date__gte=lower)
+        if upper:
+            queryset = queryset.filter(order_date__lt=upper)
+        if self.action in ('update', 'partial_update'):
+            # Locked until the update commits: validation and the stock release see the current status
+            queryset = queryset.select_for_update(of=('self',))
+        return queryset
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
 
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
@@ -61,31 +222,107 @@ class OrderViewSet(viewsets.ModelViewSet):
             order = self.get_object()
             new_status = request.data.get("status")
 
-            if new_status not in ['pending', 'shipped', 'delivered', 'cancelled']:
+            if new_status not in orders.TRANSITIONS:
                 return Response({"error": "Invalid status value."}, status=status.HTTP_400_BAD_REQUEST)
 
+            # Row-locked conditional UPDATE, so two concurrent cancellations cannot both restock
+            outcome, old_status = orders.bulk_transition([order.pk], new_status, actor=request.user)[order.pk]
+            if outcome == "invalid":
+                return Response({"error": f"Cannot change an order from {old_status} to {new_status}."},
+                                status=status.HTTP_409_CONFLICT)
+            if outcome == "not_found":
+                raise Order.DoesNotExist
             order.status = new_status
-            order.save()
             return Response({"message": "Status updated successfully.", "order": OrderSerializer(order).data})
         except Order.DoesNotExist:
             return Response({"error": "Order not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    @action(detail=False, methods=['post'], url_path='bulk-status')
+    def bulk_status(self, request):
+        """
+        Move many orders to one status: {"order_ids": [...], "status": "shipped"}.
+        Sellers may change their own shops' orders, staff any order.
+        """
+        order_ids = request.data.get("order_ids")
+        new_status = request.data.get("status")
+        if new_status not in orders.TRANSITIONS:
+            return Response({"error": "Invalid status value."}, status=status.HTTP_400_BAD_REQUEST)
+        if (not isinstance(order_ids, list) or not order_ids or len(order_ids) > BULK_STATUS_MAX_ORDERS
+                or not all(isinstance(order_id, int) and not isinstance(order_id, bool) for order_id in order_ids)):
+            return Response({"error": f"order_ids must be a list of 1 to {BULK_STATUS_MAX_ORDERS} order ids."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        scope = Order.objects.all()
+        if not request.user.is_staff:
+            scope = scope.filter(book__seller__user=request.user)
+        outcomes = orders.bulk_transition(list(dict.fromkeys(order_ids)), new_status, actor=request.user,
+                                          queryset=scope)
+        results = [
+            {"order_id": order_id, "result": outcome, "previous_status": previous}
+            for order_id, (outcome, previous) in outcomes.items()
+        ]
+        return Response({
+            "status": new_status,
+            "updated": sum(1 for result in results if result["result"] == "updated"),
+            "results": results,
+        })
+
     def perform_create(self, serializer):
-        """Automatically assign the logged-in user to the order"""
-        serializer.save(user=self.request.user)
+        """Reserve stock and assign the logged-in user to the order"""
+        book = serializer.validated_data["book"]
+        quantity = serializer.validated_data.get("quantity", 1)
+        try:
+            orders.place_order(self.request.user, book.pk, quantity, save=serializer.save)
+        except OutOfStock as exc:
+            raise ValidationError({"book": str(exc)})
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old_status = serializer.instance.status  # Read under the row lock taken by get_object()
+        order = serializer.save()
+        orders.status_changed(order, old_status, actor=self.request.user)
+
+    def perform_destroy(self, instance):
+        """Release the order's copies and drop it from the seller rollups"""
+        orders.delete_order(instance.pk, actor=self.request.user)
         
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows reviews to be viewed, created, updated, and deleted.
     """
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]  # Allow only authenticated users to create reviews
+    pagination_class = KeysetPagination  # Paginated by review_id
+    replica_reads = True
 
+    @cache_response('reviews')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response('reviews', detail=True)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @transaction.atomic
     def perform_create(self, serializer):
         """Ensure the review is associated with the currently logged-in user."""
-        serializer.save(user=self.request.user)
+        review = serializer.save(user=self.request.user)
+        ratings.review_added(review)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        """Move the review's rating between the book aggregates if it changed."""
+        old_book_id, old_rating = serializer.instance.book_id, serializer.instance.rating
+        review = serializer.save()
+        ratings.review_changed(old_book_id, old_rating, review)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        ratings.review_removed(instance)
+        instance.delete()
 
-class RequestViewSet(viewsets.ModelViewSet):
+class RequestViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows users to create, update, view, and delete book requests.
     """
@@ -98,13 +335,19 @@ class RequestViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 class CustomJWTLoginView(APIView):
+    throttle_classes = [LoginRateThrottle]  # Rejected before any password hashing
+
     def post(self, request):
         username = request.data.get("username")
         password = request.data.get("password")
 
-        user = authenticate(username=username, password=password)
+        try:
+            user = verify_credentials(username, password)  # Runs on the bounded hashing pool
+        except LoginBusy as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "1"})
+
         if user is not None:
-            refresh = RefreshToken.for_user(user)
+            refresh = tokens_for_user(user)  # Carries username/is_seller/is_staff claims
             return Response({
                 'refresh': str(refresh),
                 'access': str(refresh.access_token),
@@ -116,10 +359,14 @@ class CustomJWTLoginView(APIView):
                 'is_seller': user.is_seller 
                 
             })
+        LoginRateThrottle().record_failure(request)
         return Response({"error": "Invalid Credentials"}, status=status.HTTP_401_UNAUTHORIZED)
 
 
 class GetSellersByUserID(APIView):
+    replica_reads = True
+
+    @cache_response('sellers')
     def get(self, request, user_id):
         sellers = Seller.objects.filter(user__id=user_id)
         
@@ -128,6 +375,101 @@ class GetSellersByUserID(APIView):
         
         return Response(SellerSerializer(sellers, many=True).data, status=status.HTTP_200_OK)
 
+class SellerAnalyticsView(APIView):
+    """Sales dashboard for one seller, read from the daily rollups"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, seller_id):
+        try:
+            seller = Seller.objects.get(pk=seller_id)
+        except Seller.DoesNotExist:
+            return Response({"error": "Seller not found."}, status=status.HTTP_404_NOT_FOUND)
+        if seller.user_id != request.user.id and not request.user.is_staff:
+            return Response({"error": "You can only view your own shop's analytics."}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            start, end = date_range_params(request)
+        except ValueError:
+            return Response({"error": "start and end must be YYYY-MM-DD dates, start <= end."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(analytics.dashboard(seller.pk, start, end))
+
+
+def cover_distance(request):
+    """?distance= hamming radius for cover lookups. Raises ValueError if invalid."""
+    try:
+        return int(request.query_params.get("distance", 8))
+    except ValueError:
+        raise ValueError("distance must be an integer.")
+
+
+def date_range_params(request):
+    """Optional ?start=&end= dates (YYYY-MM-DD). Raises ValueError if invalid."""
+    dates = []
+    for name in ("start", "end"):
+        value = request.query_params.get(name)
+        parsed = parse_date(value) if value is not None else None  # Raises ValueError for impossible dates
+        if value is not None and parsed is None:
+            raise ValueError(name)
+        dates.append(parsed)
+    start, end = dates
+    if start and end and start > end:
+        raise ValueError("start")
+    return start, end
+
+
+def export_seller_ids(request):
+    """Sellers whose data the user may export: any for staff, else their own shops."""
+    requested = request.query_params.get("seller")
+    if requested is not None:
+        try:
+            requested = int(requested)
+        except ValueError:
+            raise ValidationError({"seller": "Must be a seller id."})
+    if request.user.is_staff:
+        return [requested] if requested is not None else None
+
+    own = list(request.user.sellers.values_list("seller_id", flat=True))
+    if requested is not None:
+        if requested not in own:
+            raise PermissionDenied("You can only export your own shop's data.")
+        return [requested]
+    return own
+
+
+class OrderExportView(APIView):
+    """Stream orders as /export/orders.csv or .ndjson, filtered by ?seller=&start=&end=&status="""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, fmt):
+        if fmt not in exports.FORMATS:
+            return Response({"error": "Format must be csv or ndjson."}, status=status.HTTP_404_NOT_FOUND)
+        order_status = request.query_params.get("status")
+        if order_status and order_status not in dict(Order.STATUS_CHOICES):
+            return Response({"error": "Invalid status value."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            start, end = date_range_params(request)
+        except ValueError:
+            return Response({"error": "start and end must be YYYY-MM-DD dates, start <= end."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return exports.export_orders(fmt, is_async=exports.served_by_asgi(request), seller_ids=export_seller_ids(request),
+                                     start=start, end=end, status=order_status)
+
+
+class BookExportView(APIView):
+    """Stream books as /export/books.csv or .ndjson, filtered by ?seller=&availability_status="""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, fmt):
+        if fmt not in exports.FORMATS:
+            return Response({"error": "Format must be csv or ndjson."}, status=status.HTTP_404_NOT_FOUND)
+        availability = request.query_params.get("availability_status")
+        if availability is not None:
+            availability = availability.lower() in ("true", "1", "yes")
+
+        return exports.export_books(fmt, seller_ids=export_seller_ids(request), availability_status=availability,
+                                    is_async=exports.served_by_asgi(request))
+
 User = get_user_model()
 
 class SetSellerStatusView(APIView):
@@ -136,6 +478,6 @@ class SetSellerStatusView(APIView):
     def post(self, request):
         user = request.user  # Get the logged-in user
         user.is_seller = True  # Set `is_seller` to True
-        user.save()  # Save the change
+        user.save(update_fields=["is_seller"])  # Save only the change
 
         return Response({"message": "User is now a seller", "is_seller": user.is_seller}, status=status.HTTP_200_OK)
\ No newline at end of file
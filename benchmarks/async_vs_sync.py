@@ -0,0 +1,124 @@
+"""
+Compare the sync (WSGI) and async (ASGI) book list endpoints under load.
+
+Start the project twice, once per server type, with the response cache off:
+the async views have none, so a cached sync list would be compared with
+uncached async queries. E.g.
+
+    API_RESPONSE_CACHE_ENABLED=0 gunicorn bookHub.wsgi -w 1 --threads 8 -b 127.0.0.1:8000
+    API_RESPONSE_CACHE_ENABLED=0 uvicorn bookHub.asgi:application --workers 1 --port 8001
+
+then run
+
+    python benchmarks/async_vs_sync.py --token <access token> \\
+        --sync-url http://127.0.0.1:8000/api/v1/books/ \\
+        --async-url http://127.0.0.1:8001/api/v1/async/books/ \\
+        --concurrency 500 --requests 5000
+
+Each client opens a fresh connection per request; `--client-delay` makes it
+sleep between connecting and sending the request, simulating slow clients
+that hold a connection without doing work. Results are printed as JSON.
+The run stops early if a server answers with the response cache's X-Cache
+header.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def fetch(url, headers, client_delay, response_headers=None):
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    try:
+        if client_delay:
+            await asyncio.sleep(client_delay)
+        lines = [f"GET {path} HTTP/1.1", f"Host: {parts.netloc}", "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        head, _, _ = (await reader.read()).partition(b"\r\n\r\n")
+        if response_headers is not None:
+            for line in head.decode("latin-1").split("\r\n"):
+                name, _, value = line.partition(":")
+                response_headers[name.strip().lower()] = value.strip()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def run(url, headers, total, concurrency, client_delay):
+    latencies, statuses = [], {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                status = await fetch(url, headers, client_delay)
+            except OSError:
+                status = 'error'
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "url": url,
+        "requests": total,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1),
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 2),
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+        },
+        "statuses": {str(key): value for key, value in statuses.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sync-url', required=True)
+    parser.add_argument('--async-url', required=True)
+    parser.add_argument('--token', help="JWT access token for authenticated endpoints.")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--client-delay', type=float, default=0.0, help="Seconds each client idles before sending.")
+    args = parser.parse_args()
+
+    headers = {"Accept": "application/json"}
+    if args.token:
+        headers["Authorization"] = f"Bearer {args.token}"
+
+    for url in (args.sync_url, args.async_url):
+        response_headers = {}
+        asyncio.run(fetch(url, headers, 0, response_headers))
+        if "x-cache" in response_headers:
+            parser.error(f"{url} is served from the response cache; restart it with API_RESPONSE_CACHE_ENABLED=0.")
+
+    report = {}
+    for name, url in (("sync_wsgi", args.sync_url), ("async_asgi", args.async_url)):
+        report[name] = asyncio.run(run(url, headers, args.requests, args.concurrency, args.client_delay))
+    report["speedup"] = round(report["async_asgi"]["throughput_rps"] / report["sync_wsgi"]["throughput_rps"], 2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Measure bulk import throughput: row validation alone, then the full upsert.
+
+    python benchmarks/import_bench.py --rows 20000 --chunk-size 1000
+
+Validation compares one BookImportSerializer(data=row) per row (how the
+importer used to validate) with the serializer's fields built once and
+reused for every row (api.importers.validate_row). No database is needed
+for that part.
+
+The upsert part streams the same rows through upsert_books() into the
+configured database for a scratch seller, inside a transaction that is
+rolled back, and reports rows per second. Skip it with --no-upsert.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bookHub.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import transaction  # noqa: E402
+
+from api.importers import BookImportSerializer, row_fields, rows_from_list, upsert_books, validate_row  # noqa: E402
+from api.models import Seller, User  # noqa: E402
+
+
+def make_rows(count, seller_id):
+    # CSV rows arrive as strings, so coercion is part of the cost
+    return [
+        {'seller': str(seller_id), 'title': f'Bench book {i}', 'author': f'Author {i % 500}',
+         'category': ('fiction', 'scifi', 'classics')[i % 3], 'price': f'{100 + i % 400}.00',
+         'availability_status': 'true', 'rental_option': 'false', 'condition': ('new', 'used')[i % 2],
+         'quantity': str(1 + i % 5)}
+        for i in range(count)
+    ]
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return time.perf_counter() - started, result
+
+
+def per_row_serializer(rows):
+    valid = 0
+    for data in rows:
+        valid += BookImportSerializer(data=data).is_valid()
+    return valid
+
+
+def shared_fields(rows):
+    fields, valid = row_fields(), 0
+    for data in rows:
+        valid += not validate_row(fields, data)[1]
+    return valid
+
+
+def upsert(rows, chunk_size):
+    with transaction.atomic():
+        user = User.objects.create(username='import-bench', email='import-bench@example.com', password='!')
+        seller = Seller.objects.create(user=user, shop_name='Import bench', gstin='IMPORTBENCH0001')
+        for data in rows:
+            data['seller'] = str(seller.pk)
+        seconds, result = timed(lambda: upsert_books(rows_from_list(rows), chunk_size=chunk_size))
+        transaction.set_rollback(True)
+    return seconds, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--no-upsert', action='store_true', help="Only measure validation.")
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows, seller_id=1)
+    scale = 1000 / args.rows
+    report = {'validate_ms_per_1000_rows': {}}
+    for name, case in (('serializer_per_row', per_row_serializer), ('shared_fields', shared_fields)):
+        seconds, valid = timed(lambda: case(rows))
+        assert valid == args.rows
+        report['validate_ms_per_1000_rows'][name] = round(seconds * 1000 * scale, 2)
+
+    if not args.no_upsert:
+        seconds, result = upsert(rows, args.chunk_size)
+        assert result.upserted == args.rows, result.errors[:5]
+        report['upsert'] = {'rows': args.rows, 'seconds': round(seconds, 2),
+                            'rows_per_sec': round(args.rows / seconds)}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+"""
+Scripted load test for the bookHub API.
+
+Seed data and write a manifest first, then point the load test at a running
+server:
+
+    python manage.py seed_data --clear --manifest bench.json
+    python benchmarks/load_test.py run --manifest bench.json \\
+        --base-url http://127.0.0.1:8000 --clients 32 --seconds 60 --output after.json
+
+Every client logs in once before the clock starts, then repeatedly picks a
+scenario by weight (see --mix): browse catalogue, login, place order, post
+review, seller restock. The report gives throughput and p50/p95/p99 latency
+per endpoint as JSON.
+
+All clients come from one IP, so they share the login throttle's IP bucket
+(LOGIN_THROTTLE, by default 20 attempts per 20 seconds). The initial logins
+of buyers and sellers wait out 429s: about 20 seconds per 20 further clients.
+The timed login scenario is not retried: run the server with e.g.
+LOGIN_THROTTLE = {'IP_RATE': 1000, 'IP_BURST': 1000} or the login endpoint
+measures 429s, or leave it out with --mix browse=75,order=10,review=10,restock=5.
+
+Compare two runs; exits non-zero when an endpoint's p95 grows, or its
+throughput drops, by more than --threshold percent:
+
+    python benchmarks/load_test.py compare before.json after.json --threshold 10
+
+The random scenario choices come from --seed, so runs over the same manifest
+issue the same sequence of requests per client.
+"""
+import argparse
+import http.client
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+DEFAULT_MIX = 'browse=70,login=5,order=10,review=10,restock=5'
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def add(self, endpoint, seconds, status):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values.sort()
+            statuses = self.statuses[endpoint]
+            endpoints[endpoint] = {
+                'requests': len(values),
+                'errors': sum(count for status, count in statuses.items() if status == 'error' or status >= 400),
+                'throughput_rps': round(len(values) / elapsed, 2),
+                'latency_ms': {
+                    'mean': round(statistics.fmean(values) * 1000, 2),
+                    'p50': round(percentile(values, 0.50) * 1000, 2),
+                    'p95': round(percentile(values, 0.95) * 1000, 2),
+                    'p99': round(percentile(values, 0.99) * 1000, 2),
+                },
+                'statuses': {str(status): count for status, count in statuses.items()},
+            }
+        total = sum(len(values) for values in self.latencies.values())
+        return {'seconds': round(elapsed, 3), 'requests': total,
+                'throughput_rps': round(total / elapsed, 2), 'endpoints': endpoints}
+
+
+class Client:
+    """One simulated user on one keep-alive connection."""
+
+    def __init__(self, base_url, manifest, recorder, rng):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=30)
+        self.manifest = manifest
+        self.recorder = recorder
+        self.rng = rng
+        self.token = None
+        self.seller_token = None
+        self.buyer = rng.choice(manifest['buyers'])
+        self.seller = rng.choice(manifest['sellers']) if manifest['sellers'] else None
+
+    def call(self, method, path, endpoint, body=None, token=None, query=None):
+        """Send one request, recorded under `endpoint` unless it is None."""
+        headers = {'Accept': 'application/json'}
+        token = self.token if token is None else token  # '' sends no credentials
+        if token:
+            headers['Authorization'] = f"Bearer {token}"
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        url = path + (f'?{urlencode(query)}' if query else '')
+
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, url, body=body, headers=headers)
+            response = self.connection.getresponse()
+            payload = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()  # Reconnects on the next request
+            payload, status = b'', 'error'
+        if endpoint is not None:
+            self.recorder.add(f'{method} {endpoint}', time.perf_counter() - started, status)
+        if status == 'error' or status >= 400 or not payload:
+            return status, None
+        return status, json.loads(payload)
+
+    def login(self, username=None, endpoint='/api/token/'):
+        username = username or self.buyer['username']
+        status, data = self.call('POST', '/api/token/', endpoint,
+                                 {'username': username, 'password': self.manifest['password']}, token='')
+        return data['access'] if data else None
+
+    def first_login(self, username=None, timeout=300):
+        """Unrecorded login before the run, waiting out the login throttle."""
+        give_up = time.perf_counter() + timeout
+        while time.perf_counter() < give_up:
+            token = self.login(username, endpoint=None)
+            if token:
+                return token
+            time.sleep(1)
+        raise SystemExit("Could not log in; is the server up and the manifest current?")
+
+    # Scenarios
+
+    def browse(self):
+        # The book list takes no filters: a category is browsed through facets and search
+        category = self.rng.choice(self.manifest['categories'])
+        self.call('GET', '/api/v1/books/', '/api/v1/books/')
+        self.call('GET', '/api/v1/books/facets/', '/api/v1/books/facets/', query={'category': category})
+        self.call('GET', '/api/v1/books/search/', '/api/v1/books/search/',
+                  query={'q': self.rng.choice(self.manifest['search_terms']), 'category': category})
+        book_id = self.rng.choice(self.manifest['book_ids'])
+        self.call('GET', f'/api/v1/books/{book_id}/', '/api/v1/books/{id}/')
+        self.call('GET', f'/api/v1/async/books/{book_id}/reviews/', '/api/v1/async/books/{id}/reviews/')
+
+    def login_scenario(self):
+        self.login()
+
+    def order(self):
+        self.call('POST', '/api/v1/orders/', '/api/v1/orders/', {
+            'user': self.buyer['user_id'], 'book': self.rng.choice(self.manifest['book_ids']), 'quantity': 1,
+        })
+
+    def review(self):
+        self.call('POST', '/api/v1/reviews/', '/api/v1/reviews/', {
+            'user': self.buyer['user_id'], 'book': self.rng.choice(self.manifest['book_ids']),
+            'rating': self.rng.randint(1, 5), 'comment': 'Load test review',
+        })
+
+    def restock(self):
+        if self.seller is None:
+            return
+        listing = self.rng.choice(self.seller['listings'])
+        # Same (seller, title, author) as an existing listing: BookSerializer.create() restocks it
+        self.call('POST', '/api/v1/books/', '/api/v1/books/ (restock)', {
+            'seller': self.seller['seller_id'], 'title': listing['title'], 'author': listing['author'],
+            'category': listing['category'], 'price': listing['price'], 'condition': listing['condition'],
+            'quantity': self.rng.randint(1, 5),
+        }, token=self.seller_token)
+
+
+SCENARIOS = {
+    'browse': Client.browse,
+    'login': Client.login_scenario,
+    'order': Client.order,
+    'review': Client.review,
+    'restock': Client.restock,
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}.")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def run(args):
+    with open(args.manifest) as handle:
+        manifest = json.load(handle)
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    recorder = Recorder()
+
+    clients = []
+    for index in range(args.clients):
+        rng = random.Random(args.seed * 100003 + index)
+        client = Client(args.base_url, manifest, recorder, rng)
+        client.token = client.first_login()
+        if client.seller is not None and mix.get('restock'):
+            client.seller_token = client.first_login(client.seller['username'])
+        clients.append(client)
+    deadline = time.perf_counter() + args.seconds
+
+    def worker(client):
+        rng = client.rng
+        iterations = 0
+        while time.perf_counter() < deadline and (not args.iterations or iterations < args.iterations):
+            SCENARIOS[rng.choices(names, weights)[0]](client)
+            iterations += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    report = recorder.report(time.perf_counter() - started)
+    report['config'] = {'base_url': args.base_url, 'clients': args.clients, 'seconds': args.seconds,
+                        'iterations': args.iterations, 'mix': mix, 'seed': args.seed}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output)
+    print(output)
+
+
+def compare(args):
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)['endpoints']
+    with open(args.candidate) as handle:
+        candidate = json.load(handle)['endpoints']
+
+    def change(before, after):
+        return round((after - before) / before * 100, 1) if before else None
+
+    endpoints, regressions = {}, []
+    for endpoint in sorted(baseline.keys() | candidate.keys()):
+        if endpoint not in baseline or endpoint not in candidate:
+            endpoints[endpoint] = {'only_in': 'baseline' if endpoint in baseline else 'candidate'}
+            continue
+        before, after = baseline[endpoint], candidate[endpoint]
+        row = {
+            f'{name}_change_pct': change(before['latency_ms'][name], after['latency_ms'][name])
+            for name in ('p50', 'p95', 'p99')
+        }
+        row['throughput_change_pct'] = change(before['throughput_rps'], after['throughput_rps'])
+        row['p95_ms'] = [before['latency_ms']['p95'], after['latency_ms']['p95']]
+        row['throughput_rps'] = [before['throughput_rps'], after['throughput_rps']]
+        if (row['p95_change_pct'] or 0) > args.threshold or (row['throughput_change_pct'] or 0) < -args.threshold:
+            regressions.append(endpoint)
+        endpoints[endpoint] = row
+
+    print(json.dumps({'threshold_pct': args.threshold, 'regressions': regressions, 'endpoints': endpoints}, indent=2))
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Run the load scenarios against a server.")
+    run_parser.add_argument('--manifest', required=True, help="Written by `manage.py seed_data --manifest`.")
+    run_parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    run_parser.add_argument('--clients', type=int, default=16)
+    run_parser.add_argument('--seconds', type=float, default=30.0)
+    run_parser.add_argument('--iterations', type=int, default=0, help="Stop each client after N scenarios (0: no cap).")
+    run_parser.add_argument('--mix', default=DEFAULT_MIX, help="Scenario weights, e.g. browse=70,order=10.")
+    run_parser.add_argument('--seed', type=int, default=1)
+    run_parser.add_argument('--output', help="Also write the JSON report here.")
+
+    compare_parser = commands.add_parser('compare', help="Compare two run reports.")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help="Allowed regression in percent.")
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == '__main__':
+    main()
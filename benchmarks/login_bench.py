@@ -0,0 +1,68 @@
+"""
+Measure password verifications per second per core for each login hasher.
+
+    python benchmarks/login_bench.py --seconds 5 --threads 4
+
+Compares Django's default PBKDF2 against the tuned Argon2 hasher now listed
+first in PASSWORD_HASHERS. A login's cost is dominated by check_password,
+so logins/sec per core is approximately verifications/sec on one thread.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bookHub.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.hashers import check_password, get_hasher  # noqa: E402
+
+HASHERS = {
+    'pbkdf2_sha256 (before)': 'pbkdf2_sha256',
+    'argon2 tuned (after)': 'argon2',
+}
+
+
+def verifications_per_second(encoded, seconds, threads):
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        done = 0
+        while time.perf_counter() < deadline:
+            check_password('correct horse battery staple', encoded)
+            done += 1
+        return done
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        total = sum(pool.map(lambda _: worker(), range(threads)))
+    return total / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    report = {}
+    for label, algorithm in HASHERS.items():
+        encoded = get_hasher(algorithm).encode('correct horse battery staple', get_hasher(algorithm).salt())
+        per_core = verifications_per_second(encoded, args.seconds, 1)
+        parallel = verifications_per_second(encoded, args.seconds, args.threads)
+        report[label] = {
+            'logins_per_sec_per_core': round(per_core, 1),
+            f'logins_per_sec_{args.threads}_threads': round(parallel, 1),
+            'ms_per_login': round(1000 / per_core, 2),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Order placement throughput with many buyers racing for one book.
+
+    python benchmarks/order_contention.py --buyers 300 --stock 50 --workers 32
+
+Creates a scratch seller, book and buyers in the configured database, then
+has --workers threads place one order per buyer through place_order(). It
+prints the attempts per second and the per-attempt latency as JSON. Each
+attempt is one conditional UPDATE holding the book's row lock for a single
+statement, so a few hundred attempts should clear within seconds.
+ConcurrentOrderTests in api/tests.py checks the outcome (no overselling).
+The scratch rows are deleted at the end unless --keep is given.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bookHub.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+from api.inventory import OutOfStock  # noqa: E402
+from api.models import Book, Seller, User  # noqa: E402
+from api.orders import place_order  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--buyers', type=int, default=300)
+    parser.add_argument('--stock', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--keep', action='store_true', help="Keep the scratch seller, book, buyers and orders.")
+    args = parser.parse_args()
+
+    run = uuid.uuid4().hex[:8]
+    owner = User.objects.create(username=f'bench-{run}-seller', email=f'bench-{run}@example.com',
+                                password='!', is_seller=True)
+    seller = Seller.objects.create(user=owner, shop_name=f'Bench {run}', gstin=f'BENCH{run}')
+    book = Book.objects.create(seller=seller, title=f'Contended {run}', author='Bench', category='bench',
+                               price=Decimal('120.00'), condition='new', quantity=args.stock)
+    buyers = User.objects.bulk_create(
+        User(username=f'bench-{run}-{n}', email=f'bench-{run}-{n}@example.com', password='!')
+        for n in range(args.buyers)
+    )
+
+    def buy(user):
+        started = time.perf_counter()
+        try:
+            place_order(user, book.pk)
+            return True, time.perf_counter() - started
+        except OutOfStock:
+            return False, time.perf_counter() - started
+        finally:
+            connection.close()  # Each worker thread opened its own connection
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(buy, buyers))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for _, latency in results)
+        print(json.dumps({
+            'buyers': args.buyers,
+            'workers': args.workers,
+            'orders': sum(placed for placed, _ in results),
+            'stock': args.stock,
+            'attempts_per_sec': round(args.buyers / elapsed, 1),
+            'latency_ms': {
+                'median': round(statistics.median(latencies) * 1000, 2),
+                'p95': round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 2),
+                'max': round(latencies[-1] * 1000, 2),
+            },
+        }, indent=2))
+    finally:
+        if not args.keep:
+            User.objects.filter(username__startswith=f'bench-{run}-').delete()  # Cascades to orders and book
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Order history query latency as the order table grows, plain vs partitioned.
+
+    python benchmarks/partition_bench.py --rows-per-month 1000000 --months 3,12,24
+
+Builds two scratch tables in a `bench_partitions` schema of the configured
+postgres database: one plain and one partitioned by month like api_order
+after `manage.py partition_orders --setup`. Both have the same indexes. The
+order volume per month is fixed, and each step adds older months, the way
+history accumulates (24 months at 1M/month = 24M orders). After each step
+it prints, per table, the median latency of:
+
+- history: one user's orders in the last 30 days, newest first (LIMIT 50)
+- history_range: one user's orders in a month a year back (?start=&end=)
+- month_report: count and revenue of last month's orders
+
+The schema is dropped at the end unless --keep is given.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bookHub.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+from api.partitions import add_months, month_start  # noqa: E402
+
+SCHEMA = 'bench_partitions'
+COLUMNS = ("order_id bigint NOT NULL, user_id integer NOT NULL, book_id integer NOT NULL, "
+           "order_date timestamptz NOT NULL, quantity integer NOT NULL, total_amount numeric(10, 2) NOT NULL, "
+           "status varchar(10) NOT NULL")
+
+QUERIES = {
+    'history': ("SELECT order_id, order_date, status FROM {table} WHERE user_id = %(user)s "
+                "AND order_date >= now() - interval '30 days' ORDER BY order_date DESC LIMIT 50"),
+    'history_range': ("SELECT order_id, order_date, status FROM {table} WHERE user_id = %(user)s "
+                      "AND order_date >= %(year_ago)s AND order_date < %(year_ago_end)s ORDER BY order_date DESC"),
+    'month_report': ("SELECT count(*), sum(total_amount) FROM {table} "
+                     "WHERE order_date >= %(last_month)s AND order_date < %(this_month)s"),
+}
+
+
+def setup(cursor):
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"CREATE TABLE {SCHEMA}.plain ({COLUMNS})")
+    cursor.execute(f"CREATE TABLE {SCHEMA}.partitioned ({COLUMNS}) PARTITION BY RANGE (order_date)")
+    for table in ('plain', 'partitioned'):
+        cursor.execute(f"CREATE INDEX ON {SCHEMA}.{table} (user_id, order_date DESC)")
+        cursor.execute(f"CREATE INDEX ON {SCHEMA}.{table} (book_id)")
+
+
+def add_month(cursor, month, rows, users, next_id):
+    """Insert one month of orders into both tables."""
+    end = add_months(month, 1)
+    cursor.execute(f"CREATE TABLE {SCHEMA}.p{month:%Y_%m} PARTITION OF {SCHEMA}.partitioned "
+                   f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{end.isoformat()} 00:00:00+00')")
+    for table in ('plain', 'partitioned'):
+        cursor.execute(
+            f"INSERT INTO {SCHEMA}.{table} "
+            f"SELECT %(first)s + n, 1 + (random() * (%(users)s - 1))::int, 1 + (random() * 99999)::int, "
+            f"%(start)s::timestamptz + random() * (%(end)s::timestamptz - %(start)s::timestamptz), "
+            f"1, 199.00, (ARRAY['pending', 'shipped', 'delivered', 'cancelled'])[1 + (random() * 3)::int] "
+            f"FROM generate_series(0, %(rows)s - 1) AS n",
+            {'first': next_id, 'users': users, 'rows': rows, 'start': month, 'end': end},
+        )
+    return next_id + rows
+
+
+def measure(cursor, table, params, users, repeats):
+    timings = {}
+    for name, sql in QUERIES.items():
+        samples = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            cursor.execute(sql.format(table=f'{SCHEMA}.{table}'), {**params, 'user': random.randint(1, users)})
+            cursor.fetchall()
+            samples.append(time.perf_counter() - started)
+        timings[name] = round(statistics.median(samples) * 1000, 3)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows-per-month', type=int, default=1_000_000)
+    parser.add_argument('--months', default='3,12,24', help="Months of history after each step.")
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--keep', action='store_true', help="Keep the bench_partitions schema.")
+    args = parser.parse_args()
+    if connection.vendor != 'postgresql':
+        parser.error("Needs the postgres backend.")
+    steps = sorted(int(value) for value in args.months.split(','))
+    random.seed(0)
+
+    this_month = month_start(date.today())
+    params = {
+        'this_month': this_month,
+        'last_month': add_months(this_month, -1),
+        'year_ago': add_months(this_month, -12),
+        'year_ago_end': add_months(this_month, -11),
+    }
+    with connection.cursor() as cursor:
+        setup(cursor)
+        try:
+            months, next_id = 0, 0
+            for step in steps:
+                while months < step:  # Newest month first, then further back in time
+                    next_id = add_month(cursor, add_months(this_month, -months), args.rows_per_month,
+                                        args.users, next_id)
+                    months += 1
+                cursor.execute(f"ANALYZE {SCHEMA}.plain")
+                cursor.execute(f"ANALYZE {SCHEMA}.partitioned")
+                print(json.dumps({
+                    'months': months,
+                    'orders': next_id,
+                    'plain_ms': measure(cursor, 'plain', params, args.users, args.repeats),
+                    'partitioned_ms': measure(cursor, 'partitioned', params, args.users, args.repeats),
+                }), flush=True)
+        finally:
+            if not args.keep:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Measure serialization CPU per 1,000 books and response size per format.
+
+    python benchmarks/serializer_bench.py --books 1000 --rounds 20
+
+Compares a stock DRF ModelSerializer with BookSerializer (fast read path),
+with and without a mobile sparse fieldset (?fields=book_id,title,price,
+image_variants), then renders the result with DRF's JSONRenderer, orjson and
+MessagePack. Books are built in memory, so no database is needed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bookHub.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework import serializers  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from api.models import Book  # noqa: E402
+from api.renderers import MessagePackRenderer, ORJSONRenderer, msgpack, orjson  # noqa: E402
+from api.serializers import BookSerializer  # noqa: E402
+
+MOBILE_FIELDS = 'book_id,title,price,image_variants'
+
+
+class StockBookSerializer(serializers.ModelSerializer):
+    rating_histogram = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Book
+        fields = BookSerializer.Meta.fields
+
+    get_rating_histogram = BookSerializer.get_rating_histogram
+    get_image_variants = BookSerializer.get_image_variants
+
+
+def make_books(count):
+    return [
+        Book(book_id=i, seller_id=i % 50 + 1, title=f'Book {i}', author=f'Author {i % 300}', category='fiction',
+             price=Decimal('249.00'), availability_status=True, rental_option=False, condition='new',
+             quantity=3, rating_avg=4.2, rating_count=10, rating_4=6, rating_5=4)
+        for i in range(1, count + 1)
+    ]
+
+
+def timed(function, rounds):
+    best = float('inf')
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    books = make_books(args.books)
+    factory = APIRequestFactory()
+    full = Request(factory.get('/api/v1/books/'))
+    mobile = Request(factory.get('/api/v1/books/', {'fields': MOBILE_FIELDS}))
+
+    cases = {
+        'drf_model_serializer': lambda: StockBookSerializer(books, many=True, context={'request': full}).data,
+        'fast_path': lambda: BookSerializer(books, many=True, context={'request': full}).data,
+        'fast_path_sparse': lambda: BookSerializer(books, many=True, context={'request': mobile}).data,
+    }
+    scale = 1000 / args.books
+    report, outputs = {'serialize_ms_per_1000_books': {}}, {}
+    for name, case in cases.items():
+        seconds, outputs[name] = timed(case, args.rounds)
+        report['serialize_ms_per_1000_books'][name] = round(seconds * 1000 * scale, 2)
+    assert json.loads(json.dumps(outputs['fast_path'])) == json.loads(json.dumps(outputs['drf_model_serializer']))
+
+    renderers = {'json_drf': JSONRenderer()}
+    if orjson is not None:
+        renderers['json_orjson'] = ORJSONRenderer()
+    if msgpack is not None:
+        renderers['msgpack'] = MessagePackRenderer()
+    report['render'] = {}
+    for payload in ('fast_path', 'fast_path_sparse'):
+        for name, renderer in renderers.items():
+            seconds, body = timed(lambda: renderer.render(outputs[payload]), args.rounds)
+            report['render'][f'{payload}/{name}'] = {
+                'ms_per_1000_books': round(seconds * 1000 * scale, 2),
+                'bytes_per_book': round(len(body) / args.books, 1),
+            }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,8 @@
 ASGI config for bookHub project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn bookHub.asgi:application``) for
+the async views and the live event streams under /api/v1/async/.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
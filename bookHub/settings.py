@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+from importlib.util import find_spec
 from pathlib import Path
 
 from datetime import timedelta
@@ -28,6 +29,18 @@ SIMPLE_JWT = {
 BASE_DIR = Path(__file__).resolve().parent.parent
 MEDIA_URL = '/media/'  # URL to access images
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')  # Directory to store images
+IMAGE_VARIANT_WIDTHS = (160, 320, 640)  # Cover thumbnails generated for every upload
+IMAGE_PIPELINE_WORKERS = 2  # Processes resizing covers off the request thread
+RECOMMENDATIONS = {
+    'PATH': os.path.join(BASE_DIR, 'var', 'recommendations'),  # Shared, memory-mapped by every worker
+    'TOP_K': 20,  # Similar books kept per book (manage.py build_recommendations)
+}
+FACET_PRICE_BUCKETS = (0, 100, 250, 500, 1000, 2500)  # Price facet edges; run rebuild_facets after changing
+LIVE_EVENTS = {
+    # Cross-worker delivery of order/stock events; api.live.LocalBackend for a single process
+    'BACKEND': 'api.live.PostgresBackend',
+    'HEARTBEAT_SECONDS': 15,
+}
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -63,11 +76,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.PerformanceMiddleware',  # first, so it times the whole stack
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -107,6 +122,70 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# LocMemCache is per-process: set REDIS_URL when running several workers so
+# response-cache invalidations reach all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+API_RESPONSE_CACHE = {
+    'ENABLED': os.environ.get('API_RESPONSE_CACHE_ENABLED', '1') == '1',  # 0 for like-for-like benchmarks
+    'ALIAS': 'default',
+    'TIMEOUT': 300,  # Seconds; entries are also dropped on any Book/Review/Seller change
+    'REPLICA_TIMEOUT': 5,  # Seconds, for entries read from a replica: about the replication lag tolerated
+}
+
+
+# Query-plan regression tests (api/tests.py) fail when a hot query needs a
+# sequential scan on a table holding more rows than this.
+QUERY_PLAN_SEQ_SCAN_ROW_LIMIT = 500
+
+
+# Request instrumentation (api/metrics.py). Requests slower than
+# PERF_SLOW_REQUEST_MS are logged to 'api.performance' with their SQL;
+# None turns slow logging (and SQL capture) off. /metrics is served to
+# requests bearing METRICS_TOKEN and to staff users.
+PERF_SLOW_REQUEST_MS = int(os.environ['PERF_SLOW_REQUEST_MS']) if os.environ.get('PERF_SLOW_REQUEST_MS') else None
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/5.2/topics/auth/passwords/
+# Argon2 first: existing PBKDF2 hashes still verify and are rehashed with
+# Argon2 on the user's next successful login.
+
+PASSWORD_HASHERS = [
+    'api.hashers.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+LOGIN_HASH_WORKERS = os.cpu_count() or 1  # Logins hashing at once per process
+LOGIN_HASH_QUEUE = 64  # Logins allowed to wait for a hashing slot before getting a 503
+LOGIN_HASH_TIMEOUT = 10  # Seconds
+
+LOGIN_THROTTLE = {
+    'CACHE': 'default',  # Shared by all workers (REDIS_URL), or each worker allows its own quota
+    'IP_RATE': 1.0,  # Login attempts per second per client IP, counted in windows of IP_BURST attempts
+    'IP_BURST': 20,
+    'USERNAME_RATE': 0.1,  # Failed attempts per second per username from one IP
+    'USERNAME_BURST': 5,
+    'ACCOUNT_RATE': 0.05,  # Failed attempts per second per username from all IPs together
+    'ACCOUNT_BURST': 50,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -153,9 +232,21 @@ AUTH_USER_MODEL = 'api.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',  # JWT without a user query per request
     ),
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',  # application/json, via orjson when installed
+        *(['api.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),  # application/msgpack
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
 
+JWT_AUTH_CACHE = {
+    'USER_CACHE_SIZE': 10000,  # Users kept in each worker's LRU
+    'USER_CACHE_TTL': 60,  # Seconds before a cached user row is reloaded
+    'BLOOM_CAPACITY': 100000,  # Blacklisted token ids the bloom filter is sized for
+    'BLOOM_ERROR_RATE': 0.001,
+    'BLOOM_REFRESH_SECONDS': 30,  # Rebuild interval, picks up tokens blacklisted by other workers
 }
 
 
@@ -173,9 +264,36 @@ DATABASES = {
         'PASSWORD': 'root',  # Your PostgreSQL password
         'HOST': 'localhost',
         'PORT': '5432',  # Default PostgreSQL port
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # psycopg3 connection pool, one per worker process (CONN_MAX_AGE must stay 0)
+            'pool': {
+                'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+                'timeout': 10,  # Seconds to wait for a free connection
+            },
+        },
     }
 }
 
+# Read replicas, e.g. DB_REPLICA_HOSTS=replica1:5432,replica2:5432. Safe
+# requests to views with `replica_reads = True` read from them (api/routers.py);
+# in tests they mirror 'default'.
+DATABASE_REPLICAS = []
+for _index, _host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    _hostname, _, _port = _host.strip().partition(':')
+    DATABASES[f'replica_{_index}'] = {
+        **DATABASES['default'],
+        'HOST': _hostname,
+        'PORT': _port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{_index}')
+
+DATABASE_ROUTERS = ['api.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = 5  # Primary-only reads for a user after their writes (read-your-writes)
+REPLICA_PIN_CACHE = 'default'  # Must be shared by all workers (REDIS_URL), or replicas stay unused
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",  # React frontend URL
 ]
\ No newline at end of file
@@ -19,6 +19,7 @@ from django.urls import path,include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.conf import settings
 from django.conf.urls.static import static
+from api.metrics import metrics_view
 from api.views import CustomJWTLoginView
 
 urlpatterns = [
@@ -26,6 +27,7 @@ urlpatterns = [
     path('api/v1/',include("api.urls")),
     path('api/token/',  CustomJWTLoginView.as_view(), name='token_obtain_pair'),  # Get access & refresh token
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),  # Refresh access token
+    path('metrics', metrics_view, name='metrics'),  # Prometheus scrape target
   
 ]
 